@@ -0,0 +1 @@
+"""Performance benchmarks for Conquest. Run modules with ``python -m benchmarks.<name>``."""
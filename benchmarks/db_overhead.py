@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Compare per-request ``db.connect`` against borrowing from ``db.ConnectionPool``.
+
+Each iteration performs the work a ``world.meta`` request needs: obtain a
+connection, read ``world_meta``, give the connection back.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from server_app import db
+
+
+META_QUERY = "SELECT width, height FROM world_meta WHERE id=1"
+
+
+def bench_connect_per_request(db_path: str, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        with db.connect(db_path) as conn:
+            conn.execute(META_QUERY).fetchone()
+    return time.perf_counter() - start
+
+
+def bench_pooled(db_path: str, iterations: int) -> float:
+    pool = db.ConnectionPool(db_path, 1)
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            with pool.connection() as conn:
+                conn.execute(META_QUERY).fetchone()
+        return time.perf_counter() - start
+    finally:
+        pool.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-request database overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = os.path.join(tmpdir, "bench.db")
+        db.initialize(db_path, 16, 16)
+        results = {}
+        for name, bench in (("connect_per_request", bench_connect_per_request), ("pooled", bench_pooled)):
+            elapsed = bench(db_path, args.iterations)
+            results[name] = {"total_s": round(elapsed, 4), "per_request_us": round(elapsed / args.iterations * 1e6, 2)}
+        results["speedup"] = round(results["connect_per_request"]["total_s"] / results["pooled"]["total_s"], 2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Time server and client hot paths at several world sizes, with regression checks.
+
+Every case is timed ``--repeat`` times over a fixed number of operations and
+reported as the best and median time per operation, keyed
+``name:variant[size]`` (protocol cases do not depend on the world size).
+Results are JSON; ``--output`` stores them as a baseline and ``--compare``
+flags cases that got slower than that baseline by more than ``--threshold``.
+A world built for one size is shared by all cases of that size, in the order
+listed, so later cases see the tiles earlier cases claimed.
+
+    python -m benchmarks.hot_paths --output baseline.json
+    python -m benchmarks.hot_paths --compare baseline.json
+    python -m benchmarks.hot_paths --compare baseline.json --against current.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from typing import Any
+
+from client_app.repl import render_world_grid
+from server_app import db
+from server_app.protocol import parse_json_line, serialize_message
+from server_app.world import WorldService
+
+DEFAULT_SIZES = (100, 500, 2000)
+# Full-board renders and regions build one dict per tile; past this size they
+# measure the allocator more than the code.
+FULL_BOARD_MAX_SIZE = 500
+VIEWPORT = 32
+BENCH_POWER = 10**9
+
+
+def measure(operation: Callable[[], Any], number: int, repeat: int, after: Callable[[], None] | None = None) -> dict[str, Any]:
+    """Run ``operation`` ``number`` times per round; ``after`` runs untimed between rounds."""
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            operation()
+        rounds.append((time.perf_counter() - started) / number)
+        if after is not None:
+            after()
+    return {
+        "best_us": round(min(rounds) * 1e6, 3),
+        "median_us": round(statistics.median(rounds) * 1e6, 3),
+        "ops": number,
+        "rounds": repeat,
+    }
+
+
+def _claim_targets(size: int) -> Iterator[tuple[int, int]]:
+    # Row-major from (1, 0): every tile is next to the one before it or the one above it.
+    for y in range(size):
+        for x in range(1 if y == 0 else 0, size):
+            yield x, y
+
+
+def bench_world(size: int, db_path: str, repeat: int) -> dict[str, dict[str, Any]]:
+    results: dict[str, dict[str, Any]] = {}
+    with db.connect(db_path) as conn:
+        world = WorldService(conn, BENCH_POWER, BENCH_POWER, power_regen_per_tick=1, tick_seconds=2.0)
+        world.create_user_resources(1)
+        world.spawn_for_user_if_needed(1)
+        conn.commit()
+
+        claims = min(500, (size * size - 1) // (2 * repeat))
+        targets = _claim_targets(size)
+        results["WorldService.claim_tile"] = measure(
+            lambda: world.claim_tile(1, *next(targets), power_cost=1), claims, repeat, conn.commit
+        )
+        results["WorldService.get_user_state"] = measure(lambda: world.get_user_state(1), 200, repeat)
+
+        centre = size // 2
+        viewport = (centre, centre, centre + VIEWPORT - 1, centre + VIEWPORT - 1)
+        results["WorldService.world_patch_since:viewport"] = measure(lambda: world.world_patch_since(*viewport), 50, repeat)
+        if size <= FULL_BOARD_MAX_SIZE:
+            results["WorldService.world_patch_since:full"] = measure(world.world_patch_since, 1, repeat)
+
+        spawns = min(200, (size * size) // (4 * repeat))
+        user_ids = iter(range(2, 2 + spawns * repeat))
+        results["WorldService.spawn_for_user_if_needed"] = measure(
+            lambda: world.spawn_for_user_if_needed(next(user_ids)), spawns, repeat, conn.commit
+        )
+        if size <= FULL_BOARD_MAX_SIZE:
+            meta = world.get_world_meta()
+            tiles = world.world_patch_since()
+            results["repl.render_world_grid"] = measure(lambda: render_world_grid(meta, tiles), 1, repeat)
+            packed = world.encoded_region("packed")
+            results["repl.render_world_grid:packed"] = measure(lambda: render_world_grid(meta, packed), 1, repeat)
+    return results
+
+
+def bench_initialize(size: int, workdir: str, repeat: int) -> tuple[dict[str, dict[str, Any]], str]:
+    """Time creating a fresh world; returns the last row-per-tile database for the world cases."""
+    results: dict[str, dict[str, Any]] = {}
+    paths = iter(os.path.join(workdir, f"init-{size}-{index}.db") for index in range(2 * repeat))
+    created: list[str] = []
+
+    def initialize(storage: str) -> None:
+        path = next(paths)
+        created.append(path)
+        db.initialize(path, size, size, storage=storage, chunk_size=64 if storage == "chunks" else None)
+
+    def discard_all_but_last() -> None:
+        while len(created) > 1:
+            _remove_db(created.pop(0))
+
+    results["db.initialize:tiles"] = measure(lambda: initialize("tiles"), 1, repeat, discard_all_but_last)
+    tiles_db = created.pop()
+    results["db.initialize:chunks"] = measure(lambda: initialize("chunks"), 1, repeat, discard_all_but_last)
+    for path in created:
+        _remove_db(path)
+    return results, tiles_db
+
+
+def bench_protocol(repeat: int) -> dict[str, dict[str, Any]]:
+    claim_line = b'{"type":"action.claim","payload":{"x":12,"y":34},"id":7}\n'
+    tiles = [{"x": x, "y": y, "terrain": "land", "owner_user_id": None} for y in range(VIEWPORT) for x in range(VIEWPORT)]
+    region_line = serialize_message("ok", request_type="world.region", data={"revision": 1, "tiles": tiles})
+    return {
+        "protocol.parse_json_line:claim": measure(lambda: parse_json_line(claim_line), 20000, repeat),
+        "protocol.parse_json_line:region": measure(lambda: parse_json_line(region_line), 200, repeat),
+        "protocol.serialize_message:pong": measure(
+            lambda: serialize_message("ok", request_type="ping", data={"pong": True}, id=7), 20000, repeat
+        ),
+        "protocol.serialize_message:region": measure(
+            lambda: serialize_message("ok", request_type="world.region", data={"revision": 1, "tiles": tiles}), 200, repeat
+        ),
+    }
+
+
+def _remove_db(path: str) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(path + suffix)
+        except FileNotFoundError:
+            pass
+
+
+def run(sizes: list[int], repeat: int) -> dict[str, Any]:
+    results: dict[str, dict[str, Any]] = dict(bench_protocol(repeat))
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            print(f"[bench] {size}x{size}", file=sys.stderr)
+            initialized, tiles_db = bench_initialize(size, workdir, repeat)
+            cases = {**initialized, **bench_world(size, tiles_db, repeat)}
+            results.update({f"{name}[{size}]": timing for name, timing in cases.items()})
+            _remove_db(tiles_db)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "sizes": sizes,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict[str, Any], current: dict[str, Any], threshold: float) -> list[dict[str, Any]]:
+    """Per-case ``best_us`` ratios of ``current`` to ``baseline`` for cases present in both."""
+    rows = []
+    for name, timing in current["results"].items():
+        before = baseline["results"].get(name)
+        if before is None or not before["best_us"]:
+            continue
+        ratio = timing["best_us"] / before["best_us"]
+        rows.append(
+            {
+                "case": name,
+                "baseline_us": before["best_us"],
+                "current_us": timing["best_us"],
+                "ratio": round(ratio, 3),
+                "regression": ratio > 1 + threshold,
+            }
+        )
+    return rows
+
+
+def _load(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hot path microbenchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma-separated world edge lengths")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed rounds per case; the best round is reported")
+    parser.add_argument("--output", help="Write the results JSON here, e.g. to store a baseline")
+    parser.add_argument("--compare", metavar="BASELINE", help="Flag cases slower than this results file")
+    parser.add_argument("--against", metavar="RESULTS", help="With --compare, use this results file instead of running")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown before a case is flagged")
+    args = parser.parse_args()
+
+    if args.against:
+        if not args.compare:
+            parser.error("--against needs --compare")
+        current = _load(args.against)
+    else:
+        current = run([int(size) for size in args.sizes.split(",")], args.repeat)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as handle:
+                json.dump(current, handle, indent=2)
+                handle.write("\n")
+
+    if not args.compare:
+        print(json.dumps(current, indent=2))
+        return
+    rows = compare(_load(args.compare), current, args.threshold)
+    regressions = [row["case"] for row in rows if row["regression"]]
+    print(json.dumps({"threshold": args.threshold, "comparisons": rows, "regressions": regressions}, indent=2))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
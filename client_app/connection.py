@@ -3,31 +3,97 @@
 from __future__ import annotations
 
 import socket
+import zlib
+from collections import deque
+from collections.abc import Callable, Iterable
+from itertools import count
 from typing import Any
 
-from .protocol import ProtocolError, decode_response, encode_request
+from .protocol import (
+    COMPRESSED_FLAG,
+    FRAME_HEADER,
+    PUSH_TYPES,
+    ProtocolError,
+    choose_codec,
+    decode_region_tiles,
+    encode_request,
+    error_from_frame,
+    parse_frame,
+)
 
 
 class ConquestClient:
-    """Thin JSON-over-TCP client for the public Conquest protocol."""
+    """Thin JSON-over-TCP client for the public Conquest protocol.
 
-    def __init__(self, host: str = "127.0.0.1", port: int = 12345, timeout: float = 10.0):
+    Frames the server pushes on its own (see ``PUSH_TYPES``) may arrive at any
+    time. They are queued for ``poll_events`` and, if given, passed to ``on_event``.
+
+    Every request carries an ``id`` that the server echoes. ``request`` waits for
+    its own reply; ``submit``/``result`` and ``pipeline`` keep several requests
+    in flight and match replies by id, whatever order they arrive in.
+
+    With ``codec`` set (``"auto"`` or a name from ``protocol.CODECS``) or
+    ``framing="length"``, the client switches the connection to that format
+    right after connecting. ``compress=True`` (length framing only) also asks
+    for zlib on large responses when the server offers it; compressed frames
+    are inflated transparently.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 12345,
+        timeout: float = 10.0,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+        codec: str | None = None,
+        framing: str = "newline",
+        compress: bool = False,
+    ):
+        if compress and framing != "length":
+            raise ValueError("compress=True requires framing='length'")
         self.host = host
         self.port = port
         self.timeout = timeout
+        self.on_event = on_event
+        self.codec = codec
+        self.framing = framing
+        self.compress = compress
+        self._codec = "json"
+        self._framing = "newline"
         self._sock: socket.socket | None = None
+        self._buffer = bytearray()
+        self._events: deque[dict[str, Any]] = deque()
+        self._ids = count(1)
+        # Request ids awaiting a reply, oldest first, and replies not yet collected.
+        self._pending: dict[int, None] = {}
+        self._replies: dict[int, dict[str, Any]] = {}
 
     def connect(self) -> dict[str, Any]:
         if self._sock is not None:
             raise RuntimeError("Client is already connected")
 
         self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
-        return self._recv_message()
+        hello = self._recv_message()
+        if hello.get("type") == "error":
+            raise ProtocolError(str(hello.get("error", "Unknown server error")))
+        if self.framing != "newline" and self.framing not in hello.get("framings", ["newline"]):
+            raise ProtocolError(f"Server does not offer framing: {self.framing}")
+        name = choose_codec(hello.get("codecs", ["json"]), self.codec or "json", self.framing)
+        compression = "zlib" if self.compress and "zlib" in hello.get("compression", []) else "none"
+        if name != "json" or self.framing != "newline":
+            # The reply still arrives in the baseline format; later frames use the new one.
+            self.request("hello", {"codec": name, "framing": self.framing, "compression": compression})
+            self._codec, self._framing = name, self.framing
+        return hello
 
     def close(self) -> None:
         if self._sock is not None:
             self._sock.close()
             self._sock = None
+            self._buffer.clear()
+            self._codec, self._framing = "json", "newline"
+            self._pending.clear()
+            self._replies.clear()
 
     def __enter__(self) -> "ConquestClient":
         self.connect()
@@ -37,12 +103,63 @@ class ConquestClient:
         self.close()
 
     def request(self, message_type: str, payload: dict[str, Any] | None = None) -> dict[str, Any]:
-        self._send(message_type, payload)
-        response = self._recv_message()
+        return self.result(self.submit(message_type, payload))
+
+    def submit(self, message_type: str, payload: dict[str, Any] | None = None) -> int:
+        """Send a request without waiting and return its id for ``result``."""
+        request_id = next(self._ids)
+        self._send(message_type, payload, request_id)
+        self._pending[request_id] = None
+        return request_id
+
+    def result(self, request_id: int) -> dict[str, Any]:
+        """Wait for the reply to a submitted request and return its ``data``."""
+        while request_id not in self._replies:
+            if request_id not in self._pending:
+                raise ProtocolError(f"No request in flight with id {request_id}")
+            self._dispatch_frame(self._recv_message())
+        response = self._replies.pop(request_id)
+        if response.get("type") == "error":
+            raise error_from_frame(response)
         if response.get("type") != "ok":
             raise ProtocolError(f"Unexpected response type: {response.get('type')}")
         return response.get("data", {})
 
+    def pipeline(
+        self,
+        requests: Iterable[tuple[str, dict[str, Any] | None]],
+        *,
+        window: int = 16,
+        return_errors: bool = False,
+    ) -> list[Any]:
+        """Run ``(type, payload)`` requests with up to ``window`` in flight; return results in order.
+
+        Every reply is collected before returning. A failed request raises its
+        ``ProtocolError`` afterwards, or is returned in its slot with ``return_errors``.
+        """
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        in_flight: deque[int] = deque()
+        results: list[Any] = []
+
+        def collect() -> None:
+            try:
+                results.append(self.result(in_flight.popleft()))
+            except ProtocolError as exc:
+                results.append(exc)
+
+        for message_type, payload in requests:
+            if len(in_flight) >= window:
+                collect()
+            in_flight.append(self.submit(message_type, payload))
+        while in_flight:
+            collect()
+        if not return_errors:
+            for item in results:
+                if isinstance(item, ProtocolError):
+                    raise item
+        return results
+
     def ping(self) -> dict[str, Any]:
         return self.request("ping")
 
@@ -71,13 +188,54 @@ class ConquestClient:
         min_y: int = 0,
         max_x: int | None = None,
         max_y: int | None = None,
+        encoding: str | None = None,
+        since_revision: int | None = None,
     ) -> dict[str, Any]:
+        """Fetch a region. Compact ``encoding`` responses are decoded back into ``tiles``.
+
+        With ``since_revision`` the server answers with ``delta: true`` and only the
+        tiles changed after that revision, or a full snapshot if its history is gone.
+        """
         payload: dict[str, Any] = {"min_x": min_x, "min_y": min_y}
         if max_x is not None:
             payload["max_x"] = max_x
         if max_y is not None:
             payload["max_y"] = max_y
-        return self.request("world.region", payload)
+        if encoding is not None:
+            payload["encoding"] = encoding
+        if since_revision is not None:
+            payload["since_revision"] = since_revision
+        data = self.request("world.region", payload)
+        if data.get("encoding", "tiles") != "tiles":
+            data = {**data, "tiles": decode_region_tiles(data)}
+        return data
+
+    def subscribe(
+        self,
+        *,
+        min_x: int = 0,
+        min_y: int = 0,
+        max_x: int | None = None,
+        max_y: int | None = None,
+    ) -> dict[str, Any]:
+        """Ask the server to push ``world.tiles_changed`` frames for this viewport."""
+        payload: dict[str, Any] = {"min_x": min_x, "min_y": min_y}
+        if max_x is not None:
+            payload["max_x"] = max_x
+        if max_y is not None:
+            payload["max_y"] = max_y
+        return self.request("world.subscribe", payload)
+
+    def unsubscribe(self) -> dict[str, Any]:
+        return self.request("world.unsubscribe")
+
+    def poll_events(self, timeout: float | None = 0.0) -> list[dict[str, Any]]:
+        """Return queued push frames, waiting up to ``timeout`` seconds for one if none are queued."""
+        if not self._events:
+            self._wait_for_event(timeout)
+        events = list(self._events)
+        self._events.clear()
+        return events
 
     def claim(self, x: int, y: int, power_cost: int | None = None) -> dict[str, Any]:
         payload: dict[str, Any] = {"x": x, "y": y}
@@ -85,19 +243,95 @@ class ConquestClient:
             payload["power_cost"] = power_cost
         return self.request("action.claim", payload)
 
-    def _send(self, message_type: str, payload: dict[str, Any] | None = None) -> None:
+    def batch(self, requests: list[tuple[str, dict[str, Any] | None]], *, mode: str = "atomic") -> list[dict[str, Any]]:
+        """Send ``(type, payload)`` requests in one round trip and one server transaction.
+
+        Returns one ``{"type": "ok", "request_type", "data"}`` entry per request. In
+        ``best_effort`` mode failed items come back as ``{"type": "error", ...}``
+        entries; in ``atomic`` mode any failure raises and nothing is applied.
+        """
+        items = [{"type": message_type, "payload": payload or {}} for message_type, payload in requests]
+        return self.request("batch", {"mode": mode, "requests": items})["results"]
+
+    def _send(self, message_type: str, payload: dict[str, Any] | None = None, request_id: int | None = None) -> None:
         if self._sock is None:
             raise RuntimeError("Client is not connected")
-        self._sock.sendall(encode_request(message_type, payload))
+        self._sock.sendall(encode_request(message_type, payload, request_id, self._codec, self._framing))
 
-    def _recv_message(self) -> dict[str, Any]:
+    def _queue_event(self, message: dict[str, Any]) -> None:
+        self._events.append(message)
+        if self.on_event is not None:
+            self.on_event(message)
+
+    def _dispatch_frame(self, message: dict[str, Any]) -> None:
+        """Route a frame to the event queue or to the reply slot of its request."""
+        if message.get("type") in PUSH_TYPES:
+            self._queue_event(message)
+            return
+        request_id = message.get("id")
+        if request_id is None and self._pending:
+            # Errors for lines the server could not parse carry no id; the
+            # server answers in order, so it belongs to the oldest request.
+            request_id = next(iter(self._pending))
+        if request_id not in self._pending:
+            raise ProtocolError(f"Unexpected unsolicited frame: {message.get('type')}")
+        del self._pending[request_id]
+        self._replies[request_id] = message
+
+    def _wait_for_event(self, timeout: float | None) -> None:
         if self._sock is None:
             raise RuntimeError("Client is not connected")
+        self._sock.settimeout(timeout)
+        try:
+            message = self._recv_message()
+        except (TimeoutError, BlockingIOError):
+            return
+        finally:
+            self._sock.settimeout(self.timeout)
+        self._dispatch_frame(message)
 
-        raw = b""
-        while not raw.endswith(b"\n"):
-            chunk = self._sock.recv(4096)
+    def _recv_line(self) -> bytes:
+        if self._sock is None:
+            raise RuntimeError("Client is not connected")
+
+        # Scan only newly received bytes; anything after the newline stays buffered.
+        scanned = 0
+        while True:
+            newline = self._buffer.find(b"\n", scanned)
+            if newline != -1:
+                line = bytes(self._buffer[: newline + 1])
+                del self._buffer[: newline + 1]
+                return line
+            scanned = len(self._buffer)
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise ProtocolError("Connection closed by server")
+            self._buffer += chunk
+
+    def _fill(self, size: int) -> None:
+        """Read until at least ``size`` bytes are buffered; nothing is consumed."""
+        if self._sock is None:
+            raise RuntimeError("Client is not connected")
+        while len(self._buffer) < size:
+            chunk = self._sock.recv(max(65536, size - len(self._buffer)))
             if not chunk:
                 raise ProtocolError("Connection closed by server")
-            raw += chunk
-        return decode_response(raw)
+            self._buffer += chunk
+
+    def _recv_message(self) -> dict[str, Any]:
+        if self._framing == "newline":
+            return parse_frame(self._recv_line(), self._codec)
+        # Consume the frame only once all of it is buffered, so a read that
+        # times out partway leaves the stream in sync for the next call.
+        self._fill(FRAME_HEADER.size)
+        length, frame_type, request_id = FRAME_HEADER.unpack_from(self._buffer)
+        end = FRAME_HEADER.size + length
+        self._fill(end)
+        body = bytes(self._buffer[FRAME_HEADER.size : end])
+        del self._buffer[:end]
+        if frame_type & COMPRESSED_FLAG:
+            body = zlib.decompress(body)
+        message = parse_frame(body, self._codec)
+        if request_id:
+            message["id"] = request_id
+        return message
@@ -6,36 +6,168 @@ copy or reimplement this contract independently.
 
 from __future__ import annotations
 
+import base64
 import json
+import struct
+import sys
+from array import array
+from collections.abc import Callable
 from typing import Any
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional speedup
+    msgpack = None
+
+
+# Frames the server sends on its own, not in reply to a request.
+PUSH_TYPES = frozenset({"world.tiles_changed"})
+
 
 class ProtocolError(RuntimeError):
-    """Raised when server response packets are malformed or indicate an error."""
+    """Raised when server response packets are malformed or indicate an error.
+
+    ``retry_after`` carries the server's hint, in seconds, when it refused a
+    request for going over a rate limit.
+    """
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def error_from_frame(message: dict[str, Any]) -> ProtocolError:
+    return ProtocolError(str(message.get("error", "Unknown server error")), message.get("retry_after"))
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":")).encode()
+
+
+# Codecs this client can speak, fastest last. A connection starts in ``json``
+# with newline framing and switches with a ``hello`` request.
+CODECS: dict[str, tuple[Callable[[Any], bytes], Callable[[bytes], Any]]] = {"json": (_json_dumps, json.loads)}
+if orjson is not None:
+    CODECS["orjson"] = (orjson.dumps, orjson.loads)
+if msgpack is not None:
+    CODECS["msgpack"] = (lambda data: msgpack.packb(data, use_bin_type=True), lambda raw: msgpack.unpackb(raw, raw=False))
+
+# Codecs whose bodies may contain newline bytes; they need ``length`` framing.
+BINARY_CODECS = frozenset({"msgpack"})
+
+# ``length`` framing: body length, frame type code, request id (0 for none).
+FRAME_HEADER = struct.Struct("!IBI")
+REQUEST_FRAME = 1
+# Set in the frame type code when the body is zlib-compressed.
+COMPRESSED_FLAG = 0x80
+
 
+def choose_codec(offered: list[str], preferred: str = "auto", framing: str = "newline") -> str:
+    """Pick the codec to request from the server's ``hello`` ``codecs`` list."""
+    if preferred == "auto":
+        shared = [name for name in CODECS if name in offered and (framing == "length" or name not in BINARY_CODECS)]
+        return shared[-1] if shared else "json"
+    if preferred not in CODECS:
+        raise ProtocolError(f"Codec not available in this client: {preferred}")
+    if preferred not in offered:
+        raise ProtocolError(f"Server does not offer codec: {preferred}")
+    if preferred in BINARY_CODECS and framing != "length":
+        raise ProtocolError(f"Codec {preferred} requires length framing")
+    return preferred
 
-def encode_request(message_type: str, payload: dict[str, Any] | None = None) -> bytes:
+
+def encode_request(
+    message_type: str,
+    payload: dict[str, Any] | None = None,
+    request_id: int | str | None = None,
+    codec: str = "json",
+    framing: str = "newline",
+) -> bytes:
     packet: dict[str, Any] = {"type": message_type}
     if payload:
         packet["payload"] = payload
-    return (json.dumps(packet, separators=(",", ":")) + "\n").encode()
+    if framing == "length":
+        header_id = request_id if isinstance(request_id, int) else 0
+        if request_id is not None and not header_id:
+            packet["id"] = request_id
+        body = CODECS[codec][0](packet)
+        return FRAME_HEADER.pack(len(body), REQUEST_FRAME, header_id) + body
+    if request_id is not None:
+        packet["id"] = request_id
+    return CODECS[codec][0](packet) + b"\n"
+
+
+def decode_response(raw_line: bytes, codec: str = "json") -> dict[str, Any]:
+    """Parse one server frame, raising ``ProtocolError`` for ``error`` frames."""
+    message = parse_frame(raw_line, codec)
+    if message["type"] == "error":
+        raise error_from_frame(message)
+    return message
 
 
-def decode_response(raw_line: bytes) -> dict[str, Any]:
+def parse_frame(raw_line: bytes, codec: str = "json") -> dict[str, Any]:
+    """Parse one server frame of any type, ``error`` included."""
+    if not raw_line.strip():
+        raise ProtocolError("Empty server response")
     try:
-        decoded = raw_line.decode().strip()
-        if not decoded:
-            raise ProtocolError("Empty server response")
-        message = json.loads(decoded)
-    except json.JSONDecodeError as exc:
+        message = CODECS[codec][1](raw_line)
+    except ValueError as exc:
         raise ProtocolError(f"Invalid server JSON: {exc}") from exc
 
     if not isinstance(message, dict):
         raise ProtocolError("Server response must be a JSON object")
     if "type" not in message:
         raise ProtocolError("Server response missing 'type'")
+    return message
 
-    if message["type"] == "error":
-        raise ProtocolError(str(message.get("error", "Unknown server error")))
 
-    return message
+_INDEX_TYPECODES = {1: "B", 2: "H", 4: "I"}
+
+
+def _region_coordinates(bounds: dict[str, int]):
+    for y in range(bounds["min_y"], bounds["max_y"] + 1):
+        for x in range(bounds["min_x"], bounds["max_x"] + 1):
+            yield x, y
+
+
+def decode_region_tiles(data: dict[str, Any]) -> list[dict[str, Any]]:
+    """Expand any ``world.region`` response into the plain list of tile dicts.
+
+    Handles the default ``tiles`` form as well as the compact ``rle`` and
+    ``packed`` encodings, which describe the rectangle row-major from ``bounds``.
+    """
+    encoding = data.get("encoding", "tiles")
+    if encoding == "tiles":
+        return data.get("tiles", [])
+    if encoding not in ("rle", "packed"):
+        raise ProtocolError(f"Unsupported region encoding: {encoding}")
+
+    terrain_names = data["terrain_names"]
+    if encoding == "rle":
+        cells = []
+        for owner, terrain, count in data["runs"]:
+            cells.extend([(owner, terrain)] * count)
+    elif encoding == "packed":
+        typecode = _INDEX_TYPECODES.get(data["index_bytes"])
+        if typecode is None:
+            raise ProtocolError(f"Unsupported palette index width: {data['index_bytes']}")
+        indices = array(typecode)
+        raw = data["data"]
+        indices.frombytes(raw if isinstance(raw, bytes) else base64.b64decode(raw))
+        if sys.byteorder != "little":
+            indices.byteswap()
+        palette = data["palette"]
+        cells = [palette[index] for index in indices]
+
+    coordinates = list(_region_coordinates(data["bounds"]))
+    if len(cells) != len(coordinates):
+        raise ProtocolError("Encoded region does not match its bounds")
+    return [
+        {"x": x, "y": y, "terrain": terrain_names[terrain], "owner_user_id": owner}
+        for (x, y), (owner, terrain) in zip(coordinates, cells)
+    ]
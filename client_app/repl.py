@@ -7,6 +7,7 @@ import argparse
 import json
 
 from .connection import ConquestClient
+from .protocol import decode_region_tiles
 
 
 HELP_TEXT = """
@@ -37,7 +38,10 @@ def _tile_to_ascii(tile: dict) -> str:
     return "0"
 
 
-def render_world_grid(meta: dict, tiles: list[dict]) -> str:
+def render_world_grid(meta: dict, tiles: list[dict] | dict) -> str:
+    """Render tiles as ASCII. ``tiles`` may also be a raw (possibly encoded) region response."""
+    if isinstance(tiles, dict):
+        tiles = decode_region_tiles(tiles)
     width = int(meta["width"])
     height = int(meta["height"])
     tile_lookup = {(tile["x"], tile["y"]): tile for tile in tiles}
@@ -60,9 +64,14 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Conquest standalone client")
     parser.add_argument("--host", default="127.0.0.1")
     parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--codec", default=None, help="Switch to this codec after connecting, or 'auto'")
+    parser.add_argument("--framing", choices=("newline", "length"), default="newline")
+    parser.add_argument("--compress", action="store_true", help="Ask for zlib on large responses (length framing)")
     args = parser.parse_args()
 
-    client = ConquestClient(host=args.host, port=args.port)
+    client = ConquestClient(
+        host=args.host, port=args.port, codec=args.codec, framing=args.framing, compress=args.compress
+    )
     hello = client.connect()
     session_token: str | None = None
 
@@ -136,6 +145,7 @@ def main() -> None:
                         min_y=0,
                         max_x=int(meta["width"]) - 1,
                         max_y=int(meta["height"]) - 1,
+                        encoding="rle",
                     )
                     print(render_world_grid(meta, region.get("tiles", [])))
                 elif cmd == "claim" and len(parts) in {3, 4}:
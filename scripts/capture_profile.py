@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Ask a server started with ``--profile DIR`` to sample itself and print the hottest functions.
+
+    python -m scripts.capture_profile --token SECRET --seconds 30
+    flamegraph.pl DIR/conquest-*.collapsed > flame.svg
+"""
+
+import argparse
+import json
+import sys
+
+from client_app import ConquestClient
+from client_app.protocol import ProtocolError
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Capture a sampling profile of a running server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--token", required=True, help="The server's --admin-token")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--interval-ms", type=float, default=5.0)
+    parser.add_argument("--include-idle", action="store_true", help="Keep samples of threads waiting for input")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Print the raw response instead of a table")
+    args = parser.parse_args()
+
+    payload = {
+        "token": args.token,
+        "seconds": args.seconds,
+        "interval_ms": args.interval_ms,
+        "include_idle": args.include_idle,
+        "top": args.top,
+    }
+    try:
+        # The reply only arrives once the capture is over.
+        with ConquestClient(args.host, args.port, timeout=args.seconds + 30) as client:
+            capture = client.request("admin.profile", payload)
+    except (OSError, ProtocolError) as exc:
+        sys.exit(f"capture_profile: {exc}")
+    if args.json:
+        print(json.dumps(capture, indent=2))
+        return
+    print(
+        f"{capture['samples']} samples ({capture['idle_samples']} idle) over {capture['seconds']}s"
+        f" from {len(capture['threads'])} threads"
+    )
+    print(f"{'self':>8} {'total':>8}  function")
+    for entry in capture["top"]:
+        print(f"{entry['self_samples']:>8} {entry['total_samples']:>8}  {entry['function']}")
+    print(f"collapsed stacks: {capture['files']['collapsed']}")
+    print(f"pstats:           {capture['files']['pstats']}")
+
+
+if __name__ == "__main__":
+    main()
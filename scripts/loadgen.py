@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Drive a running server with many concurrent bots and report latency as JSON.
+
+Each bot is a ``ConquestClient`` on its own thread. It logs in (registering
+first if the account does not exist yet) and then, until ``--duration``
+runs out, sends a weighted mix of ``world.state``, ``world.region`` around
+its territory and ``action.claim`` on tiles next to land it owns.
+
+The report lists, per message type, the count, error rate, throughput and
+p50/p95/p99 latency in milliseconds, for the traffic phase and separately
+for the login phase (``setup``). Server-side rejections (for example a claim
+without enough power) count as errors, and so does the first login of a bot
+whose account does not exist yet. A bot whose connection fails stops and is
+listed under ``bot_failures``.
+
+Run it as a module from the repository root so ``client_app`` is importable:
+
+    python -m scripts.loadgen --bots 50 --duration 30
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any
+
+from client_app import ConquestClient
+from client_app.protocol import ProtocolError
+
+MIX_TYPES = ("world.state", "world.region", "action.claim")
+DIRECTIONS = ((0, -1), (1, 0), (0, 1), (-1, 0))
+
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse ``type=weight,...`` into weights, e.g. ``world.state=1,action.claim=2``."""
+    mix: dict[str, float] = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in MIX_TYPES:
+            raise ValueError(f"Unknown message type in mix: {name!r}")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("Mix needs at least one positive weight")
+    return mix
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Latency samples and error counts per message type, shared by all bots."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, Counter[str]] = defaultdict(Counter)
+
+    def timed(self, message_type: str, call, *args, **kwargs) -> Any:
+        """Run ``call`` and record its latency; returns ``None`` if the server rejected it."""
+        started = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        except ProtocolError as exc:
+            if "Connection closed" in str(exc):
+                raise
+            with self._lock:
+                self.errors[message_type][str(exc)] += 1
+            return None
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.latencies[message_type].append(elapsed)
+
+    def report(self, elapsed: float) -> dict[str, Any]:
+        elapsed = max(elapsed, 1e-9)
+        per_type: dict[str, Any] = {}
+        total = errors = 0
+        with self._lock:
+            for message_type, samples in sorted(self.latencies.items()):
+                ordered = sorted(samples)
+                reasons = self.errors[message_type]
+                failed = sum(reasons.values())
+                total += len(ordered)
+                errors += failed
+                per_type[message_type] = {
+                    "count": len(ordered),
+                    "errors": failed,
+                    "error_rate": round(failed / len(ordered), 4),
+                    "throughput_rps": round(len(ordered) / elapsed, 2),
+                    "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+                    "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+                    "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+                    "top_errors": dict(reasons.most_common(5)),
+                }
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "throughput_rps": round(total / elapsed, 2),
+            "per_type": per_type,
+        }
+
+
+class Run:
+    """State shared by the bots of one run: recorders, start barrier and deadline."""
+
+    def __init__(self, bots: int, duration: float):
+        self.setup = Recorder()
+        self.traffic = Recorder()
+        self.duration = duration
+        self.deadline = math.inf
+        self.started = self.setup_started = time.perf_counter()
+        # The last bot to finish logging in starts the clock, so logins are not counted as traffic.
+        self.start = threading.Barrier(bots + 1, action=self._begin)
+        self._lock = threading.Lock()
+        self.bot_failures: list[str] = []
+
+    def _begin(self) -> None:
+        self.started = time.perf_counter()
+        self.deadline = self.started + self.duration
+
+    def fail(self, message: str) -> None:
+        with self._lock:
+            self.bot_failures.append(message)
+
+
+class Bot:
+    def __init__(self, index: int, args: argparse.Namespace, run: Run, mix: dict[str, float]):
+        self.username = f"{args.username_prefix}{index}"
+        self.args = args
+        self.run_state = run
+        self.recorder = run.traffic
+        self.rng = random.Random(None if args.seed is None else args.seed + index)
+        self.types = list(mix)
+        self.weights = list(mix.values())
+        self.owned: set[tuple[int, int]] = set()
+        self.width = self.height = 0
+
+    def run(self) -> None:
+        args = self.args
+        run = self.run_state
+        client = ConquestClient(args.host, args.port, codec=args.codec, framing=args.framing, compress=args.compress)
+        try:
+            client.connect()
+            self._log_in(client, run.setup)
+            meta = client.world_meta()
+            self.width, self.height = meta["width"], meta["height"]
+            self.owned = {(tile["x"], tile["y"]) for tile in client.world_state()["owned_tiles"]}
+        except (OSError, ProtocolError) as exc:
+            run.fail(f"{self.username}: setup failed: {exc}")
+            run.start.abort()
+            client.close()
+            return
+        try:
+            run.start.wait()
+            while time.perf_counter() < run.deadline:
+                getattr(self, "_" + self.rng.choices(self.types, self.weights)[0].replace(".", "_"))(client)
+                if args.think_ms:
+                    time.sleep(args.think_ms / 1000)
+        except threading.BrokenBarrierError:
+            pass
+        except (OSError, ProtocolError) as exc:
+            run.fail(f"{self.username}: {exc}")
+        finally:
+            client.close()
+
+    def _log_in(self, client: ConquestClient, recorder: Recorder) -> None:
+        password = self.args.password
+        if recorder.timed("auth.login", client.login, self.username, password) is None:
+            recorder.timed("auth.register", client.register, self.username, password)
+            if recorder.timed("auth.login", client.login, self.username, password) is None:
+                raise ProtocolError("login failed")
+
+    def _world_state(self, client: ConquestClient) -> None:
+        state = self.recorder.timed("world.state", client.world_state)
+        if state is not None:
+            self.owned = {(tile["x"], tile["y"]) for tile in state["owned_tiles"]}
+
+    def _world_region(self, client: ConquestClient) -> None:
+        cx, cy = self.rng.choice(sorted(self.owned)) if self.owned else (self.width // 2, self.height // 2)
+        radius = self.args.region_radius
+        self.recorder.timed(
+            "world.region",
+            client.world_region,
+            min_x=cx - radius,
+            min_y=cy - radius,
+            max_x=cx + radius,
+            max_y=cy + radius,
+            encoding=self.args.region_encoding,
+        )
+
+    def _action_claim(self, client: ConquestClient) -> None:
+        if not self.owned:
+            self._world_state(client)
+            return
+        target = self._claim_target()
+        if target is None:
+            # No frontier tile found; refresh instead of sending a claim that is bound to fail.
+            self._world_state(client)
+            return
+        if self.recorder.timed("action.claim", client.claim, *target) is not None:
+            self.owned.add(target)
+
+    def _claim_target(self, tries: int = 8) -> tuple[int, int] | None:
+        """An in-bounds tile next to owned land that this bot does not own, or ``None``."""
+        owned = sorted(self.owned)
+        # Other players may still have taken it since the last world.state.
+        for _ in range(tries):
+            x, y = self.rng.choice(owned)
+            dx, dy = self.rng.choice(DIRECTIONS)
+            target = (x + dx, y + dy)
+            if target not in self.owned and 0 <= target[0] < self.width and 0 <= target[1] < self.height:
+                return target
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Conquest multi-bot load generator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--bots", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of traffic after all bots log in")
+    parser.add_argument("--mix", default="world.state=1,world.region=3,action.claim=2")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Pause after each request")
+    parser.add_argument("--region-radius", type=int, default=8)
+    parser.add_argument("--region-encoding", choices=("tiles", "rle", "packed"), default=None)
+    parser.add_argument("--username-prefix", default="loadbot")
+    parser.add_argument("--password", default="loadgen-password")
+    parser.add_argument("--codec", default=None)
+    parser.add_argument("--framing", choices=("newline", "length"), default="newline")
+    parser.add_argument("--compress", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    run = Run(args.bots, args.duration)
+    threads = [threading.Thread(target=Bot(index, args, run, mix).run, daemon=True) for index in range(args.bots)]
+    for thread in threads:
+        thread.start()
+    try:
+        run.start.wait()
+    except threading.BrokenBarrierError:
+        pass
+    for thread in threads:
+        thread.join()
+    finished = time.perf_counter()
+
+    report = {
+        "config": {
+            "bots": args.bots,
+            "duration_s": args.duration,
+            "mix": mix,
+            "codec": args.codec,
+            "framing": args.framing,
+            "compress": args.compress,
+        },
+        **run.traffic.report(finished - run.started),
+        "setup": run.setup.report(run.started - run.setup_started),
+        "bot_failures": run.bot_failures,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    if run.bot_failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
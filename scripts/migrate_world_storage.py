@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Convert a row-per-tile world database to the chunked BLOB layout.
+
+Stop the server first. The conversion runs in one transaction, so an
+interrupted run leaves the database unchanged.
+"""
+
+import argparse
+
+from server_app import db
+from server_app.storage import DEFAULT_CHUNK_SIZE, convert_tiles_to_chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert land_tiles rows to world_chunks")
+    parser.add_argument("--db", default="data/conquest.db")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with db.connect(args.db) as conn:
+        db.migrate(conn)
+        storage = conn.execute("SELECT storage FROM world_meta WHERE id=1").fetchone()["storage"]
+        if storage != "tiles":
+            raise SystemExit(f"World is already stored as {storage!r}")
+        written = convert_tiles_to_chunks(conn, args.chunk_size)
+        conn.execute("VACUUM")
+    print(f"Converted world to {args.chunk_size}x{args.chunk_size} chunks ({written} written)")
+
+
+if __name__ == "__main__":
+    main()
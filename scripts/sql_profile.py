@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""Print the heaviest SQL statements from a server started with ``--sql-profile``.
+
+    python -m scripts.sql_profile --token SECRET --order-by seconds --limit 15
+    python -m scripts.sql_profile --token SECRET --json --reset
+"""
+
+import argparse
+import json
+import sys
+
+from client_app import ConquestClient
+from client_app.protocol import ProtocolError
+
+SQL_WIDTH = 72
+
+
+def render_table(statements: list[dict]) -> str:
+    header = f"{'seconds':>10} {'calls':>8} {'mean_us':>10} {'rows':>8} {'vm_k':>8}  {'message_type':<16} sql"
+    lines = [header, "-" * len(header)]
+    for entry in statements:
+        sql = entry["sql"] if len(entry["sql"]) <= SQL_WIDTH else entry["sql"][: SQL_WIDTH - 3] + "..."
+        mean = "-" if entry["mean_us"] is None else f"{entry['mean_us']:.1f}"
+        lines.append(
+            f"{entry['seconds']:>10.4f} {entry['calls']:>8} {mean:>10} {entry['rows']:>8} {entry['vm_steps_k']:>8}"
+            f"  {entry['message_type']:<16} {sql}"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dump the server's SQL statement profile")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--token", required=True, help="The server's --admin-token")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--order-by", choices=("seconds", "calls", "rows", "vm_steps"), default="seconds")
+    parser.add_argument("--reset", action="store_true", help="Clear the totals after reading them")
+    parser.add_argument("--json", action="store_true", help="Print the raw response instead of a table")
+    args = parser.parse_args()
+
+    payload = {"token": args.token, "limit": args.limit, "order_by": args.order_by, "reset": args.reset}
+    try:
+        with ConquestClient(args.host, args.port) as client:
+            profile = client.request("admin.sql_profile", payload)
+    except (OSError, ProtocolError) as exc:
+        sys.exit(f"sql_profile: {exc}")
+    if args.json:
+        print(json.dumps(profile, indent=2))
+        return
+    print(f"{len(profile['statements'])} statements over {profile['seconds_profiled']}s")
+    print(render_table(profile["statements"]))
+
+
+if __name__ == "__main__":
+    main()
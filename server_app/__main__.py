@@ -1,7 +1,20 @@
 import argparse
 
-from .app import run_server
+from .app import ENGINES, run_server
 from .config import ServerConfig
+from .spawn import SPAWN_STRATEGIES
+from .storage import FLUSH_POLICIES, STORAGE_LAYOUTS
+
+
+def parse_cost(spec: str) -> tuple[str, float]:
+    """Parse ``TYPE=COST`` for ``--rate-cost``."""
+    message_type, separator, cost = spec.partition("=")
+    try:
+        if not separator:
+            raise ValueError
+        return message_type.strip(), float(cost)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected TYPE=COST, got {spec!r}") from None
 
 
 def main() -> None:
@@ -12,6 +25,27 @@ def main() -> None:
     parser.add_argument("--width", type=int, default=100)
     parser.add_argument("--height", type=int, default=100)
     parser.add_argument("--session-ttl", type=int, default=60 * 60 * 24 * 7)
+    parser.add_argument("--engine", choices=ENGINES, default="threading")
+    parser.add_argument("--workers", type=int, default=8, help="Executor threads for the asyncio engine")
+    parser.add_argument("--kdf-workers", type=int, default=2, help="Password hashing processes (0 = inline)")
+    parser.add_argument("--spawn", choices=SPAWN_STRATEGIES, default="first", help="Spawn placement strategy")
+    parser.add_argument("--storage", choices=STORAGE_LAYOUTS, default="tiles", help="Tile storage layout for new worlds")
+    parser.add_argument("--flush-policy", choices=FLUSH_POLICIES, default="sync", help="When tile changes reach SQLite")
+    parser.add_argument("--world-path", default="data/conquest.world", help="World file for --storage mmap")
+    parser.add_argument("--compression-level", type=int, default=6, help="zlib level for responses (0 = off)")
+    parser.add_argument("--compression-threshold", type=int, default=1024, help="Smallest body to compress, bytes")
+    parser.add_argument("--admin-token", default=None, help="Token that enables admin.* messages")
+    parser.add_argument("--sql-profile", action="store_true", help="Record per-statement SQL timings (admin.sql_profile)")
+    parser.add_argument("--profile", metavar="DIR", default=None, help="Enable admin.profile captures, written to DIR")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Tokens per second per connection (0 = off)")
+    parser.add_argument("--rate-burst", type=float, default=60.0, help="Token bucket size per connection")
+    parser.add_argument("--user-rate-limit", type=float, default=0.0, help="Tokens per second per user (0 = off)")
+    parser.add_argument("--user-rate-burst", type=float, default=120.0, help="Token bucket size per user")
+    parser.add_argument("--user-in-flight", type=int, default=0, help="Concurrent requests per user (0 = unlimited)")
+    parser.add_argument(
+        "--rate-cost", type=parse_cost, action="append", default=[], metavar="TYPE=COST", help="Override a message cost"
+    )
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus text on 127.0.0.1:PORT/metrics")
     args = parser.parse_args()
 
     config = ServerConfig(
@@ -21,6 +55,25 @@ def main() -> None:
         world_width=args.width,
         world_height=args.height,
         session_ttl_seconds=args.session_ttl,
+        engine=args.engine,
+        executor_workers=args.workers,
+        kdf_workers=args.kdf_workers,
+        spawn_strategy=args.spawn,
+        world_storage=args.storage,
+        world_flush_policy=args.flush_policy,
+        world_path=args.world_path,
+        compression_level=args.compression_level,
+        compression_threshold_bytes=args.compression_threshold,
+        admin_token=args.admin_token,
+        metrics_port=args.metrics_port,
+        sql_profile=args.sql_profile,
+        profile_dir=args.profile,
+        rate_limit_connection_rate=args.rate_limit,
+        rate_limit_connection_burst=args.rate_burst,
+        rate_limit_user_rate=args.user_rate_limit,
+        rate_limit_user_burst=args.user_rate_burst,
+        rate_limit_user_in_flight=args.user_in_flight,
+        rate_limit_costs=tuple(args.rate_cost),
     )
     run_server(config)
 
@@ -0,0 +1,161 @@
+"""Asyncio engine: one event loop serves every connection with stream readers.
+
+Idle players cost a coroutine instead of an OS thread. Blocking work (SQLite,
+PBKDF2) is pushed to a bounded thread pool that runs the shared ``dispatch``.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .app import ConnectionState, ConquestDispatcher
+from .config import ServerConfig
+from .protocol import FRAME_HEADER, WireFormat
+from .subscriptions import resync_frame
+
+
+class AsyncOutbox:
+    """Bounded push queue drained by a writer task on the connection's loop.
+
+    ``push`` may be called from any thread (dispatch runs in the executor).
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter, maxsize: int, wire: WireFormat):
+        self._loop = loop
+        self.wire = wire
+        self._writer = writer
+        self._queue: asyncio.Queue[bytes] = asyncio.Queue(maxsize)
+        self._task: asyncio.Task | None = None
+        self._overflowed = False
+        self._closed = False
+        self.dropped = 0
+
+    def push(self, frame: bytes) -> None:
+        self._loop.call_soon_threadsafe(self._enqueue, frame)
+
+    def _enqueue(self, frame: bytes) -> None:
+        if self._closed:
+            return
+        if self._task is None:
+            self._task = self._loop.create_task(self._run())
+        try:
+            self._queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self._overflowed = True
+
+    def close(self) -> None:
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                frame = await self._queue.get()
+                self._writer.write(frame)
+                if self._overflowed and self._queue.empty():
+                    self._overflowed = False
+                    self._writer.write(resync_frame(self.wire))
+                await self._writer.drain()
+        except ConnectionError:
+            return
+
+
+class AsyncConquestServer(ConquestDispatcher):
+    def __init__(self, config: ServerConfig):
+        super().__init__(config)
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.executor_workers,
+            thread_name_prefix="conquest-worker",
+        )
+        self.loop = asyncio.new_event_loop()
+        self._stop = asyncio.Event()
+        self._stopped = threading.Event()
+        self._serving = False
+        self._server = self.loop.run_until_complete(
+            asyncio.start_server(
+                self._serve_connection,
+                config.host,
+                config.port,
+                limit=config.max_line_bytes,
+                reuse_address=True,
+            )
+        )
+        self.server_address = self._server.sockets[0].getsockname()[:2]
+
+    def __enter__(self) -> "AsyncConquestServer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.server_close()
+
+    def serve_forever(self) -> None:
+        self._serving = True
+        try:
+            self.loop.run_until_complete(self._run())
+        finally:
+            self._serving = False
+            self._stopped.set()
+
+    def shutdown(self) -> None:
+        """Stop ``serve_forever`` from another thread and wait for it to return."""
+        self.loop.call_soon_threadsafe(self._stop.set)
+        self._stopped.wait()
+
+    def server_close(self) -> None:
+        if self._serving:
+            raise RuntimeError("Call shutdown() before server_close()")
+        if not self.loop.is_closed():
+            self._server.close()
+            self.loop.run_until_complete(self._server.wait_closed())
+            self.loop.close()
+        self.executor.shutdown(wait=True)
+        self.close()
+
+    async def _run(self) -> None:
+        await self._stop.wait()
+        self._server.close()
+        await self._server.wait_closed()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _read_frame(reader: asyncio.StreamReader, wire: WireFormat) -> bytes:
+        if wire.framing == "newline":
+            return await reader.readline()
+        try:
+            header = await reader.readexactly(FRAME_HEADER.size)
+        except asyncio.IncompleteReadError as exc:
+            if exc.partial:
+                raise
+            return b""
+        return header + await reader.readexactly(wire.body_length(header))
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        wire = WireFormat(max_frame_bytes=self.config.max_line_bytes)
+        state = ConnectionState(AsyncOutbox(self.loop, writer, self.config.push_queue_size, wire), wire)
+        try:
+            writer.write(self.hello_frame())
+            await writer.drain()
+            while True:
+                try:
+                    raw = await self._read_frame(reader, wire)
+                except ValueError:
+                    # Frame exceeded ``max_line_bytes``; the stream cannot be resynchronised.
+                    writer.write(wire.encode("error", error="Message too large"))
+                    await writer.drain()
+                    return
+                if not raw:
+                    return
+                response = await self.loop.run_in_executor(self.executor, self.handle_line, state, raw)
+                writer.write(response)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            self.subscriptions.unsubscribe(state.outbox)
+            state.outbox.close()
+            writer.close()
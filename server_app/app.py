@@ -1,21 +1,85 @@
+import hmac
+import itertools
+import os
 import socketserver
 import threading
 import time
+from contextlib import contextmanager
 from typing import Any
 
 from . import auth, db
 from .config import ServerConfig
-from .protocol import parse_json_line, serialize_message
+from .background import PeriodicTask
+from .metrics import PrometheusExporter, ServerMetrics
+from .protocol import CODECS, COMPRESSIONS, FRAMINGS, Compressor, FrameTooLarge, WireFormat, serialize_message
+from .ratelimit import RateLimited, RateLimiter
+from .sampler import SamplingProfiler
+from .sessions import CachedSession, SessionCache
+from .spawn import SPAWN_STRATEGIES, SpawnAllocator
+from .sqlprofile import SqlProfiler
+from .storage import FLUSH_POLICIES, STORAGE_LAYOUTS, WriteBehindFlusher, create_store
+from .subscriptions import SubscriptionHub, ThreadedOutbox, Viewport
 from .validators import (
     validate_action_claim,
+    validate_admin,
+    validate_admin_profile,
+    validate_admin_sql_profile,
     validate_auth_login,
     validate_auth_register,
     validate_auth_resume,
+    validate_batch,
+    validate_hello,
+    validate_request_id,
     validate_world_region,
+    validate_world_subscribe,
 )
 from .world import WorldService
 
 
+HELLO_MESSAGE = "Conquest authoritative server ready"
+
+# Message types that never write. They run on read-only WAL connections and do
+# not take ``db_lock``, so they proceed while a write is in flight.
+READ_ONLY_TYPES = frozenset(
+    {"ping", "auth.resume", "world.meta", "world.state", "world.region", "world.subscribe", "world.unsubscribe"}
+)
+
+# Message types allowed inside a ``batch``. Auth and subscription changes
+# touch state outside the transaction and cannot be rolled back with it.
+BATCHABLE_TYPES = frozenset({"ping", "world.meta", "world.state", "world.region", "action.claim"})
+
+# Metrics are kept per known type; anything else is counted as ``unknown`` so
+# clients cannot grow the label set.
+MESSAGE_TYPES = READ_ONLY_TYPES | {
+    "hello",
+    "auth.register",
+    "auth.login",
+    "auth.logout",
+    "action.claim",
+    "batch",
+    "admin.metrics",
+    "admin.sql_profile",
+    "admin.profile",
+}
+
+
+class ConnectionState:
+    """Per-connection session state that ``dispatch`` reads and updates.
+
+    ``outbox`` receives server-initiated frames; ``None`` means the
+    connection cannot take pushes. ``wire`` is the connection's negotiated
+    ``WireFormat``. ``rate_bucket`` is the connection's token bucket, created
+    by the rate limiter on first use.
+    """
+
+    def __init__(self, outbox=None, wire: WireFormat | None = None) -> None:
+        self.user_id: int | None = None
+        self.username: str | None = None
+        self.outbox = outbox
+        self.wire = wire if wire is not None else WireFormat()
+        self.rate_bucket = None
+
+
 class ConquestRequestHandler(socketserver.StreamRequestHandler):
     server: "ConquestTCPServer"
 
@@ -23,78 +87,347 @@ class ConquestRequestHandler(socketserver.StreamRequestHandler):
         super().setup()
         self.user_id: int | None = None
         self.username: str | None = None
+        self.wire = WireFormat(max_frame_bytes=self.server.config.max_line_bytes)
+        self.outbox = ThreadedOutbox(self.wfile, self.server.config.push_queue_size, self.wire)
+        self.rate_bucket = None
 
     def handle(self) -> None:
-        self.wfile.write(serialize_message("hello", message="Conquest authoritative server ready"))
+        self.outbox.send(self.server.hello_frame())
         while True:
-            raw = self.rfile.readline()
+            try:
+                raw = self.wire.read_frame(self.rfile)
+            except FrameTooLarge as exc:
+                # The rest of the frame is still unread, so the stream cannot be resynchronised.
+                self.outbox.send(self.wire.encode("error", error=str(exc)))
+                return
             if not raw:
                 return
-            try:
-                request = parse_json_line(raw)
-                response = self.server.dispatch(self, request)
-                self.wfile.write(serialize_message("ok", request_type=request["type"], data=response))
-            except Exception as exc:  # noqa: BLE001 - keep protocol errors in-band
-                self.wfile.write(serialize_message("error", error=str(exc)))
+            self.outbox.send(self.server.handle_line(self, raw))
 
+    def finish(self) -> None:
+        self.server.subscriptions.unsubscribe(self.outbox)
+        self.outbox.close()
+        super().finish()
 
-class ConquestTCPServer(socketserver.ThreadingTCPServer):
-    allow_reuse_address = True
+
+class ConquestDispatcher:
+    """Engine-independent request handling shared by every server front end."""
 
     def __init__(self, config: ServerConfig):
+        if config.world_flush_policy not in FLUSH_POLICIES:
+            raise ValueError(f"Unknown world flush policy: {config.world_flush_policy}")
+        if config.spawn_strategy not in SPAWN_STRATEGIES:
+            raise ValueError(f"Unknown spawn strategy: {config.spawn_strategy}")
+        if config.world_storage not in STORAGE_LAYOUTS:
+            raise ValueError(f"Unknown world storage layout: {config.world_storage}")
         self.config = config
         self.db_lock = threading.Lock()
-        db.initialize(config.db_path, config.world_width, config.world_height)
-        with db.connect(config.db_path) as conn:
-            self._cleanup_expired_sessions(conn)
-        super().__init__((config.host, config.port), ConquestRequestHandler)
+        self.metrics = ServerMetrics()
+        self.sql_profiler = SqlProfiler(self.metrics.current_type) if config.sql_profile else None
+        self.sampler = SamplingProfiler() if config.profile_dir else None
+        self._capture_ids = itertools.count(1)
+        db.initialize(
+            config.db_path,
+            config.world_width,
+            config.world_height,
+            storage=config.world_storage,
+            chunk_size=config.world_chunk_size if config.world_storage == "chunks" else None,
+        )
+        # Load before any pool or worker exists so a layout mismatch leaks nothing.
+        self.store = create_store(
+            config.world_storage,
+            chunk_size=config.world_chunk_size,
+            world_path=config.world_path,
+        )
+        with db.connect(config.db_path, profiler=self.sql_profiler) as conn:
+            self.grid = self.store.load(conn, config.world_history_limit)
+        pool_options = {
+            "synchronous": config.db_synchronous,
+            "cache_size_kib": config.db_cache_size_kib,
+            "statement_cache_size": config.db_statement_cache_size,
+            "profiler": self.sql_profiler,
+        }
+        self.readers = db.ConnectionPool(config.db_path, config.db_pool_size, read_only=True, **pool_options)
+        self.writer = db.ConnectionPool(config.db_path, 1, **pool_options)
+        self.hasher = auth.PasswordHasher(config.kdf_workers)
+        self.subscriptions = SubscriptionHub()
+        self.sessions = SessionCache()
+        self.spawner = SpawnAllocator(self.grid, config.spawn_strategy)
+        self.rate_limiter = RateLimiter(config, self.grid.width, self.grid.height)
+        self.compression_stats = self.metrics.compression
+        self.compressor = None
+        if config.compression_level > 0:
+            self.compressor = Compressor(
+                config.compression_threshold_bytes, config.compression_level, self.compression_stats
+            )
+        self.sweep_sessions()
+        self.session_sweeper = PeriodicTask(
+            self.sweep_sessions,
+            config.session_sweep_interval_seconds,
+            name="conquest-session-sweep",
+            description="Session sweep",
+        )
+        self.session_sweeper.start()
+        self.flusher = None
+        if config.world_flush_policy == "interval":
+            self.flusher = WriteBehindFlusher(self.flush_world, config.world_flush_interval_seconds)
+            self.flusher.start()
+        self.metrics_exporter = None
+        if config.metrics_port is not None:
+            self.metrics_exporter = PrometheusExporter(self.metrics, config.metrics_host, config.metrics_port)
+            self.metrics_exporter.start()
+
+    def close(self) -> None:
+        """Release resources held by the dispatcher. Safe to call more than once."""
+        self.session_sweeper.stop()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+        if self.flusher is not None:
+            self.flusher.stop()
+            self.flusher = None
+        self.readers.close()
+        self.writer.close()
+        self.hasher.close()
+        self.store.close()
 
-    def dispatch(self, handler: ConquestRequestHandler, request: dict[str, Any]) -> dict[str, Any]:
+    def flush_world(self) -> int:
+        """Persist dirty grid tiles in one transaction and return how many were written."""
+        with self._locked():
+            with self.writer.connection() as conn:
+                changes = self.grid.take_dirty()
+                if not changes:
+                    return 0
+                try:
+                    self.store.write(conn, changes)
+                    conn.commit()
+                except Exception:
+                    self.grid.mark_dirty(changes)
+                    raise
+                return len(changes)
+
+    def sweep_sessions(self) -> int:
+        """Delete expired sessions from the table and the cache; return rows deleted."""
+        now = time.time()
+        with self._locked():
+            with self.writer.connection() as conn:
+                deleted = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+                conn.commit()
+        self.sessions.evict_expired(now)
+        return deleted
+
+    def hello_frame(self) -> bytes:
+        """Greeting sent in the baseline format, listing the formats a client may switch to."""
+        return serialize_message(
+            "hello",
+            message=HELLO_MESSAGE,
+            codecs=list(CODECS),
+            framings=list(FRAMINGS),
+            compression=self.compressions,
+        )
+
+    @property
+    def compressions(self) -> list[str]:
+        return list(COMPRESSIONS) if self.compressor is not None else []
+
+    def handle_line(self, handler, raw: bytes) -> bytes:
+        """Run one newline-delimited request and return the encoded response frame.
+
+        A request ``id`` is echoed in the response, ok or error, so clients can
+        pipeline requests and match the replies.
+        """
+        started = time.perf_counter()
+        wire = getattr(handler, "wire", None) or WireFormat()
+        echo: dict[str, Any] = {}
+        label = "invalid"
+        error = False
+        try:
+            request = wire.decode(raw)
+            label = request["type"] if request["type"] in MESSAGE_TYPES else "unknown"
+            self.metrics.handling(label)
+            if "id" in request:
+                echo["id"] = validate_request_id(request["id"])
+            with self.rate_limiter.admit(handler, request["type"], request.get("payload") or {}):
+                response = self.dispatch(handler, request)
+            frame = wire.encode("ok", request_type=request["type"], data=response, **echo)
+        except RateLimited as exc:
+            frame = wire.encode("error", error=str(exc), retry_after=exc.retry_after, **echo)
+            error = True
+        except Exception as exc:  # noqa: BLE001 - keep protocol errors in-band
+            frame = wire.encode("error", error=str(exc), **echo)
+            error = True
+        finally:
+            self.metrics.handling(None)
+        wire.reply_encoded()
+        self.metrics.observe_request(label, time.perf_counter() - started, len(raw), len(frame), error=error)
+        return frame
+
+    def dispatch(self, handler, request: dict[str, Any]) -> dict[str, Any]:
         msg_type = request["type"]
         payload = request.get("payload", {}) or {}
 
-        with self.db_lock:
-            with db.connect(self.config.db_path) as conn:
-                if msg_type != "auth.resume":
-                    self._cleanup_expired_sessions(conn)
-                world = WorldService(
-                    conn,
-                    default_power=self.config.default_power,
-                    max_power=self.config.max_power,
-                    power_regen_per_tick=self.config.power_regen_per_tick,
-                    tick_seconds=self.config.tick_seconds,
-                )
+        # Register and login stretch passwords first and only take the write
+        # lock for their short database steps.
+        if msg_type == "auth.register":
+            return self._register(validate_auth_register(payload))
+        if msg_type == "auth.login":
+            return self._login(handler, validate_auth_login(payload))
+        if msg_type == "hello":
+            return self._hello(handler, validate_hello(payload, CODECS, FRAMINGS, self.compressions))
+        if msg_type == "admin.metrics":
+            return self._admin_metrics(validate_admin(payload))
+        if msg_type == "admin.sql_profile":
+            return self._admin_sql_profile(validate_admin_sql_profile(payload))
+        if msg_type == "admin.profile":
+            return self._admin_profile(validate_admin_profile(payload))
+        if msg_type == "batch":
+            return self._batch(handler, validate_batch(payload, BATCHABLE_TYPES, self.config.batch_max_items))
+
+        if msg_type in READ_ONLY_TYPES:
+            with self.readers.connection() as conn:
+                return self._handle(handler, conn, msg_type, payload)
+
+        with self._write_connection() as conn:
+            return self._handle(handler, conn, msg_type, payload)
+
+    @contextmanager
+    def _locked(self):
+        """Hold ``db_lock``, recording the wait and hold times in ``metrics``."""
+        requested = time.perf_counter()
+        self.db_lock.acquire()
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.db_lock.release()
+            self.metrics.observe_lock(acquired - requested, time.perf_counter() - acquired)
+
+    def _after_write(self) -> None:
+        if self.flusher is not None and self.grid.dirty_count >= self.config.world_flush_max_dirty:
+            self.flusher.wake()
+
+    @contextmanager
+    def _write_connection(self):
+        """Borrow the writer under ``db_lock`` for one transaction.
+
+        The transaction commits when the block exits normally. On an error it
+        rolls back, and tile changes made in memory are reverted with it.
+        """
+        with self._locked():
+            revision_before = self.grid.revision
+            ceiling_before = self.grid.revision_ceiling
+            with self.writer.connection() as conn:
+                try:
+                    yield conn
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    self._revert_world(conn, revision_before, ceiling_before)
+                    conn.commit()
+                    raise
+            revision, changed = self.grid.changes_since(revision_before)
+            tiles = [self.grid.tile(x, y) for x, y in changed or ()]
+        self._after_write()
+        self.subscriptions.publish(revision, tiles)
+
+    def _revert_world(self, conn, revision: int, ceiling: int) -> None:
+        """Undo grid changes after ``revision`` whose SQL side was just rolled back."""
+        self.grid.revert_since(revision, mark_dirty=self.config.world_flush_policy != "sync")
+        # A ceiling reserved inside the rolled-back work was lost with it.
+        self._world(conn).reserve_revisions(force=self.grid.revision_ceiling != ceiling)
+
+    def _batch(self, handler, payload: dict[str, Any]) -> dict[str, Any]:
+        """Run sub-requests under one lock acquisition and one transaction.
+
+        ``atomic`` fails the whole batch on the first failing item and applies
+        nothing. ``best_effort`` runs each item in a savepoint, rolls back only
+        the items that fail and reports them as errors.
+        """
+        atomic = payload["mode"] == "atomic"
+        results = []
+        with self._write_connection() as conn:
+            if not conn.in_transaction:
+                # Savepoints must nest inside a transaction, or RELEASE would commit.
+                conn.execute("BEGIN")
+            for position, item in enumerate(payload["requests"]):
+                item_type = item["type"]
+                if atomic:
+                    try:
+                        data = self._handle(handler, conn, item_type, item["payload"])
+                    except Exception as exc:
+                        raise ValueError(f"Batch item {position} ({item_type}) failed: {exc}") from exc
+                    results.append({"type": "ok", "request_type": item_type, "data": data})
+                    continue
+                revision, ceiling = self.grid.revision, self.grid.revision_ceiling
+                conn.execute("SAVEPOINT batch_item")
+                try:
+                    data = self._handle(handler, conn, item_type, item["payload"])
+                except Exception as exc:  # noqa: BLE001 - reported per item
+                    conn.execute("ROLLBACK TO batch_item")
+                    self._revert_world(conn, revision, ceiling)
+                    results.append({"type": "error", "request_type": item_type, "error": str(exc)})
+                else:
+                    results.append({"type": "ok", "request_type": item_type, "data": data})
+                finally:
+                    conn.execute("RELEASE batch_item")
+        return {"mode": payload["mode"], "results": results}
+
+    def _world(self, conn) -> WorldService:
+        return WorldService(
+            conn,
+            default_power=self.config.default_power,
+            max_power=self.config.max_power,
+            power_regen_per_tick=self.config.power_regen_per_tick,
+            tick_seconds=self.config.tick_seconds,
+            grid=self.grid,
+            store=self.store,
+            write_through=self.config.world_flush_policy == "sync",
+            spawner=self.spawner,
+        )
 
-                if msg_type == "auth.register":
-                    return self._register(conn, world, validate_auth_register(payload))
-                if msg_type == "auth.login":
-                    return self._login(handler, conn, validate_auth_login(payload))
-                if msg_type == "auth.resume":
-                    return self._resume(handler, conn, validate_auth_resume(payload))
-                if msg_type == "auth.logout":
-                    return self._logout(handler, conn, validate_auth_resume(payload))
-                if msg_type == "world.meta":
-                    return world.get_world_meta()
-                if msg_type == "world.state":
-                    self._require_auth(handler)
-                    return world.get_user_state(handler.user_id)
-                if msg_type == "world.region":
-                    region = validate_world_region(payload)
-                    return {"tiles": world.world_patch_since(**region)}
-                if msg_type == "action.claim":
-                    self._require_auth(handler)
-                    claim = validate_action_claim(payload)
-                    return world.claim_tile(
-                        handler.user_id,
-                        claim["x"],
-                        claim["y"],
-                        power_cost=claim["power_cost"],
-                    )
-                if msg_type == "ping":
-                    return {"pong": True}
-                raise ValueError(f"Unknown message type: {msg_type}")
-
-    def _register(self, conn, world: WorldService, payload: dict[str, Any]) -> dict[str, Any]:
+    def _handle(self, handler, conn, msg_type: str, payload: dict[str, Any]) -> dict[str, Any]:
+        world = self._world(conn)
+
+        if msg_type == "auth.resume":
+            return self._resume(handler, conn, validate_auth_resume(payload))
+        if msg_type == "auth.logout":
+            return self._logout(handler, conn, validate_auth_resume(payload))
+        if msg_type == "world.meta":
+            return world.get_world_meta()
+        if msg_type == "world.state":
+            self._require_auth(handler)
+            return world.get_user_state(handler.user_id)
+        if msg_type == "world.region":
+            region = validate_world_region(payload)
+            encoding = region.pop("encoding")
+            since_revision = region.pop("since_revision")
+            if since_revision is not None:
+                changes = world.region_changes_since(since_revision, **region)
+                if changes is not None:
+                    return changes
+            # Read the revision first: tiles read afterwards can only be newer.
+            revision = self.grid.revision
+            if encoding == "tiles":
+                return {"revision": revision, "delta": False, "tiles": world.world_patch_since(**region)}
+            return {"revision": revision, "delta": False, **world.encoded_region(encoding, **region)}
+        if msg_type == "action.claim":
+            self._require_auth(handler)
+            claim = validate_action_claim(payload)
+            return world.claim_tile(
+                handler.user_id,
+                claim["x"],
+                claim["y"],
+                power_cost=claim["power_cost"],
+            )
+        if msg_type == "world.subscribe":
+            return self._subscribe(handler, validate_world_subscribe(payload))
+        if msg_type == "world.unsubscribe":
+            return {"unsubscribed": self.subscriptions.unsubscribe(self._outbox(handler))}
+        if msg_type == "ping":
+            return {"pong": True}
+        raise ValueError(f"Unknown message type: {msg_type}")
+
+    def _register(self, payload: dict[str, Any]) -> dict[str, Any]:
         username = payload["username"].strip()
         password = payload["password"]
         if len(username) < 3:
@@ -102,36 +435,39 @@ class ConquestTCPServer(socketserver.ThreadingTCPServer):
         if len(password) < 8:
             raise ValueError("Password must be at least 8 characters")
 
-        hashed = auth.hash_password(password)
-        try:
-            cursor = conn.execute(
-                "INSERT INTO users (username, password_hash) VALUES (?, ?)",
-                (username, hashed),
-            )
-        except Exception as exc:  # sqlite uniqueness message is acceptable here
-            raise ValueError(f"Could not register user: {exc}") from exc
+        hashed = self.hasher.hash_password(password)
+        with self._write_connection() as conn:
+            try:
+                cursor = conn.execute(
+                    "INSERT INTO users (username, password_hash) VALUES (?, ?)",
+                    (username, hashed),
+                )
+            except Exception as exc:  # sqlite uniqueness message is acceptable here
+                raise ValueError(f"Could not register user: {exc}") from exc
 
-        user_id = int(cursor.lastrowid)
-        world.create_user_resources(user_id)
-        spawn_x, spawn_y = world.spawn_for_user_if_needed(user_id)
-        conn.commit()
+            user_id = int(cursor.lastrowid)
+            world = self._world(conn)
+            world.create_user_resources(user_id)
+            spawn_x, spawn_y = world.spawn_for_user_if_needed(user_id)
         return {"username": username, "spawn": {"x": spawn_x, "y": spawn_y}}
 
-    def _login(self, handler: ConquestRequestHandler, conn, payload: dict[str, Any]) -> dict[str, Any]:
+    def _login(self, handler, payload: dict[str, Any]) -> dict[str, Any]:
         username = payload["username"].strip()
         password = payload["password"]
-        row = conn.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,)).fetchone()
-        if row is None or not auth.verify_password(password, row["password_hash"]):
+        with self.readers.connection() as conn:
+            row = conn.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,)).fetchone()
+        if row is None or not self.hasher.verify_password(password, row["password_hash"]):
             raise ValueError("Invalid username or password")
 
         token = auth.new_session_token()
         now = time.time()
         expires_at = now + self.config.session_ttl_seconds
-        conn.execute(
-            "INSERT INTO sessions (token, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
-            (token, row["id"], now, expires_at),
-        )
-        conn.commit()
+        with self._write_connection() as conn:
+            conn.execute(
+                "INSERT INTO sessions (token, user_id, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (token, row["id"], now, expires_at),
+            )
+        self._respawn_if_landless(int(row["id"]))
 
         handler.user_id = int(row["id"])
         handler.username = username
@@ -142,27 +478,50 @@ class ConquestTCPServer(socketserver.ThreadingTCPServer):
             "expires_at": expires_at,
         }
 
-    def _resume(self, handler: ConquestRequestHandler, conn, payload: dict[str, Any]) -> dict[str, Any]:
+    def _resume(self, handler, conn, payload: dict[str, Any]) -> dict[str, Any]:
         token = payload["token"]
-        row = conn.execute(
-            "SELECT users.id, users.username, sessions.expires_at FROM sessions JOIN users ON users.id = sessions.user_id WHERE sessions.token = ?",
-            (token,),
-        ).fetchone()
-        if row is None:
+
+        def load(token: str) -> CachedSession | None:
+            row = conn.execute(
+                "SELECT users.id, users.username, sessions.expires_at FROM sessions JOIN users ON users.id = sessions.user_id WHERE sessions.token = ?",
+                (token,),
+            ).fetchone()
+            return CachedSession(int(row["id"]), row["username"], row["expires_at"]) if row is not None else None
+
+        session = self.sessions.lookup(token, load)
+        if session is None:
             raise ValueError("Invalid session token")
-        if row["expires_at"] <= time.time():
-            conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
-            conn.commit()
+        if session.expires_at <= time.time():
+            # The sweeper deletes the row; only the cache entry goes now.
+            self.sessions.discard(token)
             raise ValueError("Session token expired")
 
-        handler.user_id = int(row["id"])
-        handler.username = row["username"]
+        handler.user_id = session.user_id
+        handler.username = session.username
+        self._respawn_if_landless(session.user_id)
         return {"user_id": handler.user_id, "username": handler.username}
 
-    def _logout(self, handler: ConquestRequestHandler, conn, payload: dict[str, Any]) -> dict[str, Any]:
+    def _respawn_if_landless(self, user_id: int) -> None:
+        """Give a user with no tiles a new spawn, if there is free land.
+
+        Under write-behind a crash can lose a spawn tile whose user row was
+        committed. This is best-effort: on a full world the user still logs
+        in, just without land.
+        """
+        if self.grid.first_owned_tile(user_id) is not None:
+            return
+        try:
+            with self._write_connection() as conn:
+                self._world(conn).spawn_for_user_if_needed(user_id)
+        except ValueError:
+            pass
+
+    def _logout(self, handler, conn, payload: dict[str, Any]) -> dict[str, Any]:
         token = payload["token"]
         deleted = conn.execute("DELETE FROM sessions WHERE token = ?", (token,)).rowcount
         conn.commit()
+        # Discard only after the commit so a concurrent resume cannot re-cache the token.
+        self.sessions.discard(token)
         if handler.user_id is not None:
             handler.user_id = None
             handler.username = None
@@ -170,19 +529,118 @@ class ConquestTCPServer(socketserver.ThreadingTCPServer):
             raise ValueError("Invalid session token")
         return {"logged_out": True}
 
+    def _require_admin(self, token: str) -> None:
+        admin_token = self.config.admin_token
+        if not admin_token:
+            raise ValueError("Admin messages are disabled on this server")
+        if not hmac.compare_digest(token.encode(), admin_token.encode()):
+            raise ValueError("Invalid admin token")
+
+    def _admin_metrics(self, payload: dict[str, str]) -> dict[str, Any]:
+        self._require_admin(payload["token"])
+        return {
+            **self.metrics.snapshot(),
+            "sessions_cached": len(self.sessions),
+            "subscribers": len(self.subscriptions),
+            "world_revision": self.grid.revision,
+        }
+
+    def _admin_sql_profile(self, payload: dict[str, Any]) -> dict[str, Any]:
+        self._require_admin(payload["token"])
+        profiler = self.sql_profiler
+        if profiler is None:
+            raise ValueError("SQL profiling is off; start the server with --sql-profile")
+        result = {
+            "seconds_profiled": round(time.monotonic() - profiler.started, 3),
+            "statements": profiler.top(payload["limit"], payload["order_by"]),
+        }
+        if payload["reset"]:
+            profiler.reset()
+        return result
+
+    def _admin_profile(self, payload: dict[str, Any]) -> dict[str, Any]:
+        """Sample every thread for ``seconds`` and write the capture under ``profile_dir``.
+
+        The reply is sent when the capture ends; this request's own thread is
+        left out of the samples.
+        """
+        self._require_admin(payload["token"])
+        if self.sampler is None:
+            raise ValueError("Profiling is off; start the server with --profile DIR")
+        capture = self.sampler.capture(
+            payload["seconds"], payload["interval_ms"] / 1000, include_idle=payload["include_idle"]
+        )
+        prefix = f"conquest-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._capture_ids)}"
+        return {
+            "seconds": capture.seconds,
+            "interval_ms": payload["interval_ms"],
+            "ticks": capture.ticks,
+            "samples": capture.samples,
+            "idle_samples": capture.idle,
+            "threads": sorted({thread_name for thread_name, _ in capture.stacks}),
+            "files": capture.write(self.config.profile_dir, prefix),
+            "top": capture.top(payload["top"]),
+        }
+
+    def _hello(self, handler, payload: dict[str, str]) -> dict[str, str]:
+        wire = getattr(handler, "wire", None)
+        if wire is None:
+            raise ValueError("This connection cannot negotiate a wire format")
+        if wire.requests > 1:
+            raise ValueError("hello must be the first request on a connection")
+        compressor = self.compressor if payload["compression"] != "none" else None
+        wire.switch(CODECS[payload["codec"]], payload["framing"], compressor)
+        return payload
+
     @staticmethod
-    def _require_auth(handler: ConquestRequestHandler) -> None:
+    def _outbox(handler):
+        outbox = getattr(handler, "outbox", None)
+        if outbox is None:
+            raise ValueError("This connection cannot receive pushed updates")
+        return outbox
+
+    def _subscribe(self, handler, payload: dict[str, int | None]) -> dict[str, Any]:
+        max_x = payload["max_x"] if payload["max_x"] is not None else self.grid.width - 1
+        max_y = payload["max_y"] if payload["max_y"] is not None else self.grid.height - 1
+        viewport = Viewport(payload["min_x"], payload["min_y"], max_x, max_y)
+        self.subscriptions.subscribe(self._outbox(handler), viewport)
+        return {"viewport": viewport.as_dict(), "revision": self.grid.revision}
+
+    @staticmethod
+    def _require_auth(handler) -> None:
         if handler.user_id is None:
             raise ValueError("Authentication required")
 
-    @staticmethod
-    def _cleanup_expired_sessions(conn) -> None:
-        conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
-        conn.commit()
+
+class ConquestTCPServer(ConquestDispatcher, socketserver.ThreadingTCPServer):
+    """Thread-per-connection engine built on ``socketserver``."""
+
+    allow_reuse_address = True
+
+    def __init__(self, config: ServerConfig):
+        ConquestDispatcher.__init__(self, config)
+        socketserver.ThreadingTCPServer.__init__(self, (config.host, config.port), ConquestRequestHandler)
+
+    def server_close(self) -> None:
+        super().server_close()
+        self.close()
+
+
+ENGINES = ("threading", "asyncio")
+
+
+def create_server(config: ServerConfig):
+    if config.engine == "threading":
+        return ConquestTCPServer(config)
+    if config.engine == "asyncio":
+        from .aio import AsyncConquestServer
+
+        return AsyncConquestServer(config)
+    raise ValueError(f"Unknown server engine: {config.engine}")
 
 
 def run_server(config: ServerConfig) -> None:
-    server = ConquestTCPServer(config)
-    print(f"[CONQUEST] Server listening on {config.host}:{config.port}")
+    server = create_server(config)
+    print(f"[CONQUEST] Server listening on {config.host}:{config.port} ({config.engine} engine)")
     with server:
         server.serve_forever()
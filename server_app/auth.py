@@ -1,5 +1,7 @@
 import hashlib
+import multiprocessing
 import secrets
+from concurrent.futures import ProcessPoolExecutor
 
 
 def hash_password(password: str) -> str:
@@ -16,3 +18,33 @@ def verify_password(password: str, stored_hash: str) -> bool:
 
 def new_session_token() -> str:
     return secrets.token_urlsafe(32)
+
+
+class PasswordHasher:
+    """Runs PBKDF2 in worker processes so key stretching never holds a server lock.
+
+    With ``workers=0`` the work runs inline in the calling thread instead.
+    """
+
+    def __init__(self, workers: int = 2):
+        self._executor = None
+        if workers > 0:
+            # Forked workers would inherit every open client socket and keep
+            # those connections alive after the server closes them.
+            context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    def hash_password(self, password: str) -> str:
+        if self._executor is None:
+            return hash_password(password)
+        return self._executor.submit(hash_password, password).result()
+
+    def verify_password(self, password: str, stored_hash: str) -> bool:
+        if self._executor is None:
+            return verify_password(password, stored_hash)
+        return self._executor.submit(verify_password, password, stored_hash).result()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,39 @@
+"""Periodic background threads used by the dispatcher."""
+
+import threading
+from collections.abc import Callable
+
+
+class PeriodicTask:
+    """Daemon thread that calls ``task`` every ``interval`` seconds or when woken."""
+
+    def __init__(self, task: Callable[[], object], interval: float, *, name: str, description: str):
+        self._task = task
+        self._interval = interval
+        self._description = description
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            self._stopping.set()
+            self._wakeup.set()
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wakeup.wait(self._interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                return
+            try:
+                self._task()
+            except Exception as exc:  # noqa: BLE001 - keep the thread alive; retry next round
+                print(f"[CONQUEST] {self._description} failed: {exc}")
@@ -13,3 +13,38 @@ class ServerConfig:
     power_regen_per_tick: int = 1
     tick_seconds: float = 2.0
     session_ttl_seconds: int = 60 * 60 * 24 * 7
+    session_sweep_interval_seconds: float = 60.0
+    engine: str = "threading"
+    executor_workers: int = 8
+    max_line_bytes: int = 1 << 20
+    compression_level: int = 6
+    admin_token: str | None = None
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int | None = None
+    sql_profile: bool = False
+    profile_dir: str | None = None
+    # Token buckets: ``rate`` tokens per second up to ``burst``; a rate of 0 turns that limit off.
+    rate_limit_connection_rate: float = 0.0
+    rate_limit_connection_burst: float = 60.0
+    rate_limit_user_rate: float = 0.0
+    rate_limit_user_burst: float = 120.0
+    rate_limit_user_in_flight: int = 0
+    rate_limit_region_tiles_per_token: int = 1024
+    # ``(message type, cost)`` pairs overriding ``ratelimit.MESSAGE_COSTS``.
+    rate_limit_costs: tuple[tuple[str, float], ...] = ()
+    compression_threshold_bytes: int = 1024
+    db_pool_size: int = 8
+    db_synchronous: str = "NORMAL"
+    db_cache_size_kib: int = 8192
+    db_statement_cache_size: int = 256
+    kdf_workers: int = 2
+    world_flush_policy: str = "sync"
+    world_flush_interval_seconds: float = 1.0
+    world_flush_max_dirty: int = 4096
+    world_history_limit: int = 65536
+    push_queue_size: int = 256
+    batch_max_items: int = 64
+    spawn_strategy: str = "first"
+    world_storage: str = "tiles"
+    world_chunk_size: int = 64
+    world_path: str = "data/conquest.world"
@@ -1,7 +1,12 @@
 import os
+import queue
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
 
+from .sqlprofile import ProfiledConnection, SqlProfiler
+
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS users (
@@ -23,6 +28,7 @@ CREATE TABLE IF NOT EXISTS world_meta (
     id INTEGER PRIMARY KEY CHECK (id = 1),
     width INTEGER NOT NULL,
     height INTEGER NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0,
     created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
     updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
@@ -46,46 +52,245 @@ CREATE TABLE IF NOT EXISTS resources (
 """
 
 
-@contextmanager
-def connect(db_path: str):
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+def _ensure_parent_dir(db_path: str) -> None:
     parent = os.path.dirname(db_path)
     if parent:
         os.makedirs(parent, exist_ok=True)
-    conn = sqlite3.connect(db_path)
+
+
+def open_connection(
+    db_path: str,
+    *,
+    synchronous: str = "NORMAL",
+    cache_size_kib: int = 8192,
+    statement_cache_size: int = 256,
+    check_same_thread: bool = True,
+    read_only: bool = False,
+    profiler: SqlProfiler | None = None,
+) -> sqlite3.Connection:
+    """Open a tuned connection. The caller owns it and must close it.
+
+    With a ``profiler`` every statement on the connection is recorded by it.
+    """
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unsupported synchronous mode: {synchronous}")
+    conn = sqlite3.connect(
+        db_path,
+        cached_statements=statement_cache_size,
+        check_same_thread=check_same_thread,
+        factory=ProfiledConnection if profiler is not None else sqlite3.Connection,
+    )
+    if profiler is not None:
+        conn.attach(profiler)
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA synchronous = {synchronous}")
+    # A negative cache_size is interpreted by SQLite as KiB rather than pages.
+    conn.execute(f"PRAGMA cache_size = {-int(cache_size_kib)}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+@contextmanager
+def connect(db_path: str, *, profiler: SqlProfiler | None = None):
+    _ensure_parent_dir(db_path)
+    conn = open_connection(db_path, profiler=profiler)
     try:
         yield conn
     finally:
         conn.close()
 
 
-def initialize(db_path: str, width: int, height: int) -> None:
-    with connect(db_path) as conn:
-        conn.executescript(SCHEMA)
+class ConnectionPool:
+    """Long-lived connections shared by request handlers.
 
-        session_cols = {row["name"] for row in conn.execute("PRAGMA table_info(sessions)").fetchall()}
-        if "expires_at" not in session_cols:
-            conn.execute("DROP TABLE sessions")
-            conn.execute(
-                """
-                CREATE TABLE sessions (
-                    token TEXT PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    created_at REAL NOT NULL,
-                    expires_at REAL NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-                """
+    Connections are opened lazily, up to ``size``, and handed out LIFO so the
+    warmest page cache is reused first. Borrowers that leave a transaction
+    open get it rolled back on return. A ``read_only`` pool opens its
+    connections with ``query_only`` so they can serve WAL readers in parallel
+    with the single writer.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 4,
+        *,
+        synchronous: str = "NORMAL",
+        cache_size_kib: int = 8192,
+        statement_cache_size: int = 256,
+        read_only: bool = False,
+        profiler: SqlProfiler | None = None,
+    ):
+        if size < 1:
+            raise ValueError("Connection pool size must be >= 1")
+        _ensure_parent_dir(db_path)
+        self.db_path = db_path
+        self.size = size
+        self._options = {
+            "synchronous": synchronous,
+            "cache_size_kib": cache_size_kib,
+            "statement_cache_size": statement_cache_size,
+            "read_only": read_only,
+            "profiler": profiler,
+        }
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._all: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Connection pool is closed")
+            if len(self._all) < self.size:
+                conn = open_connection(self.db_path, check_same_thread=False, **self._options)
+                self._all.append(conn)
+                return conn
+        return self._idle.get()
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            conns, self._all = self._all, []
+        for conn in conns:
+            conn.close()
+
+
+def _migrate_sessions_expiry(conn: sqlite3.Connection) -> None:
+    session_cols = {row["name"] for row in conn.execute("PRAGMA table_info(sessions)").fetchall()}
+    if "expires_at" not in session_cols:
+        conn.execute("DROP TABLE sessions")
+        conn.execute(
+            """
+            CREATE TABLE sessions (
+                token TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                FOREIGN KEY (user_id) REFERENCES users(id)
             )
+            """
+        )
+
+
+def _migrate_world_revision(conn: sqlite3.Connection) -> None:
+    meta_cols = {row["name"] for row in conn.execute("PRAGMA table_info(world_meta)").fetchall()}
+    if "revision" not in meta_cols:
+        conn.execute("ALTER TABLE world_meta ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+
+
+def _migrate_hot_path_indexes(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions (expires_at)")
+
+
+def _migrate_drop_owner_index(conn: sqlite3.Connection) -> None:
+    # Earlier builds created this in step 3; the in-memory grid answers owner lookups, so it only slowed writes.
+    conn.execute("DROP INDEX IF EXISTS idx_land_tiles_owner")
+
+
+def _migrate_world_chunks(conn: sqlite3.Connection) -> None:
+    meta_cols = {row["name"] for row in conn.execute("PRAGMA table_info(world_meta)").fetchall()}
+    if "storage" not in meta_cols:
+        conn.execute("ALTER TABLE world_meta ADD COLUMN storage TEXT NOT NULL DEFAULT 'tiles'")
+        conn.execute("ALTER TABLE world_meta ADD COLUMN chunk_size INTEGER")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS world_chunks (
+            cx INTEGER NOT NULL,
+            cy INTEGER NOT NULL,
+            owners BLOB NOT NULL,
+            terrain BLOB NOT NULL,
+            PRIMARY KEY (cx, cy)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+# Ordered ``(version, description, apply)`` steps run on top of SCHEMA. Append
+# new steps at the end; never renumber or edit one that has shipped. Steps
+# must tolerate a database that SCHEMA just created in its current shape.
+MIGRATIONS = (
+    (1, "sessions carry expires_at", _migrate_sessions_expiry),
+    (2, "world_meta.revision", _migrate_world_revision),
+    (3, "index for session expiry", _migrate_hot_path_indexes),
+    (4, "chunked world storage", _migrate_world_chunks),
+    (5, "drop the unused land_tiles owner index", _migrate_drop_owner_index),
+)
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def migrate(conn: sqlite3.Connection) -> list[int]:
+    """Apply pending migrations, one transaction each, and return the versions applied."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, applied_at REAL NOT NULL)"
+    )
+    applied = []
+    for version, _, apply in MIGRATIONS:
+        # IMMEDIATE takes the write lock before re-reading the version, so two
+        # processes starting together cannot apply the same step twice.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version > schema_version(conn):
+                apply(conn)
+                conn.execute("INSERT INTO schema_version (version, applied_at) VALUES (?, ?)", (version, time.time()))
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+
+def initialize(db_path: str, width: int, height: int, *, storage: str = "tiles", chunk_size: int | None = None) -> None:
+    """Create or upgrade the database and, for a new world, record its size and tile layout.
+
+    ``storage="tiles"`` inserts one ``land_tiles`` row per tile. ``"chunks"``
+    inserts nothing: ``world_chunks`` rows are created on first write.
+    """
+    with connect(db_path) as conn:
+        # WAL is persistent in the database file, so setting it once here covers
+        # every connection opened later, pooled or not.
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(SCHEMA)
+        migrate(conn)
 
         current = conn.execute("SELECT id FROM world_meta WHERE id=1").fetchone()
         if current is None:
             conn.execute(
-                "INSERT INTO world_meta (id, width, height) VALUES (1, ?, ?)",
-                (width, height),
-            )
-            conn.executemany(
-                "INSERT INTO land_tiles (x, y, owner_user_id, terrain) VALUES (?, ?, NULL, 'land')",
-                ((x, y) for y in range(height) for x in range(width)),
+                "INSERT INTO world_meta (id, width, height, storage, chunk_size) VALUES (1, ?, ?, ?, ?)",
+                (width, height, storage, chunk_size),
             )
+            if storage == "tiles":
+                conn.executemany(
+                    "INSERT INTO land_tiles (x, y, owner_user_id, terrain) VALUES (?, ?, NULL, 'land')",
+                    ((x, y) for y in range(height) for x in range(width)),
+                )
         conn.commit()
@@ -0,0 +1,335 @@
+"""Array-backed world grid: the in-memory source of truth for tile state.
+
+Owners are kept in a flat ``array('i')`` (0 means neutral) and terrain in a
+``bytearray`` of terrain codes, both indexed row-major as ``y * width + x``.
+Mutations are recorded as dirty tile indices so a store can persist them later.
+
+Every ownership change bumps ``revision`` and is appended to a bounded change
+history, which lets clients fetch only the tiles changed after a revision they
+already have. The persisted ``revision_ceiling`` is reserved ahead of use so
+revisions stay monotonic across restarts even if unflushed changes are lost.
+
+The grid is also split into ``chunk_size`` squares with a count of free
+(neutral land) and owned tiles per chunk, plus a min-heap of chunks that still
+have free land and an index of chunks that have an owner, which the spawn
+allocator uses instead of scanning tiles or chunks.
+"""
+
+import heapq
+import random
+import threading
+from array import array
+from collections import deque
+from itertools import islice
+from typing import Any
+
+TERRAIN_CODES = {"land": 0, "water": 1}
+TERRAIN_NAMES = {code: name for name, code in TERRAIN_CODES.items()}
+LAND = TERRAIN_CODES["land"]
+NO_OWNER = 0
+REVISION_BLOCK = 1024
+CHUNK_SIZE = 16
+
+
+class WorldGrid:
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        owners=None,
+        terrain=None,
+        *,
+        revision: int = 0,
+        history_limit: int = 65536,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        size = width * height
+        self.width = width
+        self.height = height
+        self.owners = owners if owners is not None else array("i", [NO_OWNER]) * size
+        self.terrain = terrain if terrain is not None else bytearray(size)
+        if len(self.owners) != size or len(self.terrain) != size:
+            raise ValueError("Grid buffers do not match world dimensions")
+        self._lock = threading.Lock()
+        self._dirty: set[int] = set()
+        self._owned: dict[int, set[int]] = {}
+        self.chunk_size = chunk_size
+        self.chunks_x = -(-width // chunk_size)
+        self.chunks_y = -(-height // chunk_size)
+        self.chunk_free = array("i")
+        self.chunk_owned = array("i")
+        self._free_chunks: list[int] = []
+        # Chunks with at least one owned tile, and each one's position in that list.
+        self._occupied: list[int] = []
+        self._occupied_at: dict[int, int] = {}
+        self.revision = revision
+        self.revision_ceiling = revision
+        # (revision, tile index, previous owner) per ownership change.
+        self._history: deque[tuple[int, int, int]] = deque(maxlen=history_limit)
+        self.rebuild_index()
+
+    def rebuild_index(self) -> None:
+        """Recompute the owner -> tiles index and chunk counts after bulk-loading buffers.
+
+        Rows that are all neutral land are only counted, and other rows are
+        checked a chunk-wide segment at a time, so a mostly neutral map costs
+        little more than a pass over its memory.
+        """
+        owned: dict[int, set[int]] = {}
+        size = self.chunk_size
+        chunk_count = self.chunks_x * self.chunks_y
+        chunk_free = array("i", [0]) * chunk_count
+        chunk_owned = array("i", [0]) * chunk_count
+        widths = [min(size, self.width - cx * size) for cx in range(self.chunks_x)]
+        plain_rows = [0] * self.chunks_y
+        owner_bytes = memoryview(self.owners).cast("B")
+        itemsize = self.owners.itemsize
+        neutral_row = bytes(self.width * itemsize)
+        land_row = bytes([LAND]) * self.width
+        for y in range(self.height):
+            row = y * self.width
+            if (
+                owner_bytes[row * itemsize : (row + self.width) * itemsize] == neutral_row
+                and self.terrain[row : row + self.width] == land_row
+            ):
+                plain_rows[y // size] += 1
+                continue
+            chunk_row = (y // size) * self.chunks_x
+            for cx, width in enumerate(widths):
+                start = row + cx * size
+                chunk = chunk_row + cx
+                if owner_bytes[start * itemsize : (start + width) * itemsize] == neutral_row[: width * itemsize]:
+                    chunk_free[chunk] += bytes(self.terrain[start : start + width]).count(LAND)
+                    continue
+                for index in range(start, start + width):
+                    owner = self.owners[index]
+                    if owner != NO_OWNER:
+                        owned.setdefault(owner, set()).add(index)
+                        chunk_owned[chunk] += 1
+                    elif self.terrain[index] == LAND:
+                        chunk_free[chunk] += 1
+        owner_bytes.release()
+        for cy, rows in enumerate(plain_rows):
+            if rows:
+                for cx, width in enumerate(widths):
+                    chunk_free[cy * self.chunks_x + cx] += rows * width
+        with self._lock:
+            self._owned = owned
+            self.chunk_free = chunk_free
+            self.chunk_owned = chunk_owned
+            # Ascending order is already a valid heap.
+            self._free_chunks = [chunk for chunk in range(chunk_count) if chunk_free[chunk]]
+            self._occupied = [chunk for chunk in range(chunk_count) if chunk_owned[chunk]]
+            self._occupied_at = {chunk: position for position, chunk in enumerate(self._occupied)}
+
+    def _chunk_of(self, index: int) -> int:
+        y, x = divmod(index, self.width)
+        return (y // self.chunk_size) * self.chunks_x + x // self.chunk_size
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def owner_at(self, x: int, y: int) -> int | None:
+        owner = self.owners[y * self.width + x]
+        return owner if owner != NO_OWNER else None
+
+    def terrain_at(self, x: int, y: int) -> str:
+        return TERRAIN_NAMES[self.terrain[y * self.width + x]]
+
+    def set_owner(self, x: int, y: int, owner: int | None, *, mark_dirty: bool = True) -> None:
+        index = y * self.width + x
+        new_owner = NO_OWNER if owner is None else owner
+        with self._lock:
+            old_owner = self.owners[index]
+            if old_owner == new_owner:
+                return
+            self.owners[index] = new_owner
+            chunk = self._chunk_of(index)
+            if old_owner != NO_OWNER:
+                tiles = self._owned[old_owner]
+                tiles.discard(index)
+                if not tiles:
+                    del self._owned[old_owner]
+                self.chunk_owned[chunk] -= 1
+                if not self.chunk_owned[chunk]:
+                    self._drop_occupied(chunk)
+            elif self.terrain[index] == LAND:
+                self.chunk_free[chunk] -= 1
+            if new_owner != NO_OWNER:
+                self._owned.setdefault(new_owner, set()).add(index)
+                self.chunk_owned[chunk] += 1
+                if self.chunk_owned[chunk] == 1:
+                    self._occupied_at[chunk] = len(self._occupied)
+                    self._occupied.append(chunk)
+            elif self.terrain[index] == LAND:
+                self.chunk_free[chunk] += 1
+                if self.chunk_free[chunk] == 1:
+                    heapq.heappush(self._free_chunks, chunk)
+            if mark_dirty:
+                self._dirty.add(index)
+            self.revision += 1
+            self._history.append((self.revision, index, old_owner))
+
+    def _drop_occupied(self, chunk: int) -> None:
+        # Swap-remove keeps this O(1); callers hold ``_lock``.
+        position = self._occupied_at.pop(chunk)
+        last = self._occupied.pop()
+        if last != chunk:
+            self._occupied[position] = last
+            self._occupied_at[last] = position
+
+    def needs_revision_reservation(self) -> bool:
+        """True once fewer than half a block of reserved revisions remain."""
+        return self.revision + REVISION_BLOCK // 2 > self.revision_ceiling
+
+    def changes_since(self, since: int) -> tuple[int, list[tuple[int, int]] | None]:
+        """Return ``(revision, tiles changed after since)``.
+
+        The tile list is ``None`` when the history no longer reaches back to
+        ``since`` (or ``since`` is from a different run) and a full snapshot is needed.
+        """
+        with self._lock:
+            revision = self.revision
+            if since > revision:
+                return revision, None
+            if since == revision:
+                return revision, []
+            if not self._history or since < self._history[0][0] - 1:
+                return revision, None
+            start = since - self._history[0][0] + 1
+            indices = sorted({index for _, index, _ in islice(self._history, start, None)})
+        return revision, [(index % self.width, index // self.width) for index in indices]
+
+    def revert_since(self, revision: int, *, mark_dirty: bool = True) -> int:
+        """Undo ownership changes made after ``revision``, newest first; return how many were undone.
+
+        The undo is applied as new changes, so ``revision`` keeps moving
+        forward and clients that already saw the undone state get a delta.
+        """
+        with self._lock:
+            if revision >= self.revision:
+                return 0
+            if not self._history or revision < self._history[0][0] - 1:
+                raise RuntimeError("Change history no longer reaches the requested revision")
+            start = revision - self._history[0][0] + 1
+            undo = list(islice(self._history, start, None))
+        for _, index, previous in reversed(undo):
+            self.set_owner(index % self.width, index // self.width, previous or None, mark_dirty=mark_dirty)
+        return len(undo)
+
+    def owned_tiles(self, owner: int) -> list[tuple[int, int]]:
+        """Tiles held by ``owner`` in row-major (y, x) order."""
+        with self._lock:
+            indices = sorted(self._owned.get(owner, ()))
+        return [(index % self.width, index // self.width) for index in indices]
+
+    def first_owned_tile(self, owner: int) -> tuple[int, int] | None:
+        with self._lock:
+            tiles = self._owned.get(owner)
+            if not tiles:
+                return None
+            index = min(tiles)
+        return (index % self.width, index // self.width)
+
+    def first_free_chunk(self) -> int | None:
+        """Lowest-numbered chunk with free land; full chunks are dropped from the heap lazily."""
+        with self._lock:
+            heap = self._free_chunks
+            while heap and not self.chunk_free[heap[0]]:
+                heapq.heappop(heap)
+            return heap[0] if heap else None
+
+    def occupied_chunks(self, limit: int, rng: random.Random) -> list[int]:
+        """Chunks that have an owner: all of them, or a random ``limit`` of them if there are more."""
+        with self._lock:
+            if len(self._occupied) <= limit:
+                return list(self._occupied)
+            return rng.sample(self._occupied, limit)
+
+    def chunk_bounds(self, chunk: int) -> tuple[int, int, int, int]:
+        cy, cx = divmod(chunk, self.chunks_x)
+        min_x = cx * self.chunk_size
+        min_y = cy * self.chunk_size
+        return (min_x, min_y, min(min_x + self.chunk_size, self.width) - 1, min(min_y + self.chunk_size, self.height) - 1)
+
+    def free_tiles_in_chunk(self, chunk: int) -> list[tuple[int, int]]:
+        """Neutral land tiles in ``chunk`` in row-major order."""
+        min_x, min_y, max_x, max_y = self.chunk_bounds(chunk)
+        tiles = []
+        for y in range(min_y, max_y + 1):
+            row = y * self.width
+            for x in range(min_x, max_x + 1):
+                if self.owners[row + x] == NO_OWNER and self.terrain[row + x] == LAND:
+                    tiles.append((x, y))
+        return tiles
+
+    def clip(self, min_x: int, min_y: int, max_x: int, max_y: int) -> tuple[int, int, int, int]:
+        return (max(min_x, 0), max(min_y, 0), min(max_x, self.width - 1), min(max_y, self.height - 1))
+
+    def region_cells(self, min_x: int, min_y: int, max_x: int, max_y: int):
+        """Row-major ``(owners, terrain)`` buffers for the clipped inclusive rectangle."""
+        min_x, min_y, max_x, max_y = self.clip(min_x, min_y, max_x, max_y)
+        if min_x == 0 and max_x == self.width - 1 and min_y <= max_y:
+            # Full-width rows are contiguous; for an mmap-backed grid these slices are zero-copy views.
+            start = min_y * self.width
+            stop = (max_y + 1) * self.width
+            return self.owners[start:stop], self.terrain[start:stop]
+        owners = array("i")
+        terrain = bytearray()
+        if min_x <= max_x:
+            for y in range(min_y, max_y + 1):
+                start = y * self.width + min_x
+                stop = y * self.width + max_x + 1
+                owners.frombytes(memoryview(self.owners[start:stop]).cast("B"))
+                terrain.extend(self.terrain[start:stop])
+        return owners, terrain
+
+    def tile(self, x: int, y: int) -> dict[str, Any]:
+        index = y * self.width + x
+        owner = self.owners[index]
+        return {
+            "x": x,
+            "y": y,
+            "terrain": TERRAIN_NAMES[self.terrain[index]],
+            "owner_user_id": owner if owner != NO_OWNER else None,
+        }
+
+    def region(self, min_x: int, min_y: int, max_x: int, max_y: int) -> list[dict[str, Any]]:
+        """Tile dicts for the inclusive rectangle, clipped to the world bounds."""
+        min_x, min_y, max_x, max_y = self.clip(min_x, min_y, max_x, max_y)
+        tiles = []
+        for y in range(min_y, max_y + 1):
+            start = y * self.width + min_x
+            stop = y * self.width + max_x + 1
+            owners = self.owners[start:stop]
+            terrain = self.terrain[start:stop]
+            for offset in range(len(owners)):
+                owner = owners[offset]
+                tiles.append(
+                    {
+                        "x": min_x + offset,
+                        "y": y,
+                        "terrain": TERRAIN_NAMES[terrain[offset]],
+                        "owner_user_id": owner if owner != NO_OWNER else None,
+                    }
+                )
+        return tiles
+
+    @property
+    def dirty_count(self) -> int:
+        return len(self._dirty)
+
+    def take_dirty(self) -> list[tuple[int, int, int | None]]:
+        """Drain pending changes as ``(x, y, owner_user_id)`` with their current values."""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            changes = []
+            for index in sorted(dirty):
+                owner = self.owners[index]
+                changes.append((index % self.width, index // self.width, owner if owner != NO_OWNER else None))
+        return changes
+
+    def mark_dirty(self, tiles: list[tuple[int, int, Any]]) -> None:
+        """Requeue tiles whose persistence failed."""
+        with self._lock:
+            self._dirty.update(y * self.width + x for x, y, *_ in tiles)
@@ -0,0 +1,267 @@
+"""Process-wide counters for server internals.
+
+Everything here is cheap enough to leave on: a request costs two clock reads,
+one short lock and a bisect into fixed histogram buckets. ``snapshot`` backs
+the ``admin.metrics`` message and ``prometheus_text`` the optional scrape
+endpoint.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+# Upper bounds in seconds, shared by request latency and db_lock histograms.
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class Histogram:
+    """Fixed-bucket histogram; callers hold the owning lock."""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self) -> None:
+        # One slot per bucket plus the overflow (+Inf) slot.
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """``(le, count)`` pairs in Prometheus order, ending with ``+Inf``."""
+        pairs = []
+        running = 0
+        for bound, count in zip((*map(str, LATENCY_BUCKETS), "+Inf"), self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the ``q`` quantile (``None`` past the last bound)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        running = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            running += count
+            if running >= rank:
+                return bound
+        return None
+
+    def as_dict(self) -> dict[str, Any]:
+        p50, p99 = self.quantile(0.5), self.quantile(0.99)
+        return {
+            "count": self.count,
+            "sum_seconds": round(self.sum, 6),
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "p99_ms": p99 * 1000 if p99 is not None else None,
+            "buckets": self.cumulative(),
+        }
+
+
+class MessageStats:
+    __slots__ = ("requests", "errors", "bytes_in", "bytes_out", "latency", "lock_wait", "lock_hold")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = Histogram()
+        self.lock_wait = 0.0
+        self.lock_hold = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency": self.latency.as_dict(),
+            "lock_wait_seconds": round(self.lock_wait, 6),
+            "lock_hold_seconds": round(self.lock_hold, 6),
+        }
+
+
+class CompressionStats:
+    """Totals for frame bodies that went through the compressor.
+
+    ``cpu_seconds`` is thread CPU time spent in ``zlib.compress``, including
+    attempts that did not shrink the body and were sent uncompressed.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    def record(self, size_in: int, size_out: int, cpu_seconds: float, *, used: bool) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.compressed += used
+            self.bytes_in += size_in
+            self.bytes_out += size_out if used else size_in
+            self.cpu_seconds += cpu_seconds
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "compressed": self.compressed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+                "cpu_seconds": round(self.cpu_seconds, 6),
+            }
+
+
+class ServerMetrics:
+    """Per-message-type request stats plus ``db_lock`` wait and hold times.
+
+    Lock time is attributed to the message type the current thread is
+    handling (see ``handling``), or to ``background`` for the flusher and
+    the session sweeper.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._messages: dict[str, MessageStats] = {}
+        self.lock_wait = Histogram()
+        self.lock_hold = Histogram()
+        self.compression = CompressionStats()
+        self.started = time.monotonic()
+        self._local = threading.local()
+
+    def handling(self, message_type: str | None) -> None:
+        """Set the message type that lock time on this thread is charged to."""
+        self._local.message_type = message_type
+
+    def current_type(self) -> str:
+        """The message type set by ``handling`` on this thread, or ``background``."""
+        return getattr(self._local, "message_type", None) or "background"
+
+    def _stats(self, message_type: str) -> MessageStats:
+        stats = self._messages.get(message_type)
+        if stats is None:
+            stats = self._messages[message_type] = MessageStats()
+        return stats
+
+    def observe_request(self, message_type: str, seconds: float, bytes_in: int, bytes_out: int, *, error: bool) -> None:
+        with self._lock:
+            stats = self._stats(message_type)
+            stats.requests += 1
+            stats.errors += error
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+            stats.latency.observe(seconds)
+
+    def observe_lock(self, wait: float, hold: float) -> None:
+        message_type = self.current_type()
+        with self._lock:
+            self.lock_wait.observe(wait)
+            self.lock_hold.observe(hold)
+            stats = self._stats(message_type)
+            stats.lock_wait += wait
+            stats.lock_hold += hold
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            messages = {name: stats.as_dict() for name, stats in sorted(self._messages.items())}
+            db_lock = {"wait": self.lock_wait.as_dict(), "hold": self.lock_hold.as_dict()}
+        return {
+            "uptime_seconds": round(time.monotonic() - self.started, 3),
+            "messages": messages,
+            "db_lock": db_lock,
+            "compression": self.compression.snapshot(),
+        }
+
+    def prometheus_text(self) -> str:
+        """Render the current values in the Prometheus text exposition format."""
+        lines: list[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, hist: Histogram, labels: str = "") -> None:
+            separator = "," if labels else ""
+            for bound, count in hist.cumulative():
+                lines.append(f'{name}_bucket{{{labels}{separator}le="{bound}"}} {count}')
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}_sum{suffix} {hist.sum}")
+            lines.append(f"{name}_count{suffix} {hist.count}")
+
+        with self._lock:
+            messages = sorted(self._messages.items())
+            counters = (
+                ("conquest_requests_total", "Requests handled", "requests"),
+                ("conquest_request_errors_total", "Requests answered with an error frame", "errors"),
+                ("conquest_request_bytes_in_total", "Request frame bytes received", "bytes_in"),
+                ("conquest_request_bytes_out_total", "Response frame bytes sent", "bytes_out"),
+                ("conquest_request_lock_wait_seconds_total", "Time spent waiting for db_lock", "lock_wait"),
+                ("conquest_request_lock_hold_seconds_total", "Time spent holding db_lock", "lock_hold"),
+            )
+            for name, help_text, attribute in counters:
+                family(name, "counter", help_text)
+                for message_type, stats in messages:
+                    lines.append(f'{name}{{type="{message_type}"}} {getattr(stats, attribute)}')
+            family("conquest_request_duration_seconds", "histogram", "Request handling time")
+            for message_type, stats in messages:
+                histogram("conquest_request_duration_seconds", stats.latency, f'type="{message_type}"')
+            family("conquest_db_lock_wait_seconds", "histogram", "Wait to acquire db_lock")
+            histogram("conquest_db_lock_wait_seconds", self.lock_wait)
+            family("conquest_db_lock_hold_seconds", "histogram", "Time db_lock was held")
+            histogram("conquest_db_lock_hold_seconds", self.lock_hold)
+        compression = self.compression.snapshot()
+        for key, help_text in (
+            ("bytes_in", "Bytes offered to the compressor"),
+            ("bytes_out", "Bytes sent after compression"),
+            ("cpu_seconds", "Thread CPU time spent compressing"),
+        ):
+            family(f"conquest_compression_{key}_total", "counter", help_text)
+            lines.append(f"conquest_compression_{key}_total {compression[key]}")
+        return "\n".join(lines) + "\n"
+
+
+class PrometheusExporter:
+    """Serves ``GET /metrics`` in Prometheus text format on a background thread."""
+
+    def __init__(self, metrics: ServerMetrics, host: str, port: int):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:  # noqa: N802 - http.server naming
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="conquest-metrics", daemon=True)
+
+    @property
+    def address(self) -> tuple[str, int]:
+        return self.httpd.server_address[:2]
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self._thread.join(timeout=2)
@@ -1,15 +1,82 @@
+"""Message codecs and per-connection wire settings.
+
+Every connection starts in the baseline format: one stdlib-JSON object per
+line. A client may switch its connection to another codec and framing with a
+``hello`` request; the reply still uses the old format and everything after
+it the new one. Faster codecs are offered only when their package is
+installed.
+
+``length`` framing replaces the newline with a fixed ``FRAME_HEADER``: body
+length, frame type code and request id (0 when there is none). Binary codecs
+need it, since their bodies may contain newline bytes, and so does
+compression: a compressed body has ``COMPRESSED_FLAG`` set in its type code.
+"""
+
+import base64
 import json
-from typing import Any
+import struct
+import time
+import zlib
+from collections.abc import Callable
+from functools import partial
+from typing import Any, NamedTuple
 
+from .metrics import CompressionStats
 
-def parse_json_line(line: bytes) -> dict[str, Any]:
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional speedup
+    msgpack = None
+
+
+class Codec(NamedTuple):
+    name: str
+    # Binary codecs may emit newline bytes and need a length-prefixed framing.
+    binary: bool
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+
+
+def _bytes_as_base64(value: Any) -> str:
+    # Text codecs carry raw payloads such as packed tiles as base64.
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":"), default=_bytes_as_base64).encode()
+
+
+JSON_CODEC = Codec("json", False, _json_dumps, json.loads)
+CODECS: dict[str, Codec] = {"json": JSON_CODEC}
+if orjson is not None:
+    CODECS["orjson"] = Codec("orjson", False, partial(orjson.dumps, default=_bytes_as_base64), orjson.loads)
+if msgpack is not None:
+    CODECS["msgpack"] = Codec(
+        "msgpack", True, partial(msgpack.packb, use_bin_type=True), partial(msgpack.unpackb, raw=False)
+    )
+
+FRAMINGS = ("newline", "length")
+FRAME_HEADER = struct.Struct("!IBI")
+FRAME_TYPES = {"request": 1, "ok": 2, "error": 3, "world.tiles_changed": 4}
+MAX_FRAME_ID = 0xFFFFFFFF
+COMPRESSIONS = ("zlib",)
+COMPRESSED_FLAG = 0x80
+
+
+def parse_message(body: bytes, codec: Codec = JSON_CODEC) -> dict[str, Any]:
+    if not body.strip():
+        raise ValueError("Empty payload")
     try:
-        decoded = line.decode().strip()
-        if not decoded:
-            raise ValueError("Empty payload")
-        data = json.loads(decoded)
-    except json.JSONDecodeError as exc:
-        raise ValueError(f"Invalid JSON: {exc}") from exc
+        data = codec.loads(body)
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid {'JSON' if not codec.binary else codec.name}: {exc}") from exc
 
     if not isinstance(data, dict):
         raise ValueError("Message must be a JSON object")
@@ -18,6 +85,112 @@ def parse_json_line(line: bytes) -> dict[str, Any]:
     return data
 
 
+def parse_json_line(line: bytes) -> dict[str, Any]:
+    return parse_message(line, JSON_CODEC)
+
+
 def serialize_message(message_type: str, **payload: Any) -> bytes:
-    data = {"type": message_type, **payload}
-    return (json.dumps(data, separators=(",", ":")) + "\n").encode()
+    return JSON_CODEC.dumps({"type": message_type, **payload}) + b"\n"
+
+
+class FrameTooLarge(ValueError):
+    """A frame is over the connection's size limit; the stream cannot continue."""
+
+
+class Compressor:
+    """zlib for frame bodies of at least ``threshold`` bytes."""
+
+    def __init__(self, threshold: int = 1024, level: int = 6, stats: CompressionStats | None = None):
+        self.threshold = threshold
+        self.level = level
+        self.stats = stats if stats is not None else CompressionStats()
+
+    def compress(self, body: bytes) -> bytes | None:
+        """Return the compressed body, or ``None`` if it is small or would not shrink."""
+        if len(body) < self.threshold:
+            return None
+        started = time.thread_time()
+        compressed = zlib.compress(body, self.level)
+        used = len(compressed) < len(body)
+        self.stats.record(len(body), len(compressed), time.thread_time() - started, used=used)
+        return compressed if used else None
+
+
+class WireFormat:
+    """How one connection encodes, decodes and reads frames.
+
+    ``switch`` takes effect after the reply to the current request has been
+    encoded (``reply_encoded``), so the client can read that reply in the
+    format it asked with.
+    """
+
+    def __init__(
+        self,
+        codec: Codec = JSON_CODEC,
+        framing: str = "newline",
+        *,
+        max_frame_bytes: int = 1 << 20,
+    ):
+        self.codec = codec
+        self.framing = framing
+        self.max_frame_bytes = max_frame_bytes
+        # Set once the client has negotiated compression, which needs length framing.
+        self.compressor: Compressor | None = None
+        self.requests = 0
+        self._next: tuple[Codec, str, Compressor | None] | None = None
+
+    def encode(self, message_type: str, **fields: Any) -> bytes:
+        if self.framing == "newline":
+            return self.codec.dumps({"type": message_type, **fields}) + b"\n"
+        request_id = fields.get("id")
+        if isinstance(request_id, int) and 0 < request_id <= MAX_FRAME_ID:
+            del fields["id"]
+        else:
+            request_id = 0
+        body = self.codec.dumps({"type": message_type, **fields})
+        frame_type = FRAME_TYPES[message_type]
+        if self.compressor is not None:
+            compressed = self.compressor.compress(body)
+            if compressed is not None:
+                body, frame_type = compressed, frame_type | COMPRESSED_FLAG
+        return FRAME_HEADER.pack(len(body), frame_type, request_id) + body
+
+    def decode(self, raw: bytes) -> dict[str, Any]:
+        self.requests += 1
+        if self.framing == "newline":
+            return parse_message(raw, self.codec)
+        _length, frame_type, request_id = FRAME_HEADER.unpack_from(raw)
+        if frame_type != FRAME_TYPES["request"]:
+            raise ValueError(f"Unexpected frame type code: {frame_type}")
+        request = parse_message(raw[FRAME_HEADER.size :], self.codec)
+        if request_id:
+            request["id"] = request_id
+        return request
+
+    def body_length(self, header: bytes) -> int:
+        """Body size announced by a ``length`` frame header."""
+        length = FRAME_HEADER.unpack(header)[0]
+        if length > self.max_frame_bytes:
+            raise FrameTooLarge("Message too large")
+        return length
+
+    def read_frame(self, rfile) -> bytes:
+        """Read one raw frame from a blocking file, or ``b""`` at end of stream."""
+        if self.framing == "newline":
+            line = rfile.readline(self.max_frame_bytes + 1)
+            if len(line) > self.max_frame_bytes and not line.endswith(b"\n"):
+                raise FrameTooLarge("Message too large")
+            return line
+        header = rfile.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return b""
+        length = self.body_length(header)
+        body = rfile.read(length)
+        return header + body if len(body) == length else b""
+
+    def switch(self, codec: Codec, framing: str, compressor: Compressor | None = None) -> None:
+        self._next = (codec, framing, compressor)
+
+    def reply_encoded(self) -> None:
+        if self._next is not None:
+            (self.codec, self.framing, self.compressor), self._next = self._next, None
@@ -0,0 +1,176 @@
+"""Token-bucket request limits per connection and per logged-in user.
+
+Every request costs tokens according to its type (``MESSAGE_COSTS``); a
+``world.region`` also costs one token per ``region_tiles_per_token`` tiles it
+covers, and a ``batch`` costs the sum of its items. A request is admitted only
+if the connection's bucket and, once logged in, the user's bucket (shared by
+all of that user's connections) both hold enough tokens. Otherwise it is
+refused with ``RateLimited`` and nothing is charged. Requests costing more
+than a bucket's burst are charged the full burst, so they wait for an empty
+bucket to refill instead of being refused forever.
+"""
+
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from .config import ServerConfig
+
+MESSAGE_COSTS: dict[str, float] = {
+    "hello": 0.0,
+    "ping": 1.0,
+    "auth.register": 10.0,
+    "auth.login": 10.0,
+    "auth.resume": 1.0,
+    "auth.logout": 1.0,
+    "world.meta": 1.0,
+    "world.state": 2.0,
+    "world.region": 1.0,
+    "world.subscribe": 2.0,
+    "world.unsubscribe": 1.0,
+    "action.claim": 2.0,
+    "batch": 1.0,
+}
+DEFAULT_COST = 1.0
+# Idle user buckets are dropped once there are more than this many.
+MAX_IDLE_USER_BUCKETS = 4096
+
+
+class RateLimited(ValueError):
+    """Raised for a request over its limit; ``retry_after`` is in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Holds up to ``burst`` tokens and gains ``rate`` tokens per second."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float | None = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, cost: float) -> float:
+        """Seconds until ``cost`` tokens are available (0 if they are now); call ``refill`` first."""
+        missing = min(cost, self.burst) - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, cost: float) -> None:
+        self.tokens -= min(cost, self.burst)
+
+
+class RateLimiter:
+    """Charges requests against connection and user buckets built from ``ServerConfig``."""
+
+    def __init__(self, config: ServerConfig, world_width: int, world_height: int):
+        self.connection_rate = config.rate_limit_connection_rate
+        self.connection_burst = config.rate_limit_connection_burst
+        self.user_rate = config.rate_limit_user_rate
+        self.user_burst = config.rate_limit_user_burst
+        self.user_in_flight = config.rate_limit_user_in_flight
+        self.region_tiles_per_token = config.rate_limit_region_tiles_per_token
+        self.costs = {**MESSAGE_COSTS, **dict(config.rate_limit_costs)}
+        self.world_width = world_width
+        self.world_height = world_height
+        self.enabled = bool(self.connection_rate or self.user_rate or self.user_in_flight)
+        self._lock = threading.Lock()
+        self._users: dict[int, TokenBucket] = {}
+        self._in_flight: dict[int, int] = {}
+
+    def cost(self, message_type: str, payload: Any) -> float:
+        cost = self.costs.get(message_type, DEFAULT_COST)
+        if not isinstance(payload, dict):
+            return cost
+        if message_type == "world.region":
+            return cost + self._region_area(payload) / self.region_tiles_per_token
+        if message_type == "batch":
+            items = payload.get("requests")
+            if isinstance(items, list):
+                cost += sum(
+                    self.cost(item["type"], item.get("payload") or {})
+                    for item in items
+                    if isinstance(item, dict) and isinstance(item.get("type"), str)
+                )
+        return cost
+
+    def _region_area(self, payload: dict[str, Any]) -> int:
+        # Same defaults and clipping as the region query; malformed bounds are left to the validator.
+        last_x, last_y = self.world_width - 1, self.world_height - 1
+
+        def bound(key: str, default: int) -> int:
+            value = payload.get(key)
+            return default if value is None else int(value)
+
+        try:
+            min_x, min_y = max(0, bound("min_x", 0)), max(0, bound("min_y", 0))
+            max_x, max_y = min(last_x, bound("max_x", last_x)), min(last_y, bound("max_y", last_y))
+        except (TypeError, ValueError):
+            return 0
+        return max(0, max_x - min_x + 1) * max(0, max_y - min_y + 1)
+
+    @contextmanager
+    def admit(self, handler, message_type: str, payload: Any) -> Iterator[None]:
+        """Charge one request to ``handler``'s buckets and count it in flight while it runs."""
+        if not self.enabled:
+            yield
+            return
+        cost = self.cost(message_type, payload)
+        user_id = getattr(handler, "user_id", None)
+        with self._lock:
+            now = time.monotonic()
+            buckets = []
+            if self.connection_rate:
+                bucket = getattr(handler, "rate_bucket", None)
+                if bucket is None:
+                    bucket = handler.rate_bucket = TokenBucket(self.connection_rate, self.connection_burst, now)
+                buckets.append(bucket)
+            if self.user_rate and user_id is not None:
+                buckets.append(self._user_bucket(user_id, now))
+            for bucket in buckets:
+                bucket.refill(now)
+            retry_after = max((bucket.wait_for(cost) for bucket in buckets), default=0.0)
+            if retry_after:
+                raise RateLimited("Rate limit exceeded", round(retry_after, 3))
+            tracked = self.user_in_flight and user_id is not None
+            if tracked:
+                if self._in_flight.get(user_id, 0) >= self.user_in_flight:
+                    raise RateLimited("Too many requests in flight for this user", 0.05)
+                self._in_flight[user_id] = self._in_flight.get(user_id, 0) + 1
+            for bucket in buckets:
+                bucket.take(cost)
+        try:
+            yield
+        finally:
+            if tracked:
+                with self._lock:
+                    remaining = self._in_flight[user_id] - 1
+                    if remaining:
+                        self._in_flight[user_id] = remaining
+                    else:
+                        del self._in_flight[user_id]
+
+    def _user_bucket(self, user_id: int, now: float) -> TokenBucket:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            if len(self._users) >= MAX_IDLE_USER_BUCKETS:
+                self._prune(now)
+            bucket = self._users[user_id] = TokenBucket(self.user_rate, self.user_burst, now)
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        # A bucket that has refilled completely holds no state worth keeping.
+        for user_id, bucket in list(self._users.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.burst:
+                del self._users[user_id]
@@ -0,0 +1,156 @@
+"""Wall-clock sampling profiler for a running server.
+
+``SamplingProfiler.capture`` polls ``sys._current_frames()`` every
+``interval`` seconds, so it sees every thread (connection handlers, executor
+workers, the event loop, the flusher) without installing a trace function on
+any of them. Stacks are kept per thread name and written in two formats:
+
+- ``.collapsed``: one ``thread;outer;...;inner count`` line per distinct
+  stack, the folded format read by ``flamegraph.pl``, speedscope and others.
+- ``.pstats``: a ``marshal``-ed stats table loadable with
+  ``pstats.Stats(path)`` or snakeviz, with sample time standing in for
+  measured time.
+
+Samples whose innermost Python frame is blocked in a socket read, a
+selector or a lock wait are counted as idle and left out unless asked for.
+"""
+
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+# (file name, function) of innermost frames that are waiting rather than working.
+IDLE_FRAMES = frozenset(
+    {
+        ("socket.py", "readinto"),
+        ("socket.py", "accept"),
+        ("selectors.py", "select"),
+        ("threading.py", "wait"),
+        ("threading.py", "_wait_for_tstate_lock"),
+        ("queue.py", "get"),
+        ("socketserver.py", "serve_forever"),
+        ("thread.py", "_worker"),
+    }
+)
+
+FunctionKey = tuple[str, int, str]
+
+
+def _key(code) -> FunctionKey:
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+
+def frame_label(key: FunctionKey) -> str:
+    filename, line, name = key
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+class SamplingProfiler:
+    """Collects stack samples from all threads; one capture at a time."""
+
+    def __init__(self) -> None:
+        self._busy = threading.Lock()
+
+    def capture(self, seconds: float, interval: float = 0.005, *, include_idle: bool = False) -> "Capture":
+        if not self._busy.acquire(blocking=False):
+            raise ValueError("A profile capture is already running")
+        try:
+            capture = Capture(interval)
+            me = threading.get_ident()
+            deadline = time.perf_counter() + seconds
+            while True:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        capture.add(names.get(ident, f"thread-{ident}"), frame, include_idle)
+                capture.ticks += 1
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(interval, remaining))
+            capture.seconds = seconds
+            return capture
+        finally:
+            self._busy.release()
+
+
+class Capture:
+    """Samples from one ``SamplingProfiler.capture`` call."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.seconds = 0.0
+        self.ticks = 0
+        self.idle = 0
+        self.stacks: Counter[tuple[str, tuple[FunctionKey, ...]]] = Counter()
+
+    def add(self, thread_name: str, frame, include_idle: bool) -> None:
+        code = frame.f_code
+        if not include_idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+            self.idle += 1
+            return
+        stack = []
+        while frame is not None:
+            stack.append(_key(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        self.stacks[(thread_name, tuple(stack))] += 1
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def collapsed(self) -> str:
+        lines = [
+            ";".join((thread_name, *map(frame_label, stack))) + f" {count}"
+            for (thread_name, stack), count in sorted(self.stacks.items())
+        ]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def _counts(self) -> tuple[Counter, Counter, Counter]:
+        self_samples: Counter[FunctionKey] = Counter()
+        total_samples: Counter[FunctionKey] = Counter()
+        edges: Counter[tuple[FunctionKey, FunctionKey]] = Counter()
+        for (_, stack), count in self.stacks.items():
+            self_samples[stack[-1]] += count
+            # A recursive function is counted once per sample.
+            for key in set(stack):
+                total_samples[key] += count
+            for edge in set(zip(stack, stack[1:])):
+                edges[edge] += count
+        return self_samples, total_samples, edges
+
+    def stats(self) -> dict[FunctionKey, tuple]:
+        """The ``pstats`` table: ``key -> (cc, nc, tt, ct, callers)`` in sample time."""
+        self_samples, total_samples, edges = self._counts()
+        callers: dict[FunctionKey, dict[FunctionKey, tuple]] = {key: {} for key in total_samples}
+        for (caller, callee), count in edges.items():
+            seconds = count * self.interval
+            callers[callee][caller] = (count, count, seconds, seconds)
+        return {
+            key: (count, count, self_samples[key] * self.interval, count * self.interval, callers[key])
+            for key, count in total_samples.items()
+        }
+
+    def top(self, limit: int = 20) -> list[dict[str, Any]]:
+        """Functions with the most samples on top of the stack."""
+        self_samples, total_samples, _ = self._counts()
+        ranked = sorted(total_samples, key=lambda key: (self_samples[key], total_samples[key]), reverse=True)
+        return [
+            {"function": frame_label(key), "self_samples": self_samples[key], "total_samples": total_samples[key]}
+            for key in ranked[:limit]
+        ]
+
+    def write(self, directory: str, prefix: str) -> dict[str, str]:
+        """Write ``<prefix>.collapsed`` and ``<prefix>.pstats`` into ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, prefix)
+        with open(base + ".collapsed", "w", encoding="utf-8") as handle:
+            handle.write(self.collapsed())
+        with open(base + ".pstats", "wb") as handle:
+            marshal.dump(self.stats(), handle)
+        return {"collapsed": base + ".collapsed", "pstats": base + ".pstats"}
@@ -0,0 +1,57 @@
+"""In-memory cache of session tokens in front of the ``sessions`` table.
+
+The cache is read-through: ``auth.resume`` loads a token from SQLite on a
+miss and serves it from memory afterwards. Logout deletes the row first and
+then discards the token, and the expiry sweeper evicts what it deletes, so
+the cache never outlives the table.
+"""
+
+import threading
+from collections.abc import Callable
+from typing import NamedTuple
+
+
+class CachedSession(NamedTuple):
+    user_id: int
+    username: str
+    expires_at: float
+
+
+class SessionCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[str, CachedSession] = {}
+        # Bumped by every discard so a load that raced a logout is not cached.
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, token: str) -> bool:
+        return token in self._entries
+
+    def lookup(self, token: str, load: Callable[[str], CachedSession | None]) -> CachedSession | None:
+        """Return the cached session for ``token``, calling ``load`` on a miss."""
+        with self._lock:
+            session = self._entries.get(token)
+            generation = self._generation
+        if session is not None:
+            return session
+        session = load(token)
+        if session is not None:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[token] = session
+        return session
+
+    def discard(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token, None)
+            self._generation += 1
+
+    def evict_expired(self, now: float) -> int:
+        with self._lock:
+            expired = [token for token, session in self._entries.items() if session.expires_at <= now]
+            for token in expired:
+                del self._entries[token]
+        return len(expired)
@@ -0,0 +1,82 @@
+"""Spawn placement over the grid's per-chunk free-land counts.
+
+Strategies:
+
+- ``first``: the lowest-numbered chunk with free land, from the grid's
+  min-heap, and its first free tile. O(log chunks) amortized.
+- ``random``: a random free tile in a randomly sampled chunk with free land.
+- ``spread``: among sampled chunks with free land, the one farthest from the
+  chunks that already have an owner, and the free tile nearest its centre.
+  Distances are exact while at most ``occupied_samples`` chunks are occupied;
+  past that they are measured to a random sample of that many, so on a
+  crowded map the pick is only approximately the farthest.
+
+Every strategy does at most ``samples`` x ``occupied_samples`` work, whatever
+the size of the map.
+"""
+
+import random
+from collections.abc import Iterable
+
+from .grid import WorldGrid
+
+SPAWN_STRATEGIES = ("first", "random", "spread")
+
+
+class SpawnAllocator:
+    def __init__(
+        self,
+        grid: WorldGrid,
+        strategy: str = "first",
+        *,
+        samples: int = 32,
+        occupied_samples: int = 256,
+        rng: random.Random | None = None,
+    ):
+        if strategy not in SPAWN_STRATEGIES:
+            raise ValueError(f"Unknown spawn strategy: {strategy}")
+        self.grid = grid
+        self.strategy = strategy
+        self.samples = samples
+        self.occupied_samples = occupied_samples
+        self.rng = rng if rng is not None else random.Random()
+
+    def allocate(self) -> tuple[int, int] | None:
+        """Pick a neutral land tile for a new player, or ``None`` if the world is full."""
+        first = self.grid.first_free_chunk()
+        if first is None:
+            return None
+        if self.strategy == "first":
+            return self.grid.free_tiles_in_chunk(first)[0]
+        candidates = self._candidate_chunks(first)
+        if self.strategy == "random":
+            return self.rng.choice(self.grid.free_tiles_in_chunk(self.rng.choice(candidates)))
+        return self._spread(candidates)
+
+    def _candidate_chunks(self, first: int) -> list[int]:
+        chunk_count = self.grid.chunks_x * self.grid.chunks_y
+        if chunk_count <= self.samples:
+            sampled: Iterable[int] = range(chunk_count)
+        else:
+            sampled = self.rng.sample(range(chunk_count), self.samples)
+        candidates = [chunk for chunk in sampled if self.grid.chunk_free[chunk]]
+        # The heap head always has room, so a crowded map still yields a spawn.
+        if first not in candidates:
+            candidates.append(first)
+        return candidates
+
+    def _spread(self, candidates: list[int]) -> tuple[int, int]:
+        grid = self.grid
+        occupied = [divmod(chunk, grid.chunks_x) for chunk in grid.occupied_chunks(self.occupied_samples, self.rng)]
+        best = candidates[0]
+        if occupied:
+            best_distance = -1
+            for chunk in candidates:
+                cy, cx = divmod(chunk, grid.chunks_x)
+                distance = min((cx - ox) ** 2 + (cy - oy) ** 2 for oy, ox in occupied)
+                if distance > best_distance:
+                    best, best_distance = chunk, distance
+        min_x, min_y, max_x, max_y = grid.chunk_bounds(best)
+        centre_x = (min_x + max_x) / 2
+        centre_y = (min_y + max_y) / 2
+        return min(grid.free_tiles_in_chunk(best), key=lambda tile: (tile[0] - centre_x) ** 2 + (tile[1] - centre_y) ** 2)
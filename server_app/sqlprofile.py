@@ -0,0 +1,184 @@
+"""Opt-in SQL statement profiling for ``db`` connections.
+
+Connections opened with a ``SqlProfiler`` use ``ProfiledConnection``: every
+``execute``/``executemany``, commit and rollback is timed, rows fetched from
+its cursor are counted (fetch time included, since SQLite steps lazily), and
+a progress handler counts SQLite VM instructions in thousands as a CPU-work
+proxy. Totals are kept per ``(message type, normalized statement)``.
+Expect a few microseconds of overhead per statement; leave it off unless
+you are looking for something.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from functools import lru_cache
+from typing import Any
+
+# The progress handler runs every this many VM instructions.
+PROGRESS_INSTRUCTIONS = 1000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_PLACEHOLDER_RUN = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql: str) -> str:
+    """Collapse whitespace and replace literals with ``?`` so equivalent statements group together."""
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _PLACEHOLDER_RUN.sub("?, ...", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+class _Totals:
+    __slots__ = ("calls", "seconds", "rows", "vm_steps")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.vm_steps = 0
+
+
+class SqlProfiler:
+    """Aggregates statement timings; ``label`` names the message type being handled."""
+
+    def __init__(self, label: Callable[[], str]):
+        self._label = label
+        self._lock = threading.Lock()
+        self._totals: dict[tuple[str, str], _Totals] = {}
+        self.started = time.monotonic()
+
+    def record(self, sql: str, seconds: float, rows: int = 0, vm_steps: int = 0, *, call: bool = True) -> None:
+        key = (self._label(), normalize_sql(sql))
+        with self._lock:
+            totals = self._totals.get(key)
+            if totals is None:
+                totals = self._totals[key] = _Totals()
+            totals.calls += call
+            totals.seconds += seconds
+            totals.rows += rows
+            totals.vm_steps += vm_steps
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+            self.started = time.monotonic()
+
+    def top(self, limit: int = 20, order_by: str = "seconds") -> list[dict[str, Any]]:
+        """The ``limit`` heaviest statements, by ``seconds``, ``calls``, ``rows`` or ``vm_steps``."""
+        with self._lock:
+            entries = [
+                {
+                    "message_type": message_type,
+                    "sql": sql,
+                    "calls": totals.calls,
+                    "seconds": round(totals.seconds, 6),
+                    "mean_us": round(totals.seconds / totals.calls * 1e6, 2) if totals.calls else None,
+                    "rows": totals.rows,
+                    "vm_steps_k": totals.vm_steps,
+                }
+                for (message_type, sql), totals in self._totals.items()
+            ]
+        key = "vm_steps_k" if order_by == "vm_steps" else order_by
+        entries.sort(key=lambda entry: entry[key], reverse=True)
+        return entries[:limit]
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that charges fetched rows and fetch time to the statement that produced them."""
+
+    _sql = ""
+
+    def _charge(self, started: float, steps_before: int, rows: int) -> None:
+        conn = self.connection
+        conn.profiler.record(
+            self._sql, time.perf_counter() - started, rows, conn.vm_steps - steps_before, call=False
+        )
+
+    def _timed(self, method, sql: str, *args):
+        conn = self.connection
+        self._sql = sql
+        steps_before = conn.vm_steps
+        started = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            conn.profiler.record(sql, time.perf_counter() - started, 0, conn.vm_steps - steps_before)
+
+    def execute(self, sql: str, parameters=(), /):
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters, /):
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        started, steps = time.perf_counter(), self.connection.vm_steps
+        row = super().fetchone()
+        self._charge(started, steps, row is not None)
+        return row
+
+    def fetchmany(self, size: int | None = None):
+        started, steps = time.perf_counter(), self.connection.vm_steps
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._charge(started, steps, len(rows))
+        return rows
+
+    def fetchall(self):
+        started, steps = time.perf_counter(), self.connection.vm_steps
+        rows = super().fetchall()
+        self._charge(started, steps, len(rows))
+        return rows
+
+    def __next__(self):
+        started, steps = time.perf_counter(), self.connection.vm_steps
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._charge(started, steps, 0)
+            raise
+        self._charge(started, steps, 1)
+        return row
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """``sqlite3.Connection`` whose statements are recorded by ``profiler``."""
+
+    profiler: SqlProfiler
+    vm_steps = 0
+
+    def attach(self, profiler: SqlProfiler) -> None:
+        self.profiler = profiler
+        self.set_progress_handler(self._progress, PROGRESS_INSTRUCTIONS)
+
+    def _progress(self) -> int:
+        self.vm_steps += 1
+        return 0
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters=(), /):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters, /):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self) -> None:
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            self.profiler.record("COMMIT", time.perf_counter() - started)
+
+    def rollback(self) -> None:
+        started = time.perf_counter()
+        try:
+            super().rollback()
+        finally:
+            self.profiler.record("ROLLBACK", time.perf_counter() - started)
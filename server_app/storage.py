@@ -0,0 +1,304 @@
+"""Persistence for the in-memory world grid.
+
+Every store implements ``WorldStore``. The layout is recorded in
+``world_meta.storage``:
+
+- ``tiles``: one ``land_tiles`` row per tile.
+- ``chunks``: one ``world_chunks`` row per ``chunk_size`` square, holding
+  little-endian int32 owners and terrain codes as BLOBs. Rows are only
+  written for chunks that have changed, so a new world of any size costs a
+  single ``world_meta`` row.
+- ``mmap``: the grid lives in a memory-mapped file outside SQLite and the
+  grid's buffers are views into it. SQLite keeps users, sessions and
+  resources.
+"""
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Callable
+from typing import Protocol
+
+from .background import PeriodicTask
+from .grid import NO_OWNER, TERRAIN_CODES, WorldGrid
+
+FLUSH_POLICIES = ("sync", "interval")
+STORAGE_LAYOUTS = ("tiles", "chunks", "mmap")
+DEFAULT_CHUNK_SIZE = 64
+
+
+class WorldStore(Protocol):
+    """Where a ``WorldGrid`` is loaded from and its tile changes are persisted.
+
+    ``write`` and ``save_revision`` run inside the caller's SQLite
+    transaction; stores that keep tiles elsewhere may ignore ``conn``.
+    """
+
+    layout: str
+
+    def load(self, conn, history_limit: int = 65536) -> WorldGrid: ...
+
+    def write(self, conn, changes: list[tuple[int, int, int | None]]) -> None: ...
+
+    def save_revision(self, conn, revision: int) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def _load_meta(conn, layout: str):
+    meta = conn.execute("SELECT width, height, revision, storage, chunk_size FROM world_meta WHERE id=1").fetchone()
+    if meta["storage"] != layout:
+        raise ValueError(
+            f"World is stored as {meta['storage']!r}, not {layout!r}; convert it with scripts/migrate_world_storage.py"
+        )
+    return meta
+
+
+class TileTableStore:
+    """Row-per-tile layout: one ``land_tiles`` row per tile."""
+
+    layout = "tiles"
+
+    def load(self, conn, history_limit: int = 65536) -> WorldGrid:
+        meta = _load_meta(conn, self.layout)
+        grid = WorldGrid(meta["width"], meta["height"], revision=meta["revision"], history_limit=history_limit)
+        width = grid.width
+        for row in conn.execute("SELECT x, y, owner_user_id, terrain FROM land_tiles"):
+            index = row["y"] * width + row["x"]
+            grid.terrain[index] = TERRAIN_CODES[row["terrain"]]
+            if row["owner_user_id"] is not None:
+                grid.owners[index] = row["owner_user_id"]
+        grid.rebuild_index()
+        return grid
+
+    def write(self, conn, changes: list[tuple[int, int, int | None]]) -> None:
+        conn.executemany(
+            "UPDATE land_tiles SET owner_user_id = ? WHERE x = ? AND y = ?",
+            ((owner, x, y) for x, y, owner in changes),
+        )
+
+    def save_revision(self, conn, revision: int) -> None:
+        conn.execute("UPDATE world_meta SET revision = ? WHERE id=1", (revision,))
+
+    def close(self) -> None:
+        pass
+
+
+class ChunkBlobStore:
+    """Chunked layout: ``world_chunks`` rows of packed owners and terrain, created on first write.
+
+    Every chunk blob covers a full ``chunk_size`` square, padded past the
+    world edge, so cell ``(x, y)`` is always at ``(y % size) * size + x % size``.
+    """
+
+    layout = "chunks"
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+
+    def _pack(self, owners: array) -> bytes:
+        if sys.byteorder != "little":
+            owners = array("i", owners)
+            owners.byteswap()
+        return owners.tobytes()
+
+    def _unpack(self, blob: bytes) -> array:
+        owners = array("i")
+        owners.frombytes(blob)
+        if sys.byteorder != "little":
+            owners.byteswap()
+        return owners
+
+    def _empty(self) -> tuple[array, bytearray]:
+        cells = self.chunk_size * self.chunk_size
+        return array("i", [NO_OWNER]) * cells, bytearray([TERRAIN_CODES["land"]]) * cells
+
+    def load(self, conn, history_limit: int = 65536) -> WorldGrid:
+        meta = _load_meta(conn, self.layout)
+        if meta["chunk_size"]:
+            self.chunk_size = meta["chunk_size"]
+        size = self.chunk_size
+        grid = WorldGrid(meta["width"], meta["height"], revision=meta["revision"], history_limit=history_limit)
+        for row in conn.execute("SELECT cx, cy, owners, terrain FROM world_chunks"):
+            owners = self._unpack(row["owners"])
+            terrain = row["terrain"]
+            min_x = row["cx"] * size
+            width = min(size, grid.width - min_x)
+            for offset_y in range(min(size, grid.height - row["cy"] * size)):
+                start = (row["cy"] * size + offset_y) * grid.width + min_x
+                source = offset_y * size
+                grid.owners[start : start + width] = owners[source : source + width]
+                grid.terrain[start : start + width] = terrain[source : source + width]
+        grid.rebuild_index()
+        return grid
+
+    def write(self, conn, changes: list[tuple[int, int, int | None]]) -> None:
+        size = self.chunk_size
+        by_chunk: dict[tuple[int, int], list[tuple[int, int, int | None]]] = {}
+        for x, y, owner in changes:
+            by_chunk.setdefault((x // size, y // size), []).append((x, y, owner))
+        for (cx, cy), tiles in by_chunk.items():
+            row = conn.execute("SELECT owners, terrain FROM world_chunks WHERE cx = ? AND cy = ?", (cx, cy)).fetchone()
+            if row is None:
+                owners, terrain = self._empty()
+            else:
+                owners, terrain = self._unpack(row["owners"]), row["terrain"]
+            for x, y, owner in tiles:
+                owners[(y % size) * size + x % size] = NO_OWNER if owner is None else owner
+            conn.execute(
+                "INSERT OR REPLACE INTO world_chunks (cx, cy, owners, terrain) VALUES (?, ?, ?, ?)",
+                (cx, cy, self._pack(owners), bytes(terrain)),
+            )
+
+    def write_grid(self, conn, grid: WorldGrid) -> int:
+        """Write every chunk of ``grid`` that differs from neutral land; return how many were written."""
+        size = self.chunk_size
+        written = 0
+        for cy in range(-(-grid.height // size)):
+            for cx in range(-(-grid.width // size)):
+                owners, terrain = self._empty()
+                min_x = cx * size
+                width = min(size, grid.width - min_x)
+                for offset_y in range(min(size, grid.height - cy * size)):
+                    start = (cy * size + offset_y) * grid.width + min_x
+                    target = offset_y * size
+                    owners[target : target + width] = grid.owners[start : start + width]
+                    terrain[target : target + width] = grid.terrain[start : start + width]
+                if (owners, terrain) == self._empty():
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO world_chunks (cx, cy, owners, terrain) VALUES (?, ?, ?, ?)",
+                    (cx, cy, self._pack(owners), bytes(terrain)),
+                )
+                written += 1
+        return written
+
+    def save_revision(self, conn, revision: int) -> None:
+        conn.execute("UPDATE world_meta SET revision = ? WHERE id=1", (revision,))
+
+    def close(self) -> None:
+        pass
+
+
+class MappedWorldStore:
+    """Grid in a fixed-layout memory-mapped file.
+
+    The file is a 64-byte header (magic, format version, width, height,
+    revision ceiling) followed by ``width * height`` little-endian int32
+    owners and then one terrain byte per tile. Tile writes land in the page
+    cache as soon as the grid changes; ``write`` only ``msync``s them. A new
+    file is created sparse, and zero bytes already mean neutral land.
+    """
+
+    layout = "mmap"
+    MAGIC = b"CONQWRLD"
+    VERSION = 1
+    HEADER = struct.Struct("<8sIIIQ")
+    HEADER_SIZE = 64
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise RuntimeError("The mmap world store requires a little-endian host")
+        self.path = path
+        self._file = None
+        self._map: mmap.mmap | None = None
+        self._views: list[memoryview] = []
+
+    def _create(self, width: int, height: int, revision: int) -> None:
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with open(self.path, "xb") as handle:
+            handle.write(self.HEADER.pack(self.MAGIC, self.VERSION, width, height, revision).ljust(self.HEADER_SIZE, b"\0"))
+            handle.truncate(self.HEADER_SIZE + width * height * 5)
+
+    def load(self, conn, history_limit: int = 65536) -> WorldGrid:
+        meta = _load_meta(conn, self.layout)
+        if not os.path.exists(self.path):
+            self._create(meta["width"], meta["height"], meta["revision"])
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, width, height, revision = self.HEADER.unpack_from(self._map)
+        problem = None
+        if magic != self.MAGIC or version != self.VERSION:
+            problem = f"{self.path} is not a version {self.VERSION} Conquest world file"
+        elif (width, height) != (meta["width"], meta["height"]):
+            problem = f"{self.path} holds a {width}x{height} world, expected {meta['width']}x{meta['height']}"
+        if problem is not None:
+            self.close()
+            raise ValueError(problem)
+        size = width * height
+        view = memoryview(self._map)
+        owners = view[self.HEADER_SIZE : self.HEADER_SIZE + size * 4].cast("i")
+        terrain = view[self.HEADER_SIZE + size * 4 : self.HEADER_SIZE + size * 5]
+        self._views = [owners, terrain, view]
+        return WorldGrid(width, height, owners, terrain, revision=revision, history_limit=history_limit)
+
+    def write(self, conn, changes: list[tuple[int, int, int | None]]) -> None:
+        if changes and self._map is not None:
+            self._map.flush()
+
+    def save_revision(self, conn, revision: int) -> None:
+        struct.pack_into("<Q", self._map, self.HEADER.size - 8, revision)
+        self._map.flush(0, min(mmap.PAGESIZE, len(self._map)))
+
+    def close(self) -> None:
+        if self._map is None:
+            return
+        self._map.flush()
+        for view in self._views:
+            view.release()
+        self._views = []
+        try:
+            self._map.close()
+        except BufferError:
+            # A reader still holds a slice; the mapping is released with it.
+            pass
+        self._file.close()
+        self._map = None
+
+
+def create_store(layout: str, *, chunk_size: int = DEFAULT_CHUNK_SIZE, world_path: str | None = None) -> WorldStore:
+    if layout == "tiles":
+        return TileTableStore()
+    if layout == "chunks":
+        return ChunkBlobStore(chunk_size)
+    if layout == "mmap":
+        if not world_path:
+            raise ValueError("The mmap world store needs a world_path")
+        return MappedWorldStore(world_path)
+    raise ValueError(f"Unknown world storage layout: {layout}")
+
+
+def convert_tiles_to_chunks(conn, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Rewrite a row-per-tile world as chunks in one transaction; return the chunks written."""
+    grid = TileTableStore().load(conn)
+    store = ChunkBlobStore(chunk_size)
+    try:
+        conn.execute("DELETE FROM world_chunks")
+        written = store.write_grid(conn, grid)
+        conn.execute("DELETE FROM land_tiles")
+        conn.execute("UPDATE world_meta SET storage = 'chunks', chunk_size = ? WHERE id=1", (chunk_size,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return written
+
+
+class WriteBehindFlusher(PeriodicTask):
+    """Background thread that persists dirty grid tiles in batches.
+
+    ``flush`` is called every ``interval`` seconds, when ``wake`` is called,
+    and once more on ``stop`` so a clean shutdown loses nothing. Failed
+    batches are requeued by ``flush`` and retried on the next round.
+    """
+
+    def __init__(self, flush: Callable[[], int], interval: float):
+        super().__init__(flush, interval, name="conquest-world-flush", description="World flush")
+
+    def stop(self) -> None:
+        super().stop()
+        self._task()
@@ -0,0 +1,133 @@
+"""Viewport subscriptions that push ``world.tiles_changed`` frames to clients.
+
+Publishing never blocks: each connection has a bounded outbox drained by its
+own writer. When a slow reader lets its outbox fill up, further frames are
+dropped and the writer sends a single ``resync`` frame once it catches up so
+the client can refetch with ``world.region`` ``since_revision``.
+"""
+
+import queue
+import threading
+from typing import Any, NamedTuple
+
+from .protocol import WireFormat
+
+
+class Viewport(NamedTuple):
+    min_x: int
+    min_y: int
+    max_x: int
+    max_y: int
+
+    def covers(self, x: int, y: int) -> bool:
+        return self.min_x <= x <= self.max_x and self.min_y <= y <= self.max_y
+
+    def as_dict(self) -> dict[str, int]:
+        return self._asdict()
+
+
+def resync_frame(wire: WireFormat) -> bytes:
+    return wire.encode("world.tiles_changed", resync=True, tiles=[])
+
+
+class ThreadedOutbox:
+    """Outbox for thread-per-connection handlers.
+
+    Responses are written synchronously with ``send``. Pushes are queued by
+    ``push`` and written by a writer thread that starts on the first push.
+    """
+
+    def __init__(self, wfile, maxsize: int, wire: WireFormat | None = None):
+        self._wfile = wfile
+        self.wire = wire if wire is not None else WireFormat()
+        self._write_lock = threading.Lock()
+        self._queue: queue.Queue[bytes | None] = queue.Queue(maxsize)
+        self._thread: threading.Thread | None = None
+        self._state_lock = threading.Lock()
+        self._overflowed = False
+        self._closed = False
+        self.dropped = 0
+
+    def send(self, frame: bytes) -> None:
+        with self._write_lock:
+            self._wfile.write(frame)
+
+    def push(self, frame: bytes) -> None:
+        with self._state_lock:
+            if self._closed:
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="conquest-push", daemon=True)
+                self._thread.start()
+            try:
+                self._queue.put_nowait(frame)
+            except queue.Full:
+                self.dropped += 1
+                self._overflowed = True
+
+    def close(self) -> None:
+        with self._state_lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            while True:
+                try:
+                    self._queue.put_nowait(None)
+                    break
+                except queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                    except queue.Empty:
+                        pass
+            thread.join(timeout=1)
+
+    def _run(self) -> None:
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                return
+            try:
+                self.send(frame)
+                if self._overflowed and self._queue.empty():
+                    self._overflowed = False
+                    self.send(resync_frame(self.wire))
+            except OSError:
+                return
+
+
+class SubscriptionHub:
+    """Tracks one viewport per connection outbox and fans out tile changes."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._viewports: dict[Any, Viewport] = {}
+
+    def __len__(self) -> int:
+        return len(self._viewports)
+
+    def subscribe(self, outbox, viewport: Viewport) -> None:
+        with self._lock:
+            self._viewports[outbox] = viewport
+
+    def unsubscribe(self, outbox) -> bool:
+        with self._lock:
+            return self._viewports.pop(outbox, None) is not None
+
+    def publish(self, revision: int, tiles: list[dict[str, Any]]) -> int:
+        """Queue a frame for every subscriber whose viewport covers a changed tile."""
+        if not tiles:
+            return 0
+        with self._lock:
+            subscribers = list(self._viewports.items())
+        delivered = 0
+        for outbox, viewport in subscribers:
+            visible = [tile for tile in tiles if viewport.covers(tile["x"], tile["y"])]
+            if not visible:
+                continue
+            try:
+                outbox.push(outbox.wire.encode("world.tiles_changed", revision=revision, tiles=visible))
+            except RuntimeError:
+                # The connection's event loop is gone; it unsubscribes on teardown.
+                continue
+            delivered += 1
+        return delivered
@@ -0,0 +1,76 @@
+"""Compact encodings for ``world.region`` responses.
+
+``tiles`` (the default) is one JSON object per tile. The compact encodings
+describe the clipped rectangle row-major from ``bounds``:
+
+- ``rle``: ``runs`` is a list of ``[owner_user_id, terrain_code, count]``.
+- ``packed``: ``palette`` lists distinct ``[owner_user_id, terrain_code]``
+  pairs and ``data`` is the little-endian palette indices, ``index_bytes``
+  wide. Binary codecs send it as raw bytes and text codecs as base64.
+
+``terrain_names`` maps terrain codes back to names in both cases.
+"""
+
+import sys
+from array import array
+from typing import Any
+
+from .grid import NO_OWNER, TERRAIN_NAMES
+
+REGION_ENCODINGS = ("tiles", "rle", "packed")
+
+_INDEX_TYPECODES = ((0xFF, "B", 1), (0xFFFF, "H", 2), (0xFFFFFFFF, "I", 4))
+
+
+def _header(encoding: str, bounds: tuple[int, int, int, int]) -> dict[str, Any]:
+    min_x, min_y, max_x, max_y = bounds
+    return {
+        "encoding": encoding,
+        "bounds": {"min_x": min_x, "min_y": min_y, "max_x": max_x, "max_y": max_y},
+        "terrain_names": [TERRAIN_NAMES[code] for code in sorted(TERRAIN_NAMES)],
+    }
+
+
+def _owner(value: int) -> int | None:
+    return value if value != NO_OWNER else None
+
+
+def encode_rle(bounds: tuple[int, int, int, int], owners, terrain) -> dict[str, Any]:
+    runs: list[list[Any]] = []
+    if len(owners):
+        current_owner, current_terrain, count = owners[0], terrain[0], 0
+        for owner, code in zip(owners, terrain):
+            if owner == current_owner and code == current_terrain:
+                count += 1
+                continue
+            runs.append([_owner(current_owner), current_terrain, count])
+            current_owner, current_terrain, count = owner, code, 1
+        runs.append([_owner(current_owner), current_terrain, count])
+    return {**_header("rle", bounds), "runs": runs}
+
+
+def encode_packed(bounds: tuple[int, int, int, int], owners, terrain) -> dict[str, Any]:
+    palette: dict[tuple[int, int], int] = {}
+    indices = [palette.setdefault(cell, len(palette)) for cell in zip(owners, terrain)]
+    for limit, typecode, width in _INDEX_TYPECODES:
+        if len(palette) - 1 <= limit:
+            break
+    packed = array(typecode, indices)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return {
+        **_header("packed", bounds),
+        "palette": [[_owner(owner), code] for owner, code in palette],
+        "index_bytes": width,
+        "data": packed.tobytes(),
+    }
+
+
+def encode_region(grid, encoding: str, min_x: int, min_y: int, max_x: int, max_y: int) -> dict[str, Any]:
+    bounds = grid.clip(min_x, min_y, max_x, max_y)
+    owners, terrain = grid.region_cells(*bounds)
+    if encoding == "rle":
+        return encode_rle(bounds, owners, terrain)
+    if encoding == "packed":
+        return encode_packed(bounds, owners, terrain)
+    raise ValueError(f"Unsupported region encoding: {encoding}")
@@ -1,5 +1,7 @@
 from typing import Any
 
+from .tilecodec import REGION_ENCODINGS
+
 
 def _as_non_empty_str(payload: dict[str, Any], key: str) -> str:
     if key not in payload:
@@ -33,6 +35,14 @@ def _as_optional_int(payload: dict[str, Any], key: str) -> int | None:
         raise ValueError(f"'{key}' must be an integer") from exc
 
 
+def validate_request_id(value: Any) -> int | str:
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("'id' must be an integer or a string")
+    if isinstance(value, str) and len(value) > 64:
+        raise ValueError("'id' must be at most 64 characters")
+    return value
+
+
 def validate_auth_register(payload: dict[str, Any]) -> dict[str, str]:
     return {
         "username": _as_non_empty_str(payload, "username"),
@@ -51,12 +61,82 @@ def validate_auth_resume(payload: dict[str, Any]) -> dict[str, str]:
     return {"token": _as_non_empty_str(payload, "token")}
 
 
-def validate_world_region(payload: dict[str, Any]) -> dict[str, int | None]:
+def _as_choice(payload: dict[str, Any], key: str, choices: tuple[str, ...], default: str) -> str:
+    value = payload.get(key)
+    if value is None:
+        return default
+    if value not in choices:
+        raise ValueError(f"'{key}' must be one of: {', '.join(choices)}")
+    return value
+
+
+def validate_admin(payload: dict[str, Any]) -> dict[str, str]:
+    return {"token": _as_non_empty_str(payload, "token")}
+
+
+SQL_PROFILE_ORDERS = ("seconds", "calls", "rows", "vm_steps")
+MAX_PROFILE_SECONDS = 300
+
+
+def validate_admin_sql_profile(payload: dict[str, Any]) -> dict[str, Any]:
+    return {
+        **validate_admin(payload),
+        "limit": _as_int(payload, "limit", minimum=1, default=20),
+        "order_by": _as_choice(payload, "order_by", SQL_PROFILE_ORDERS, "seconds"),
+        "reset": _as_bool(payload, "reset"),
+    }
+
+
+def _as_bool(payload: dict[str, Any], key: str) -> bool:
+    value = payload.get(key, False)
+    if not isinstance(value, bool):
+        raise ValueError(f"'{key}' must be a boolean")
+    return value
+
+
+def _as_float(payload: dict[str, Any], key: str, *, minimum: float, maximum: float, default: float) -> float:
+    if key not in payload:
+        return default
+    value = payload[key]
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"'{key}' must be a number")
+    if not minimum <= value <= maximum:
+        raise ValueError(f"'{key}' must be between {minimum} and {maximum}")
+    return float(value)
+
+
+def validate_admin_profile(payload: dict[str, Any]) -> dict[str, Any]:
+    return {
+        **validate_admin(payload),
+        "seconds": _as_float(payload, "seconds", minimum=0.1, maximum=MAX_PROFILE_SECONDS, default=10.0),
+        "interval_ms": _as_float(payload, "interval_ms", minimum=1, maximum=1000, default=5.0),
+        "include_idle": _as_bool(payload, "include_idle"),
+        "top": _as_int(payload, "top", minimum=1, default=20),
+    }
+
+
+def validate_hello(
+    payload: dict[str, Any], codecs: dict[str, Any], framings: tuple[str, ...], compressions: list[str]
+) -> dict[str, str]:
+    codec = _as_choice(payload, "codec", tuple(codecs), "json")
+    framing = _as_choice(payload, "framing", framings, "newline")
+    compression = _as_choice(payload, "compression", ("none", *compressions), "none")
+    if framing == "newline":
+        if codecs[codec].binary:
+            raise ValueError(f"Codec {codec} requires length framing")
+        if compression != "none":
+            raise ValueError("Compression requires length framing")
+    return {"codec": codec, "framing": framing, "compression": compression}
+
+
+def validate_world_region(payload: dict[str, Any]) -> dict[str, int | str | None]:
     return {
         "min_x": _as_int(payload, "min_x", default=0),
         "min_y": _as_int(payload, "min_y", default=0),
         "max_x": _as_optional_int(payload, "max_x"),
         "max_y": _as_optional_int(payload, "max_y"),
+        "encoding": _as_choice(payload, "encoding", REGION_ENCODINGS, "tiles"),
+        "since_revision": _as_optional_int(payload, "since_revision"),
     }
 
 
@@ -69,3 +149,34 @@ def validate_action_claim(payload: dict[str, Any]) -> dict[str, int]:
     if "power_cost" in payload:
         result["power_cost"] = _as_int(payload, "power_cost", minimum=1)
     return result
+
+
+def validate_world_subscribe(payload: dict[str, Any]) -> dict[str, int | None]:
+    return {
+        "min_x": _as_int(payload, "min_x", default=0),
+        "min_y": _as_int(payload, "min_y", default=0),
+        "max_x": _as_optional_int(payload, "max_x"),
+        "max_y": _as_optional_int(payload, "max_y"),
+    }
+
+
+BATCH_MODES = ("atomic", "best_effort")
+
+
+def validate_batch(payload: dict[str, Any], allowed_types: frozenset[str], max_items: int) -> dict[str, Any]:
+    requests = payload.get("requests")
+    if not isinstance(requests, list) or not requests:
+        raise ValueError("'requests' must be a non-empty list")
+    if len(requests) > max_items:
+        raise ValueError(f"A batch can hold at most {max_items} requests")
+    items = []
+    for position, item in enumerate(requests):
+        if not isinstance(item, dict) or "type" not in item:
+            raise ValueError(f"Batch item {position} must be an object with 'type'")
+        if item["type"] not in allowed_types:
+            raise ValueError(f"Batch item {position}: '{item['type']}' cannot be batched")
+        item_payload = item.get("payload") or {}
+        if not isinstance(item_payload, dict):
+            raise ValueError(f"Batch item {position}: 'payload' must be an object")
+        items.append({"type": item["type"], "payload": item_payload})
+    return {"mode": _as_choice(payload, "mode", BATCH_MODES, "atomic"), "requests": items}
@@ -1,14 +1,44 @@
 import time
 from typing import Any
 
+from .grid import REVISION_BLOCK, WorldGrid
+from .spawn import SpawnAllocator
+from .storage import TileTableStore, WorldStore
+from .tilecodec import encode_region
+
 
 class WorldService:
-    def __init__(self, conn, default_power: int, max_power: int, power_regen_per_tick: int, tick_seconds: float):
+    """Game rules over the shared ``WorldGrid``; SQLite holds resources.
+
+    Without an explicit ``grid`` the service loads one from ``conn`` and writes
+    tile changes through to the store inside the caller's transaction. The
+    caller owns that transaction: nothing here commits.
+    """
+
+    def __init__(
+        self,
+        conn,
+        default_power: int,
+        max_power: int,
+        power_regen_per_tick: int,
+        tick_seconds: float,
+        grid: WorldGrid | None = None,
+        store: WorldStore | None = None,
+        write_through: bool | None = None,
+        spawner: SpawnAllocator | None = None,
+    ):
         self.conn = conn
         self.default_power = default_power
         self.max_power = max_power
         self.power_regen_per_tick = power_regen_per_tick
         self.tick_seconds = tick_seconds
+        self.store = store if store is not None else TileTableStore()
+        if grid is None:
+            grid = self.store.load(conn)
+            write_through = True
+        self.grid = grid
+        self.write_through = bool(write_through)
+        self.spawner = spawner if spawner is not None else SpawnAllocator(grid)
 
     def create_user_resources(self, user_id: int) -> None:
         self.conn.execute(
@@ -16,144 +46,146 @@ class WorldService:
             (user_id, self.default_power, self.max_power, time.time()),
         )
 
-    def tick_user_resources(self, user_id: int) -> None:
+    def _regenerated(self, row, now: float) -> tuple[int, float]:
+        """Return ``(power, last_tick)`` for a resources row after regenerating up to ``now``.
+
+        Power is never written just because time passed; callers that spend
+        power store both values back in the same UPDATE.
+        """
+        ticks = int((now - row["last_tick"]) // self.tick_seconds)
+        if ticks <= 0:
+            return row["power"], row["last_tick"]
+        power = min(row["max_power"], row["power"] + ticks * self.power_regen_per_tick)
+        return power, row["last_tick"] + ticks * self.tick_seconds
+
+    def get_user_resources(self, user_id: int) -> dict[str, int] | None:
         row = self.conn.execute(
             "SELECT power, max_power, last_tick FROM resources WHERE user_id = ?",
             (user_id,),
         ).fetchone()
         if row is None:
-            return
-        now = time.time()
-        elapsed = now - row["last_tick"]
-        ticks = int(elapsed // self.tick_seconds)
-        if ticks <= 0:
-            return
-        new_power = min(row["max_power"], row["power"] + ticks * self.power_regen_per_tick)
-        new_last_tick = row["last_tick"] + ticks * self.tick_seconds
-        self.conn.execute(
-            "UPDATE resources SET power = ?, last_tick = ? WHERE user_id = ?",
-            (new_power, new_last_tick, user_id),
-        )
+            return None
+        power, _ = self._regenerated(row, time.time())
+        return {"power": power, "max_power": row["max_power"]}
+
+    def _set_owner(self, x: int, y: int, owner: int | None) -> None:
+        self.grid.set_owner(x, y, owner, mark_dirty=not self.write_through)
+        if self.write_through:
+            self.store.write(self.conn, [(x, y, owner)])
+        self.reserve_revisions()
+
+    def reserve_revisions(self, *, force: bool = False) -> None:
+        """Persist a new revision ceiling once the reserved block runs low."""
+        if force or self.grid.needs_revision_reservation():
+            # Reserved in the caller's transaction, which commits before any
+            # client sees a revision from the new block.
+            ceiling = self.grid.revision + REVISION_BLOCK
+            self.store.save_revision(self.conn, ceiling)
+            self.grid.revision_ceiling = ceiling
 
     def spawn_for_user_if_needed(self, user_id: int) -> tuple[int, int]:
-        owned = self.conn.execute(
-            "SELECT x, y FROM land_tiles WHERE owner_user_id = ? LIMIT 1",
-            (user_id,),
-        ).fetchone()
+        owned = self.grid.first_owned_tile(user_id)
         if owned is not None:
-            return (owned["x"], owned["y"])
+            return owned
 
-        spot = self.conn.execute(
-            "SELECT x, y FROM land_tiles WHERE owner_user_id IS NULL AND terrain='land' ORDER BY y, x LIMIT 1"
-        ).fetchone()
-        if spot is None:
+        tile = self.spawner.allocate()
+        if tile is None:
             raise ValueError("No spawnable land tile available")
-
-        self.conn.execute(
-            "UPDATE land_tiles SET owner_user_id = ? WHERE x = ? AND y = ?",
-            (user_id, spot["x"], spot["y"]),
-        )
-        return (spot["x"], spot["y"])
+        self._set_owner(*tile, user_id)
+        return tile
 
     def get_world_meta(self) -> dict[str, int]:
-        row = self.conn.execute("SELECT width, height FROM world_meta WHERE id=1").fetchone()
-        return {"width": row["width"], "height": row["height"]}
+        return {"width": self.grid.width, "height": self.grid.height}
 
     def get_user_state(self, user_id: int) -> dict[str, Any]:
-        self.tick_user_resources(user_id)
-        self.conn.commit()
-
-        resources = self.conn.execute(
-            "SELECT power, max_power FROM resources WHERE user_id = ?",
-            (user_id,),
-        ).fetchone()
-
-        tiles = self.conn.execute(
-            "SELECT x, y FROM land_tiles WHERE owner_user_id = ? ORDER BY y, x",
-            (user_id,),
-        ).fetchall()
+        resources = self.get_user_resources(user_id)
+        tiles = self.grid.owned_tiles(user_id)
 
         return {
-            "resources": {"power": resources["power"], "max_power": resources["max_power"]},
-            "owned_tiles": [{"x": t["x"], "y": t["y"]} for t in tiles],
+            "resources": resources,
+            "owned_tiles": [{"x": x, "y": y} for x, y in tiles],
         }
 
     def _is_adjacent_to_owner(self, user_id: int, x: int, y: int) -> bool:
         checks = [(x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y)]
         for cx, cy in checks:
-            row = self.conn.execute(
-                "SELECT owner_user_id FROM land_tiles WHERE x=? AND y=?",
-                (cx, cy),
-            ).fetchone()
-            if row is not None and row["owner_user_id"] == user_id:
+            if self.grid.in_bounds(cx, cy) and self.grid.owner_at(cx, cy) == user_id:
                 return True
         return False
 
     def claim_tile(self, user_id: int, x: int, y: int, power_cost: int = 5) -> dict[str, Any]:
-        self.tick_user_resources(user_id)
-
-        tile = self.conn.execute(
-            "SELECT owner_user_id, terrain FROM land_tiles WHERE x=? AND y=?",
-            (x, y),
-        ).fetchone()
-        if tile is None:
+        if not self.grid.in_bounds(x, y):
             raise ValueError("Tile out of bounds")
-        if tile["terrain"] != "land":
+        owner = self.grid.owner_at(x, y)
+        if self.grid.terrain_at(x, y) != "land":
             raise ValueError("Tile cannot be claimed")
-        if tile["owner_user_id"] == user_id:
+        if owner == user_id:
             raise ValueError("Tile already owned by you")
-        if tile["owner_user_id"] is not None:
+        if owner is not None:
             raise ValueError("Tile already owned")
         if not self._is_adjacent_to_owner(user_id, x, y):
             raise ValueError("Tile must be cardinal-adjacent to owned land")
 
-        resources = self.conn.execute(
-            "SELECT power FROM resources WHERE user_id=?",
+        row = self.conn.execute(
+            "SELECT power, max_power, last_tick FROM resources WHERE user_id=?",
             (user_id,),
         ).fetchone()
-        if resources is None or resources["power"] < power_cost:
+        if row is None:
+            raise ValueError("Not enough power")
+        power, last_tick = self._regenerated(row, time.time())
+        if power < power_cost:
             raise ValueError("Not enough power")
 
+        # Spending is the only time regenerated power is materialized.
         self.conn.execute(
-            "UPDATE resources SET power = power - ? WHERE user_id = ?",
-            (power_cost, user_id),
-        )
-        self.conn.execute(
-            "UPDATE land_tiles SET owner_user_id = ? WHERE x = ? AND y = ?",
-            (user_id, x, y),
+            "UPDATE resources SET power = ?, last_tick = ? WHERE user_id = ?",
+            (power - power_cost, last_tick, user_id),
         )
-        self.conn.commit()
+        self._set_owner(x, y, user_id)
 
-        state = self.get_user_state(user_id)
         return {
             "claimed": {"x": x, "y": y},
             "power_cost": power_cost,
-            "resources": state["resources"],
+            "resources": {"power": power - power_cost, "max_power": row["max_power"]},
+            "revision": self.grid.revision,
         }
 
-    def world_patch_since(self, min_x: int = 0, min_y: int = 0, max_x: int | None = None, max_y: int | None = None):
-        meta = self.get_world_meta()
+    def _region_bounds(self, min_x: int, min_y: int, max_x: int | None, max_y: int | None) -> tuple[int, int, int, int]:
         if max_x is None:
-            max_x = meta["width"] - 1
+            max_x = self.grid.width - 1
         if max_y is None:
-            max_y = meta["height"] - 1
-
-        rows = self.conn.execute(
-            """
-            SELECT x, y, owner_user_id, terrain
-            FROM land_tiles
-            WHERE x BETWEEN ? AND ? AND y BETWEEN ? AND ?
-            ORDER BY y, x
-            """,
-            (min_x, max_x, min_y, max_y),
-        ).fetchall()
-
-        return [
-            {
-                "x": r["x"],
-                "y": r["y"],
-                "terrain": r["terrain"],
-                "owner_user_id": r["owner_user_id"],
-            }
-            for r in rows
+            max_y = self.grid.height - 1
+        return (min_x, min_y, max_x, max_y)
+
+    def world_patch_since(self, min_x: int = 0, min_y: int = 0, max_x: int | None = None, max_y: int | None = None):
+        return self.grid.region(*self._region_bounds(min_x, min_y, max_x, max_y))
+
+    def region_changes_since(
+        self,
+        since_revision: int,
+        min_x: int = 0,
+        min_y: int = 0,
+        max_x: int | None = None,
+        max_y: int | None = None,
+    ) -> dict[str, Any] | None:
+        """Tiles in the region changed after ``since_revision``, or ``None`` if history was compacted."""
+        min_x, min_y, max_x, max_y = self._region_bounds(min_x, min_y, max_x, max_y)
+        revision, changed = self.grid.changes_since(since_revision)
+        if changed is None:
+            return None
+        tiles = [
+            self.grid.tile(x, y)
+            for x, y in changed
+            if min_x <= x <= max_x and min_y <= y <= max_y
         ]
+        return {"revision": revision, "delta": True, "tiles": tiles}
+
+    def encoded_region(
+        self,
+        encoding: str,
+        min_x: int = 0,
+        min_y: int = 0,
+        max_x: int | None = None,
+        max_y: int | None = None,
+    ) -> dict[str, Any]:
+        return encode_region(self.grid, encoding, *self._region_bounds(min_x, min_y, max_x, max_y))
@@ -1,11 +1,15 @@
+import json
+import socket
 import tempfile
 import threading
 import unittest
 
 from client_app import ConquestClient
-from client_app.protocol import ProtocolError, decode_response, encode_request
+from client_app.protocol import FRAME_HEADER, ProtocolError, choose_codec, decode_response, encode_request
+from server_app.aio import AsyncConquestServer
 from server_app.app import ConquestTCPServer
 from server_app.config import ServerConfig
+from server_app.protocol import FRAME_TYPES
 
 
 class ClientProtocolTests(unittest.TestCase):
@@ -17,8 +21,80 @@ class ClientProtocolTests(unittest.TestCase):
         with self.assertRaises(ProtocolError):
             decode_response(b'{"type":"error","error":"nope"}\n')
 
+    def test_decode_response_error_keeps_retry_after(self):
+        with self.assertRaises(ProtocolError) as caught:
+            decode_response(b'{"type":"error","error":"Rate limit exceeded","retry_after":0.25}\n')
+        self.assertEqual(caught.exception.retry_after, 0.25)
+
+
+class ClientPipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.client = ConquestClient()
+        self.client._sock, self.server_sock = socket.socketpair()
+        self.addCleanup(self.client.close)
+        self.addCleanup(self.server_sock.close)
+
+    def read_requests(self, count):
+        buffer = b""
+        while buffer.count(b"\n") < count:
+            buffer += self.server_sock.recv(65536)
+        return [json.loads(line) for line in buffer.splitlines()]
+
+    def reply(self, *frames):
+        self.server_sock.sendall(b"".join((json.dumps(frame) + "\n").encode() for frame in frames))
+
+    def test_replies_are_matched_by_id_out_of_order(self):
+        first = self.client.submit("ping")
+        second = self.client.submit("world.meta")
+        requests = self.read_requests(2)
+        self.assertEqual([request["id"] for request in requests], [first, second])
+
+        self.reply(
+            {"type": "ok", "id": second, "data": {"width": 8}},
+            {"type": "world.tiles_changed", "revision": 3, "tiles": []},
+            {"type": "error", "id": first, "error": "nope"},
+        )
+        self.assertEqual(self.client.result(second), {"width": 8})
+        with self.assertRaisesRegex(ProtocolError, "nope"):
+            self.client.result(first)
+        self.assertEqual(len(self.client.poll_events()), 1)
+
+    def test_partial_length_frame_survives_a_poll_timeout(self):
+        self.client._framing = "length"
+
+        def frame(frame_type, request_id, message):
+            body = json.dumps(message).encode()
+            return FRAME_HEADER.pack(len(body), frame_type, request_id) + body
+
+        push = frame(FRAME_TYPES["world.tiles_changed"], 0, {"type": "world.tiles_changed", "revision": 3, "tiles": []})
+        self.server_sock.sendall(push[:15])
+        self.assertEqual(self.client.poll_events(), [])
+        self.server_sock.sendall(push[15:])
+
+        request_id = self.client.submit("ping")
+        self.server_sock.recv(65536)
+        self.server_sock.sendall(frame(FRAME_TYPES["ok"], request_id, {"type": "ok", "data": {"pong": True}}))
+        self.assertEqual(self.client.result(request_id), {"pong": True})
+        self.assertEqual(self.client.poll_events()[0]["revision"], 3)
+
+    def test_pipeline_keeps_window_in_flight(self):
+        def serve():
+            for _ in range(3):
+                requests = self.read_requests(2)
+                replies = [{"type": "ok", "id": request["id"], "data": request["payload"]} for request in requests]
+                self.reply(*reversed(replies))
+
+        server = threading.Thread(target=serve)
+        server.start()
+        results = self.client.pipeline([("echo", {"n": n}) for n in range(6)], window=2)
+        server.join(timeout=5)
+
+        self.assertEqual(results, [{"n": n} for n in range(6)])
+
 
 class ClientIntegrationTests(unittest.TestCase):
+    server_class = ConquestTCPServer
+
     def setUp(self):
         self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
         self.tmp.close()
@@ -31,7 +107,7 @@ class ClientIntegrationTests(unittest.TestCase):
             world_height=8,
             session_ttl_seconds=120,
         )
-        self.server = ConquestTCPServer(config)
+        self.server = self.server_class(config)
         self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
         self.thread.start()
         self.host, self.port = self.server.server_address
@@ -65,9 +141,22 @@ class ClientIntegrationTests(unittest.TestCase):
         region = client.world_region(min_x=0, min_y=0, max_x=1, max_y=1)
         self.assertEqual(len(region["tiles"]), 4)
 
+        for encoding in ("rle", "packed"):
+            encoded = client.world_region(min_x=0, min_y=0, max_x=1, max_y=1, encoding=encoding)
+            self.assertEqual(encoded["tiles"], region["tiles"])
+
+        batch = client.batch([("action.claim", {"x": 2, "y": 0}), ("action.claim", {"x": 3, "y": 0})])
+        self.assertEqual([result["data"]["claimed"]["x"] for result in batch], [2, 3])
+
         ping = client.ping()
         self.assertTrue(ping["pong"])
 
+        requests = [("ping", None), ("world.meta", None), ("action.claim", {"x": 7, "y": 7})] * 4
+        pipelined = client.pipeline(requests, window=5, return_errors=True)
+        self.assertEqual(pipelined[:2], [{"pong": True}, {"width": 8, "height": 8}])
+        self.assertIsInstance(pipelined[2], ProtocolError)
+        self.assertEqual(len(pipelined), 12)
+
         logout = client.logout(token)
         self.assertEqual(logout, {"logged_out": True})
 
@@ -76,6 +165,70 @@ class ClientIntegrationTests(unittest.TestCase):
 
         client.close()
 
+    def test_client_negotiates_codec(self):
+        client = ConquestClient(self.host, self.port, codec="auto")
+        try:
+            hello = client.connect()
+            self.assertEqual(client._codec, choose_codec(hello["codecs"]))
+            client.register("carol", "supersecret")
+            client.login("carol", "supersecret")
+            self.assertEqual(client.world_meta(), {"width": 8, "height": 8})
+            with self.assertRaises(ProtocolError):
+                client.claim(99, 99)
+            self.assertTrue(client.ping()["pong"])
+        finally:
+            client.close()
+
+    def test_client_length_framing(self):
+        client = ConquestClient(self.host, self.port, codec="auto", framing="length", compress=True)
+        try:
+            self.assertIn("zlib", client.connect()["compression"])
+            client.register("dave", "supersecret")
+            client.login("dave", "supersecret")
+            packed = client.world_region(min_x=0, min_y=0, max_x=7, max_y=7, encoding="packed")
+            self.assertEqual(packed["tiles"], client.world_region(min_x=0, min_y=0, max_x=7, max_y=7)["tiles"])
+            # The 64-tile region is over the compression threshold.
+            self.assertGreaterEqual(self.server.compression_stats.snapshot()["compressed"], 1)
+            results = client.pipeline([("ping", None), ("action.claim", {"x": 99, "y": 99}), ("ping", None)], return_errors=True)
+            self.assertIsInstance(results[1], ProtocolError)
+            self.assertEqual(results[2], {"pong": True})
+        finally:
+            client.close()
+
+    def test_subscriber_receives_pushed_tile_changes(self):
+        # Pushes are encoded in each subscriber's own codec.
+        watcher = ConquestClient(self.host, self.port, codec="auto")
+        player = ConquestClient(self.host, self.port, framing="length")
+        watcher.connect()
+        player.connect()
+        try:
+            player.register("bob", "supersecret")
+            player.login("bob", "supersecret")
+            watcher.subscribe(min_x=0, min_y=0, max_x=3, max_y=3)
+            self.assertEqual(watcher.poll_events(), [])
+
+            player.claim(1, 0)
+            events = watcher.poll_events(timeout=5)
+            self.assertEqual(len(events), 1)
+            self.assertEqual(events[0]["type"], "world.tiles_changed")
+            self.assertEqual([(t["x"], t["y"]) for t in events[0]["tiles"]], [(1, 0)])
+
+            # Pushes interleaved with responses are queued rather than mistaken for replies.
+            player.claim(2, 0)
+            self.assertTrue(watcher.ping()["pong"])
+            self.assertEqual(len(watcher.poll_events(timeout=5)), 1)
+
+            watcher.unsubscribe()
+            player.claim(3, 0)
+            self.assertEqual(watcher.poll_events(timeout=0.2), [])
+        finally:
+            watcher.close()
+            player.close()
+
+
+class AsyncClientIntegrationTests(ClientIntegrationTests):
+    server_class = AsyncConquestServer
+
 
 if __name__ == "__main__":
     unittest.main()
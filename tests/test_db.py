@@ -18,6 +18,117 @@ class DBTests(unittest.TestCase):
             finally:
                 os.chdir(cwd)
 
+    def test_initialize_enables_wal(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'conquest.db')
+            db.initialize(path, 2, 2)
+            with db.connect(path) as conn:
+                mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+            self.assertEqual(mode, 'wal')
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'conquest.db')
+        db.initialize(self.path, 2, 2)
+        self.pool = db.ConnectionPool(self.path, 2, synchronous='FULL', cache_size_kib=1024)
+
+    def tearDown(self):
+        self.pool.close()
+        self.tmpdir.cleanup()
+
+    def test_connections_are_reused_and_tuned(self):
+        with self.pool.connection() as first:
+            self.assertEqual(first.execute('PRAGMA synchronous').fetchone()[0], 2)
+            self.assertEqual(first.execute('PRAGMA cache_size').fetchone()[0], -1024)
+        with self.pool.connection() as second:
+            self.assertIs(first, second)
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        with self.pool.connection() as conn:
+            conn.execute("INSERT INTO users (username, password_hash) VALUES ('ghost', 'x')")
+        with self.pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+        self.assertEqual(count, 0)
+
+    def test_rejects_unknown_synchronous_mode(self):
+        with self.assertRaises(ValueError):
+            db.open_connection(self.path, synchronous='NORMAL; DROP TABLE users')
+
+
+class MigrationTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'conquest.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def query_plan(self, conn, sql, params=()):
+        return ' '.join(row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+
+    def test_fresh_database_is_at_latest_version(self):
+        db.initialize(self.path, 2, 2)
+        with db.connect(self.path) as conn:
+            self.assertEqual(db.schema_version(conn), db.SCHEMA_VERSION)
+            self.assertEqual(db.migrate(conn), [])
+
+    def test_legacy_database_is_upgraded_in_order(self):
+        with db.connect(self.path) as conn:
+            conn.executescript(
+                """
+                CREATE TABLE sessions (token TEXT PRIMARY KEY, user_id INTEGER NOT NULL);
+                CREATE TABLE world_meta (id INTEGER PRIMARY KEY, width INTEGER NOT NULL, height INTEGER NOT NULL);
+                INSERT INTO sessions VALUES ('stale', 1);
+                """
+            )
+        db.initialize(self.path, 2, 2)
+        with db.connect(self.path) as conn:
+            versions = [row[0] for row in conn.execute('SELECT version FROM schema_version ORDER BY version')]
+            session_cols = {row['name'] for row in conn.execute('PRAGMA table_info(sessions)')}
+            meta_cols = {row['name'] for row in conn.execute('PRAGMA table_info(world_meta)')}
+            sessions = conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+        self.assertEqual(versions, [version for version, _, _ in db.MIGRATIONS])
+        self.assertIn('expires_at', session_cols)
+        self.assertIn('revision', meta_cols)
+        self.assertEqual(sessions, 0)
+
+    def test_hot_path_queries_use_indexes(self):
+        # Statements the server runs per request or per flush; tile owners are answered by the in-memory grid.
+        db.initialize(self.path, 4, 4)
+        with db.connect(self.path) as conn:
+            sweep_plan = self.query_plan(conn, 'DELETE FROM sessions WHERE expires_at <= ?', (0,))
+            resume_plan = self.query_plan(
+                conn,
+                'SELECT users.id, users.username, sessions.expires_at FROM sessions '
+                'JOIN users ON users.id = sessions.user_id WHERE sessions.token = ?',
+                ('t',),
+            )
+            login_plan = self.query_plan(conn, 'SELECT id, password_hash FROM users WHERE username = ?', ('a',))
+            flush_plan = self.query_plan(conn, 'UPDATE land_tiles SET owner_user_id = ? WHERE x = ? AND y = ?', (1, 0, 0))
+            power_plan = self.query_plan(conn, 'UPDATE resources SET power = ?, last_tick = ? WHERE user_id = ?', (1, 0, 1))
+        self.assertIn('USING INDEX idx_sessions_expires_at', sweep_plan)
+        self.assertIn('SEARCH sessions USING INDEX sqlite_autoindex_sessions_1', resume_plan)
+        self.assertIn('USING INTEGER PRIMARY KEY', resume_plan)
+        self.assertIn('USING INDEX sqlite_autoindex_users_1', login_plan)
+        self.assertIn('USING INDEX sqlite_autoindex_land_tiles_1', flush_plan)
+        self.assertIn('USING INTEGER PRIMARY KEY', power_plan)
+        for plan in (sweep_plan, resume_plan, login_plan, flush_plan, power_plan):
+            self.assertNotIn('SCAN', plan)
+
+    def test_unused_owner_index_is_dropped(self):
+        db.initialize(self.path, 4, 4)
+        with db.connect(self.path) as conn:
+            conn.execute('CREATE INDEX idx_land_tiles_owner ON land_tiles (owner_user_id)')
+            conn.execute('DELETE FROM schema_version WHERE version = 5')
+            conn.commit()
+        db.initialize(self.path, 4, 4)
+        with db.connect(self.path) as conn:
+            index = conn.execute("SELECT name FROM sqlite_master WHERE name = 'idx_land_tiles_owner'").fetchone()
+        self.assertIsNone(index)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,352 @@
+import os
+import tempfile
+import unittest
+
+from server_app import db
+from server_app.app import ConquestTCPServer
+from server_app.config import ServerConfig
+from server_app.grid import WorldGrid
+from server_app.storage import ChunkBlobStore, MappedWorldStore, TileTableStore, convert_tiles_to_chunks
+
+
+class DummyHandler:
+    def __init__(self):
+        self.user_id = None
+        self.username = None
+
+
+class WorldGridTests(unittest.TestCase):
+    def test_set_owner_tracks_index_and_dirty_tiles(self):
+        grid = WorldGrid(4, 3)
+        grid.set_owner(2, 1, 7)
+        grid.set_owner(0, 0, 7)
+        grid.set_owner(3, 2, 9)
+        grid.set_owner(3, 2, None)
+
+        self.assertEqual(grid.owned_tiles(7), [(0, 0), (2, 1)])
+        self.assertEqual(grid.owned_tiles(9), [])
+        self.assertEqual(grid.first_owned_tile(7), (0, 0))
+        self.assertEqual(grid.take_dirty(), [(0, 0, 7), (2, 1, 7), (3, 2, None)])
+        self.assertEqual(grid.dirty_count, 0)
+
+    def test_region_is_clipped_to_bounds(self):
+        grid = WorldGrid(3, 3)
+        grid.terrain[4] = 1
+        grid.set_owner(2, 2, 5)
+
+        tiles = grid.region(1, 1, 10, 10)
+
+        self.assertEqual(len(tiles), 4)
+        self.assertEqual(tiles[0], {"x": 1, "y": 1, "terrain": "water", "owner_user_id": None})
+        self.assertEqual(tiles[-1], {"x": 2, "y": 2, "terrain": "land", "owner_user_id": 5})
+
+    def test_changes_since_returns_delta_or_requests_snapshot(self):
+        grid = WorldGrid(4, 4, revision=10, history_limit=3)
+        self.assertEqual(grid.changes_since(10), (10, []))
+        self.assertEqual(grid.changes_since(4), (10, None))
+
+        grid.set_owner(1, 0, 2)
+        grid.set_owner(2, 0, 2)
+        grid.set_owner(1, 0, None)
+        self.assertEqual(grid.changes_since(12), (13, [(1, 0)]))
+        self.assertEqual(grid.changes_since(10), (13, [(1, 0), (2, 0)]))
+        self.assertEqual(grid.changes_since(99), (13, None))
+
+        grid.set_owner(3, 3, 2)
+        self.assertEqual(grid.changes_since(10), (14, None))
+        self.assertEqual(grid.changes_since(11), (14, [(1, 0), (2, 0), (3, 3)]))
+
+
+class TileTableStoreTests(unittest.TestCase):
+    def test_load_and_write_round_trip(self):
+        tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        tmp.close()
+        db.initialize(tmp.name, 4, 4)
+        store = TileTableStore()
+        with db.connect(tmp.name) as conn:
+            store.write(conn, [(1, 2, 3)])
+            conn.execute("UPDATE land_tiles SET terrain = 'water' WHERE x = 0 AND y = 0")
+            conn.commit()
+            grid = store.load(conn)
+
+        self.assertEqual((grid.width, grid.height), (4, 4))
+        self.assertEqual(grid.owner_at(1, 2), 3)
+        self.assertEqual(grid.terrain_at(0, 0), "water")
+        self.assertEqual(grid.owned_tiles(3), [(1, 2)])
+
+
+class ChunkBlobStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self.tmp.close()
+
+    def test_chunks_are_created_lazily_and_round_trip(self):
+        db.initialize(self.tmp.name, 10, 7, storage="chunks", chunk_size=4)
+        store = ChunkBlobStore()
+        with db.connect(self.tmp.name) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM land_tiles").fetchone()[0], 0)
+            grid = store.load(conn)
+            self.assertEqual(store.chunk_size, 4)
+            self.assertEqual(grid.owned_tiles(3), [])
+
+            store.write(conn, [(9, 6, 3), (1, 1, 3)])
+            store.write(conn, [(1, 1, None)])
+            conn.commit()
+            chunks = conn.execute("SELECT cx, cy FROM world_chunks ORDER BY cy, cx").fetchall()
+            grid = store.load(conn)
+
+        self.assertEqual([tuple(row) for row in chunks], [(0, 0), (2, 1)])
+        self.assertEqual(grid.owned_tiles(3), [(9, 6)])
+        self.assertEqual(grid.terrain_at(9, 6), "land")
+
+    def test_convert_from_tiles_preserves_owners_and_terrain(self):
+        db.initialize(self.tmp.name, 6, 5)
+        with db.connect(self.tmp.name) as conn:
+            TileTableStore().write(conn, [(5, 4, 2), (0, 0, 1)])
+            conn.execute("UPDATE land_tiles SET terrain = 'water' WHERE x = 3 AND y = 2")
+            conn.commit()
+            written = convert_tiles_to_chunks(conn, chunk_size=4)
+            with self.assertRaisesRegex(ValueError, "chunks"):
+                TileTableStore().load(conn)
+            grid = ChunkBlobStore().load(conn)
+            tile_rows = conn.execute("SELECT COUNT(*) FROM land_tiles").fetchone()[0]
+
+        self.assertEqual(written, 2)
+        self.assertEqual(tile_rows, 0)
+        self.assertEqual(grid.owned_tiles(1), [(0, 0)])
+        self.assertEqual(grid.owned_tiles(2), [(5, 4)])
+        self.assertEqual(grid.terrain_at(3, 2), "water")
+
+
+class MappedWorldStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, "conquest.db")
+        self.world_path = os.path.join(self.tmpdir.name, "world", "conquest.world")
+        db.initialize(self.db_path, 5, 3, storage="mmap")
+
+    def load(self):
+        store = MappedWorldStore(self.world_path)
+        self.addCleanup(store.close)
+        with db.connect(self.db_path) as conn:
+            return store, store.load(conn)
+
+    def test_grid_is_backed_by_the_file(self):
+        store, grid = self.load()
+        self.assertEqual(os.path.getsize(self.world_path), MappedWorldStore.HEADER_SIZE + 15 * 5)
+        self.assertEqual(grid.owned_tiles(4), [])
+
+        grid.set_owner(2, 1, 4)
+        store.write(None, [(2, 1, 4)])
+        store.save_revision(None, 1024)
+        store.close()
+
+        _, reopened = self.load()
+        self.assertEqual(reopened.owned_tiles(4), [(2, 1)])
+        self.assertEqual(reopened.revision, 1024)
+        self.assertEqual(reopened.terrain_at(4, 2), "land")
+
+    def test_full_width_regions_are_views(self):
+        _, grid = self.load()
+        grid.set_owner(0, 2, 9)
+        owners, terrain = grid.region_cells(0, 1, 4, 2)
+        self.assertIsInstance(owners, memoryview)
+        self.assertEqual(list(owners), [0] * 5 + [9, 0, 0, 0, 0])
+        self.assertEqual(len(terrain), 10)
+        owners.release()
+        terrain.release()
+        self.assertEqual(list(grid.region_cells(0, 2, 1, 2)[0]), [9, 0])
+
+    def test_rejects_file_for_another_world(self):
+        self.load()[0].close()
+        other = os.path.join(self.tmpdir.name, "other.db")
+        db.initialize(other, 6, 6, storage="mmap")
+        with db.connect(other) as conn, self.assertRaisesRegex(ValueError, "5x3"):
+            MappedWorldStore(self.world_path).load(conn)
+
+
+class WorldPersistenceTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+        self.tmp.close()
+
+    def make_server(self, policy, storage="tiles", size=8):
+        config = ServerConfig(
+            host="127.0.0.1",
+            port=0,
+            db_path=self.tmp.name,
+            world_width=size,
+            world_height=size,
+            kdf_workers=0,
+            world_flush_policy=policy,
+            world_flush_interval_seconds=60,
+            world_storage=storage,
+            world_chunk_size=4,
+            world_path=self.tmp.name + ".world",
+        )
+        server = ConquestTCPServer(config)
+        self.addCleanup(server.server_close)
+        return server
+
+    def claim_as_new_user(self, server):
+        handler = DummyHandler()
+        server.dispatch(handler, {"type": "auth.register", "payload": {"username": "hana", "password": "supersecret"}})
+        server.dispatch(handler, {"type": "auth.login", "payload": {"username": "hana", "password": "supersecret"}})
+        server.dispatch(handler, {"type": "action.claim", "payload": {"x": 1, "y": 0}})
+        return handler.user_id
+
+    def persisted_owner(self, x, y):
+        with db.connect(self.tmp.name) as conn:
+            row = conn.execute("SELECT owner_user_id FROM land_tiles WHERE x = ? AND y = ?", (x, y)).fetchone()
+        return row["owner_user_id"]
+
+    def test_interval_policy_writes_behind(self):
+        server = self.make_server("interval")
+        user_id = self.claim_as_new_user(server)
+
+        self.assertIsNone(self.persisted_owner(1, 0))
+        self.assertEqual(server.flush_world(), 2)
+        self.assertEqual(self.persisted_owner(1, 0), user_id)
+        self.assertEqual(server.flush_world(), 0)
+
+    def test_sync_policy_writes_in_request_transaction(self):
+        server = self.make_server("sync")
+        user_id = self.claim_as_new_user(server)
+
+        self.assertEqual(self.persisted_owner(0, 0), user_id)
+        self.assertEqual(self.persisted_owner(1, 0), user_id)
+        self.assertEqual(server.grid.dirty_count, 0)
+
+    def test_alternate_layouts_persist_across_restarts(self):
+        for storage in ("chunks", "mmap"):
+            for policy in ("interval", "sync"):
+                with self.subTest(storage=storage, policy=policy):
+                    self.setUp()
+                    server = self.make_server(policy, storage=storage)
+                    user_id = self.claim_as_new_user(server)
+                    seen = server.grid.revision
+                    server.server_close()
+
+                    restarted = self.make_server(policy, storage=storage)
+                    self.assertEqual(restarted.grid.owned_tiles(user_id), [(0, 0), (1, 0)])
+                    self.assertGreater(restarted.grid.revision, seen)
+                    with self.assertRaisesRegex(ValueError, f"stored as '{storage}'"):
+                        self.make_server(policy)
+
+    def test_mmap_world_several_chunks_wide_restarts_after_claims(self):
+        server = self.make_server("interval", storage="mmap", size=70)
+        user_id = self.claim_as_new_user(server)
+        server.server_close()
+
+        restarted = self.make_server("interval", storage="mmap", size=70)
+        self.assertEqual(restarted.grid.owned_tiles(user_id), [(0, 0), (1, 0)])
+        self.assertEqual(restarted.grid.chunk_owned[0], 2)
+        self.assertEqual(sum(restarted.grid.chunk_free), 70 * 70 - 2)
+
+    def test_failed_batch_leaves_nothing_persisted(self):
+        for policy in ("interval", "sync"):
+            with self.subTest(policy=policy):
+                self.setUp()
+                server = self.make_server(policy)
+                user_id = self.claim_as_new_user(server)
+                claims = [
+                    {"type": "action.claim", "payload": {"x": 2, "y": 0}},
+                    {"type": "action.claim", "payload": {"x": 7, "y": 7}},
+                ]
+                handler = DummyHandler()
+                handler.user_id = user_id
+
+                with self.assertRaises(ValueError):
+                    server.dispatch(handler, {"type": "batch", "payload": {"requests": claims}})
+                server.flush_world()
+
+                self.assertIsNone(server.grid.owner_at(2, 0))
+                self.assertIsNone(self.persisted_owner(2, 0))
+                self.assertEqual(self.persisted_owner(1, 0), user_id)
+
+    def test_close_flushes_pending_tiles(self):
+        server = self.make_server("interval")
+        user_id = self.claim_as_new_user(server)
+        server.server_close()
+
+        self.assertEqual(self.persisted_owner(1, 0), user_id)
+
+    def test_user_whose_spawn_was_lost_in_a_crash_respawns(self):
+        server = self.make_server("interval")
+        handler = DummyHandler()
+        server.dispatch(handler, {"type": "auth.register", "payload": {"username": "judy", "password": "supersecret"}})
+        token = server.dispatch(handler, {"type": "auth.login", "payload": {"username": "judy", "password": "supersecret"}})["token"]
+        # Simulate a crash before the write-behind flush: the spawn tile never reaches SQLite.
+        server.grid.take_dirty()
+        server.server_close()
+
+        restarted = self.make_server("interval")
+        self.assertEqual(restarted.grid.owned_tiles(handler.user_id), [])
+        restarted.dispatch(handler, {"type": "auth.resume", "payload": {"token": token}})
+        self.assertEqual(restarted.grid.owned_tiles(handler.user_id), [(0, 0)])
+        claim = restarted.dispatch(handler, {"type": "action.claim", "payload": {"x": 1, "y": 0}})
+        self.assertEqual(claim["claimed"], {"x": 1, "y": 0})
+
+    def test_landless_user_still_logs_in_on_a_full_world(self):
+        server = self.make_server("interval")
+        handler = DummyHandler()
+        server.dispatch(handler, {"type": "auth.register", "payload": {"username": "kara", "password": "supersecret"}})
+        server.dispatch(handler, {"type": "auth.login", "payload": {"username": "kara", "password": "supersecret"}})
+        server.grid.take_dirty()
+        server.server_close()
+
+        restarted = self.make_server("interval")
+        for y in range(8):
+            for x in range(8):
+                restarted.grid.set_owner(x, y, 999, mark_dirty=False)
+
+        login = restarted.dispatch(DummyHandler(), {"type": "auth.login", "payload": {"username": "kara", "password": "supersecret"}})
+        self.assertEqual(login["username"], "kara")
+        resumed = restarted.dispatch(DummyHandler(), {"type": "auth.resume", "payload": {"token": login["token"]}})
+        self.assertEqual(resumed["username"], "kara")
+        self.assertEqual(restarted.grid.owned_tiles(login["user_id"]), [])
+
+    def test_region_delta_since_revision(self):
+        server = self.make_server("interval")
+        handler = DummyHandler()
+        server.dispatch(handler, {"type": "auth.register", "payload": {"username": "ivan", "password": "supersecret"}})
+        server.dispatch(handler, {"type": "auth.login", "payload": {"username": "ivan", "password": "supersecret"}})
+
+        snapshot = server.dispatch(handler, {"type": "world.region", "payload": {}})
+        self.assertFalse(snapshot["delta"])
+        self.assertEqual(len(snapshot["tiles"]), 64)
+
+        unchanged = server.dispatch(handler, {"type": "world.region", "payload": {"since_revision": snapshot["revision"]}})
+        self.assertEqual(unchanged, {"revision": snapshot["revision"], "delta": True, "tiles": []})
+
+        claim = server.dispatch(handler, {"type": "action.claim", "payload": {"x": 1, "y": 0}})
+        delta = server.dispatch(handler, {"type": "world.region", "payload": {"since_revision": snapshot["revision"]}})
+        self.assertEqual(delta["revision"], claim["revision"])
+        self.assertEqual(delta["tiles"], [{"x": 1, "y": 0, "terrain": "land", "owner_user_id": handler.user_id}])
+
+        outside = server.dispatch(
+            handler,
+            {"type": "world.region", "payload": {"since_revision": snapshot["revision"], "min_x": 4, "min_y": 4}},
+        )
+        self.assertEqual(outside["tiles"], [])
+
+    def test_revisions_stay_monotonic_across_restarts(self):
+        server = self.make_server("interval")
+        self.claim_as_new_user(server)
+        seen = server.grid.revision
+        server.server_close()
+
+        restarted = self.make_server("interval")
+        self.assertGreater(restarted.grid.revision, seen)
+        stale = restarted.dispatch(DummyHandler(), {"type": "world.region", "payload": {"since_revision": seen}})
+        self.assertFalse(stale["delta"])
+        self.assertEqual(len(stale["tiles"]), 64)
+
+    def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.make_server("eventually")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import argparse
+import random
+import unittest
+
+from client_app.protocol import ProtocolError
+from scripts.loadgen import Bot, Recorder, Run, parse_mix, percentile
+
+
+class ParseMixTests(unittest.TestCase):
+    def test_weights_default_to_one(self):
+        self.assertEqual(parse_mix('world.state=2, action.claim'), {'world.state': 2.0, 'action.claim': 1.0})
+
+    def test_rejects_unknown_types_and_all_zero_weights(self):
+        with self.assertRaisesRegex(ValueError, 'Unknown message type'):
+            parse_mix('world.teleport=1')
+        with self.assertRaisesRegex(ValueError, 'positive weight'):
+            parse_mix('world.state=0')
+
+
+class PercentileTests(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile(values, 100), 100.0)
+        self.assertEqual(percentile([7.0], 95), 7.0)
+        self.assertEqual(percentile([1.0, 2.0], 0), 1.0)
+
+
+class RecorderTests(unittest.TestCase):
+    def test_counts_rejections_as_errors_and_reraises_lost_connections(self):
+        recorder = Recorder()
+
+        def reject():
+            raise ProtocolError('Not enough power')
+
+        def disconnect():
+            raise ProtocolError('Connection closed by server')
+
+        self.assertEqual(recorder.timed('action.claim', lambda: {'ok': True}), {'ok': True})
+        self.assertIsNone(recorder.timed('action.claim', reject))
+        self.assertIsNone(recorder.timed('action.claim', reject))
+        with self.assertRaises(ProtocolError):
+            recorder.timed('world.state', disconnect)
+
+        report = recorder.report(2.0)
+        claims = report['per_type']['action.claim']
+        self.assertEqual((claims['count'], claims['errors'], claims['error_rate']), (3, 2, 0.6667))
+        self.assertEqual(claims['top_errors'], {'Not enough power': 2})
+        self.assertEqual(claims['throughput_rps'], 1.5)
+        self.assertEqual((report['requests'], report['errors']), (4, 2))
+        self.assertEqual(Recorder().report(1.0)['error_rate'], 0.0)
+
+
+class FakeClient:
+    def __init__(self, owned):
+        self.owned = owned
+        self.sent = []
+
+    def claim(self, x, y):
+        self.sent.append(('action.claim', x, y))
+        return {}
+
+    def world_state(self):
+        self.sent.append(('world.state',))
+        return {'owned_tiles': [{'x': x, 'y': y} for x, y in self.owned]}
+
+
+class BotClaimTests(unittest.TestCase):
+    def make_bot(self, width, height, owned):
+        args = argparse.Namespace(username_prefix='bot', seed=1)
+        bot = Bot(0, args, Run(1, 1.0), {'action.claim': 1.0})
+        bot.width, bot.height, bot.owned = width, height, set(owned)
+        return bot
+
+    def test_claims_an_in_bounds_unowned_neighbour(self):
+        bot = self.make_bot(3, 3, {(1, 1)})
+        client = FakeClient(bot.owned)
+        bot._action_claim(client)
+        (kind, x, y), = client.sent
+        self.assertEqual(kind, 'action.claim')
+        self.assertIn((x, y), {(1, 0), (2, 1), (1, 2), (0, 1)})
+
+    def test_refreshes_state_instead_of_sending_a_doomed_claim(self):
+        # Every neighbour of the only tile is out of bounds.
+        bot = self.make_bot(1, 1, {(0, 0)})
+        bot.rng = random.Random(0)
+        client = FakeClient(bot.owned)
+        bot._action_claim(client)
+        self.assertEqual(client.sent, [('world.state',)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import urllib.request
+
+from server_app.metrics import Histogram, PrometheusExporter, ServerMetrics
+
+
+class HistogramTests(unittest.TestCase):
+    def test_buckets_are_cumulative_and_quantiles_use_bucket_bounds(self):
+        hist = Histogram()
+        for seconds in (0.0002, 0.0002, 0.003, 9.0):
+            hist.observe(seconds)
+
+        buckets = dict(hist.cumulative())
+        self.assertEqual((buckets['0.00025'], buckets['0.005'], buckets['+Inf']), (2, 3, 4))
+        self.assertEqual(hist.quantile(0.5), 0.00025)
+        self.assertIsNone(hist.quantile(0.99))
+        self.assertIsNone(Histogram().quantile(0.5))
+
+
+class ServerMetricsTests(unittest.TestCase):
+    def test_lock_time_is_charged_to_the_current_message_type(self):
+        metrics = ServerMetrics()
+        metrics.handling('action.claim')
+        metrics.observe_lock(0.002, 0.001)
+        metrics.handling(None)
+        metrics.observe_lock(0.0, 0.004)
+        metrics.observe_request('action.claim', 0.003, 40, 120, error=False)
+        metrics.observe_request('action.claim', 0.001, 40, 60, error=True)
+
+        snapshot = metrics.snapshot()
+        claim = snapshot['messages']['action.claim']
+        self.assertEqual((claim['requests'], claim['errors'], claim['bytes_in'], claim['bytes_out']), (2, 1, 80, 180))
+        self.assertEqual((claim['lock_wait_seconds'], claim['lock_hold_seconds']), (0.002, 0.001))
+        self.assertEqual(snapshot['messages']['background']['lock_hold_seconds'], 0.004)
+        self.assertEqual(snapshot['db_lock']['hold']['count'], 2)
+
+        text = metrics.prometheus_text()
+        self.assertIn('conquest_requests_total{type="action.claim"} 2', text)
+        self.assertIn('conquest_request_duration_seconds_bucket{type="action.claim",le="+Inf"} 2', text)
+        self.assertIn('conquest_db_lock_wait_seconds_count 2', text)
+
+    def test_exporter_serves_metrics_over_http(self):
+        metrics = ServerMetrics()
+        metrics.observe_request('ping', 0.0001, 16, 48, error=False)
+        exporter = PrometheusExporter(metrics, '127.0.0.1', 0)
+        exporter.start()
+        try:
+            host, port = exporter.address
+            with urllib.request.urlopen(f'http://{host}:{port}/metrics', timeout=5) as response:
+                body = response.read().decode()
+            self.assertIn('conquest_requests_total{type="ping"} 1', body)
+        finally:
+            exporter.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,17 @@
+import io
+import json
 import unittest
+import zlib
 
-from server_app.protocol import parse_json_line
+from server_app.protocol import (
+    COMPRESSED_FLAG,
+    FRAME_HEADER,
+    FRAME_TYPES,
+    Compressor,
+    FrameTooLarge,
+    WireFormat,
+    parse_json_line,
+)
 
 
 class ProtocolTests(unittest.TestCase):
@@ -12,6 +23,43 @@ class ProtocolTests(unittest.TestCase):
         with self.assertRaises(ValueError):
             parse_json_line(b'not-json\n')
 
+    def test_length_frames_round_trip(self):
+        wire = WireFormat(framing="length", max_frame_bytes=64)
+        body = b'{"type":"ping"}'
+        stream = io.BytesIO(FRAME_HEADER.pack(len(body), FRAME_TYPES["request"], 3) + body + b"\0\0")
+        self.assertEqual(wire.decode(wire.read_frame(stream)), {"type": "ping", "id": 3})
+        # A truncated header is the end of the stream.
+        self.assertEqual(wire.read_frame(stream), b"")
+
+        frame = wire.encode("error", error="nope", id="not-an-int")
+        self.assertEqual(FRAME_HEADER.unpack_from(frame)[1:], (FRAME_TYPES["error"], 0))
+        self.assertIn(b'"id":"not-an-int"', frame)
+
+    def test_large_bodies_are_compressed(self):
+        wire = WireFormat(framing="length")
+        compressor = Compressor(threshold=256)
+        wire.switch(wire.codec, "length", compressor)
+        wire.reply_encoded()
+
+        small = wire.encode("ok", data={"pong": True})
+        self.assertFalse(FRAME_HEADER.unpack_from(small)[1] & COMPRESSED_FLAG)
+        large = wire.encode("ok", data={"tiles": [{"x": x, "terrain": "land"} for x in range(100)]})
+        length, frame_type, _ = FRAME_HEADER.unpack_from(large)
+        self.assertEqual(frame_type, FRAME_TYPES["ok"] | COMPRESSED_FLAG)
+        self.assertEqual(len(json.loads(zlib.decompress(large[FRAME_HEADER.size :]))["data"]["tiles"]), 100)
+
+        stats = compressor.stats.snapshot()
+        self.assertEqual((stats["attempts"], stats["compressed"]), (1, 1))
+        self.assertEqual(stats["bytes_out"], length)
+        self.assertLess(stats["ratio"], 0.5)
+
+    def test_oversized_frames_are_rejected(self):
+        wire = WireFormat(framing="length", max_frame_bytes=64)
+        with self.assertRaises(FrameTooLarge):
+            wire.read_frame(io.BytesIO(FRAME_HEADER.pack(65, FRAME_TYPES["request"], 0)))
+        with self.assertRaises(FrameTooLarge):
+            WireFormat(max_frame_bytes=8).read_frame(io.BytesIO(b'{"type":"ping"}\n'))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from dataclasses import replace
+
+from server_app.config import ServerConfig
+from server_app.ratelimit import RateLimited, RateLimiter, TokenBucket
+
+
+class Handler:
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.rate_bucket = None
+
+
+class TokenBucketTests(unittest.TestCase):
+    def test_refills_at_rate_up_to_burst(self):
+        bucket = TokenBucket(rate=10, burst=5, now=0.0)
+        bucket.take(5)
+        self.assertAlmostEqual(bucket.wait_for(2), 0.2)
+        bucket.refill(0.1)
+        self.assertAlmostEqual(bucket.tokens, 1.0)
+        bucket.refill(60.0)
+        self.assertEqual(bucket.tokens, 5)
+        # Costs above the burst only need a full bucket.
+        self.assertEqual(bucket.wait_for(50), 0.0)
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.config = ServerConfig(rate_limit_connection_rate=1.0, rate_limit_connection_burst=4.0)
+
+    def admit(self, limiter, handler, message_type, payload=None):
+        with limiter.admit(handler, message_type, payload or {}):
+            pass
+
+    def test_region_cost_scales_with_clipped_area(self):
+        limiter = RateLimiter(replace(self.config, rate_limit_region_tiles_per_token=100), 100, 100)
+        self.assertEqual(limiter.cost('ping', {}), 1.0)
+        self.assertEqual(limiter.cost('world.region', {}), 101.0)
+        self.assertEqual(limiter.cost('world.region', {'min_x': 90, 'min_y': 90, 'max_x': 200, 'max_y': None}), 2.0)
+        batch = {'requests': [{'type': 'ping'}, {'type': 'world.region', 'payload': {'max_x': 9, 'max_y': 9}}, 'junk']}
+        self.assertEqual(limiter.cost('batch', batch), 1.0 + 1.0 + 2.0)
+
+    def test_over_limit_requests_are_refused_with_retry_after_and_not_charged(self):
+        limiter = RateLimiter(self.config, 100, 100)
+        handler = Handler()
+        self.admit(limiter, handler, 'world.state')
+        self.admit(limiter, handler, 'world.state')
+        with self.assertRaises(RateLimited) as caught:
+            self.admit(limiter, handler, 'world.state')
+        self.assertGreater(caught.exception.retry_after, 1.5)
+        self.assertLessEqual(caught.exception.retry_after, 2.0)
+        self.admit(limiter, handler, 'hello')
+        # Other connections have their own bucket.
+        self.admit(limiter, Handler(), 'world.state')
+
+    def test_user_bucket_is_shared_across_connections(self):
+        limiter = RateLimiter(replace(self.config, rate_limit_connection_rate=0.0, rate_limit_user_rate=1.0, rate_limit_user_burst=2.0), 10, 10)
+        self.admit(limiter, Handler(user_id=7), 'world.state')
+        with self.assertRaises(RateLimited):
+            self.admit(limiter, Handler(user_id=7), 'ping')
+        self.admit(limiter, Handler(user_id=8), 'ping')
+        self.admit(limiter, Handler(), 'ping')
+
+    def test_in_flight_cap_per_user(self):
+        limiter = RateLimiter(ServerConfig(rate_limit_user_in_flight=1), 10, 10)
+        with limiter.admit(Handler(user_id=3), 'world.state', {}):
+            with self.assertRaisesRegex(RateLimited, 'in flight'):
+                self.admit(limiter, Handler(user_id=3), 'ping')
+            self.admit(limiter, Handler(user_id=4), 'ping')
+        self.admit(limiter, Handler(user_id=3), 'ping')
+
+    def test_disabled_by_default(self):
+        limiter = RateLimiter(ServerConfig(), 10, 10)
+        handler = Handler()
+        for _ in range(1000):
+            self.admit(limiter, handler, 'world.region')
+        self.assertIsNone(handler.rate_bucket)
+
+
+if __name__ == '__main__':
+    unittest.main()
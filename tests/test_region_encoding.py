@@ -0,0 +1,54 @@
+import unittest
+
+from client_app.protocol import ProtocolError, decode_region_tiles
+from server_app.grid import WorldGrid
+from server_app.tilecodec import encode_region
+
+
+class RegionEncodingTests(unittest.TestCase):
+    def setUp(self):
+        self.grid = WorldGrid(6, 4)
+        self.grid.terrain[0] = 1
+        self.grid.terrain[9] = 1
+        for x in range(2, 5):
+            self.grid.set_owner(x, 1, 3)
+        self.grid.set_owner(5, 3, 70000)
+
+    def assert_round_trip(self, encoding, bounds):
+        encoded = encode_region(self.grid, encoding, *bounds)
+        self.assertEqual(encoded["encoding"], encoding)
+        self.assertEqual(decode_region_tiles(encoded), self.grid.region(*bounds))
+        return encoded
+
+    def test_rle_round_trip(self):
+        encoded = self.assert_round_trip("rle", (0, 0, 5, 3))
+        self.assertLess(len(encoded["runs"]), 24)
+
+    def test_packed_round_trip(self):
+        encoded = self.assert_round_trip("packed", (0, 0, 5, 3))
+        self.assertEqual(encoded["index_bytes"], 1)
+        self.assertEqual(len(encoded["palette"]), 5)
+
+    def test_partial_and_clipped_regions(self):
+        for encoding in ("rle", "packed"):
+            self.assert_round_trip(encoding, (2, 1, 4, 2))
+            self.assert_round_trip(encoding, (-3, -3, 99, 99))
+
+    def test_empty_region(self):
+        for encoding in ("rle", "packed"):
+            encoded = self.assert_round_trip(encoding, (5, 5, 1, 1))
+            self.assertEqual(decode_region_tiles(encoded), [])
+
+    def test_plain_tiles_pass_through(self):
+        tiles = self.grid.region(0, 0, 1, 1)
+        self.assertEqual(decode_region_tiles({"tiles": tiles}), tiles)
+
+    def test_unknown_encoding_is_rejected(self):
+        with self.assertRaises(ValueError):
+            encode_region(self.grid, "zip", 0, 0, 1, 1)
+        with self.assertRaises(ProtocolError):
+            decode_region_tiles({"encoding": "zip"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -21,6 +21,17 @@ class ReplGridRenderTests(unittest.TestCase):
 
         self.assertEqual(rendered, "-012\n0-2-")
 
+    def test_render_world_grid_decodes_encoded_region(self):
+        meta = {"width": 3, "height": 1}
+        region = {
+            "encoding": "rle",
+            "bounds": {"min_x": 0, "min_y": 0, "max_x": 2, "max_y": 0},
+            "terrain_names": ["land", "water"],
+            "runs": [[None, 1, 1], [4, 0, 2]],
+        }
+
+        self.assertEqual(render_world_grid(meta, region), "-44")
+
 
 if __name__ == "__main__":
     unittest.main()
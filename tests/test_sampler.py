@@ -0,0 +1,73 @@
+import os
+import pstats
+import tempfile
+import threading
+import unittest
+
+from server_app.sampler import SamplingProfiler
+
+
+def spin(stop):
+    total = 0
+    while not stop.is_set():
+        total += sum(range(200))
+    return total
+
+
+class SamplingProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.stop = threading.Event()
+        self.busy = threading.Thread(target=spin, args=(self.stop,), name='busy-worker')
+        self.idle = threading.Thread(target=self.stop.wait, name='idle-worker')
+        self.busy.start()
+        self.idle.start()
+
+    def tearDown(self):
+        self.stop.set()
+        self.busy.join()
+        self.idle.join()
+
+    def test_capture_samples_other_threads_and_skips_idle_ones(self):
+        capture = SamplingProfiler().capture(0.2, 0.002)
+
+        threads = {thread_name for thread_name, _ in capture.stacks}
+        self.assertIn('busy-worker', threads)
+        self.assertNotIn('idle-worker', threads)
+        self.assertGreater(capture.idle, 0)
+        self.assertGreater(capture.ticks, 1)
+        self.assertIn('spin', {entry['function'].split(' ')[0] for entry in capture.top(5)})
+
+        with_idle = SamplingProfiler().capture(0.05, 0.002, include_idle=True)
+        self.assertIn('idle-worker', {thread_name for thread_name, _ in with_idle.stacks})
+
+    def test_writes_collapsed_stacks_and_loadable_pstats(self):
+        capture = SamplingProfiler().capture(0.1, 0.002)
+        with tempfile.TemporaryDirectory() as directory:
+            files = capture.write(os.path.join(directory, 'profiles'), 'capture')
+            with open(files['collapsed'], encoding='utf-8') as handle:
+                lines = handle.read().splitlines()
+            stats = pstats.Stats(files['pstats'])
+
+        busy = [line for line in lines if line.startswith('busy-worker;')]
+        self.assertTrue(busy)
+        stack, count = busy[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+        self.assertIn('spin (test_sampler.py:', stack)
+        spin_keys = [key for key in stats.stats if key[2] == 'spin']
+        self.assertEqual(len(spin_keys), 1)
+        self.assertGreater(stats.stats[spin_keys[0]][3], 0)
+
+    def test_one_capture_at_a_time(self):
+        profiler = SamplingProfiler()
+        first = threading.Thread(target=profiler.capture, args=(0.3,))
+        first.start()
+        try:
+            threading.Event().wait(0.05)
+            with self.assertRaisesRegex(ValueError, 'already running'):
+                profiler.capture(0.01)
+        finally:
+            first.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,16 @@
+import json
+import os
 import tempfile
+import threading
 import unittest
+from dataclasses import replace
 
-from server_app.app import ConquestTCPServer
+from server_app import auth
+from server_app.aio import AsyncConquestServer
+from server_app.app import ConnectionState, ConquestTCPServer
 from server_app.config import ServerConfig
 from server_app.db import connect
+from server_app.protocol import CODECS, FRAME_HEADER, FRAME_TYPES
 
 
 class DummyHandler:
@@ -12,12 +19,33 @@ class DummyHandler:
         self.username = None
 
 
+class LockProbeHasher:
+    """Runs the KDF inline and records whether the write lock was held at the time."""
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.lock_held = []
+
+    def hash_password(self, password):
+        self.lock_held.append(self.lock.locked())
+        return auth.hash_password(password)
+
+    def verify_password(self, password, stored_hash):
+        self.lock_held.append(self.lock.locked())
+        return auth.verify_password(password, stored_hash)
+
+    def close(self):
+        pass
+
+
 class ServerFlowTests(unittest.TestCase):
+    server_class = ConquestTCPServer
+
     def setUp(self):
         self.tmp = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
         self.tmp.close()
-        config = ServerConfig(host='127.0.0.1', port=0, db_path=self.tmp.name, world_width=8, world_height=8, session_ttl_seconds=2)
-        self.server = ConquestTCPServer(config)
+        config = ServerConfig(host='127.0.0.1', port=0, db_path=self.tmp.name, world_width=8, world_height=8, session_ttl_seconds=2, admin_token='letmein')
+        self.server = self.server_class(config)
         self.handler = DummyHandler()
 
     def tearDown(self):
@@ -99,6 +127,222 @@ class ServerFlowTests(unittest.TestCase):
         with self.assertRaisesRegex(ValueError, '>= 1'):
             self.dispatch('action.claim', {'x': 1, 'y': 1, 'power_cost': 0})
 
+    def test_region_reads_progress_while_write_in_flight(self):
+        self.dispatch('auth.register', {'username': 'frank', 'password': 'supersecret'})
+        results = []
+
+        def read_region():
+            region = self.server.dispatch(DummyHandler(), {'type': 'world.region', 'payload': {}})
+            results.append(len(region['tiles']))
+
+        # Holding db_lock stands in for a long-running write such as action.claim.
+        with self.server.db_lock:
+            readers = [threading.Thread(target=read_region) for _ in range(4)]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join(timeout=5)
+            self.assertEqual(results, [64, 64, 64, 64])
+
+    def test_resume_ping_and_state_do_not_take_write_lock(self):
+        self.dispatch('auth.register', {'username': 'heidi', 'password': 'supersecret'})
+        token = self.dispatch('auth.login', {'username': 'heidi', 'password': 'supersecret'})['token']
+        results = []
+
+        def resume_and_ping():
+            handler = DummyHandler()
+            results.append(self.server.dispatch(handler, {'type': 'auth.resume', 'payload': {'token': token}})['username'])
+            results.append(self.server.dispatch(handler, {'type': 'ping', 'payload': {}}))
+            results.append(self.server.dispatch(handler, {'type': 'world.state', 'payload': {}})['resources']['power'])
+
+        with self.server.db_lock:
+            worker = threading.Thread(target=resume_and_ping)
+            worker.start()
+            worker.join(timeout=5)
+            self.assertEqual(results, ['heidi', {'pong': True}, 100])
+        self.assertIn(token, self.server.sessions)
+
+    def test_sweeper_deletes_expired_sessions(self):
+        self.dispatch('auth.register', {'username': 'ivy', 'password': 'supersecret'})
+        token = self.dispatch('auth.login', {'username': 'ivy', 'password': 'supersecret'})['token']
+        with connect(self.tmp.name) as conn:
+            conn.execute('UPDATE sessions SET expires_at = 0 WHERE token = ?', (token,))
+            conn.commit()
+
+        self.assertEqual(self.server.sweep_sessions(), 1)
+        with connect(self.tmp.name) as conn:
+            self.assertEqual(conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0], 0)
+        with self.assertRaisesRegex(ValueError, 'Invalid session token'):
+            self.dispatch('auth.resume', {'token': token})
+
+    def claim_payload(self, x, y):
+        return {'type': 'action.claim', 'payload': {'x': x, 'y': y}}
+
+    def test_atomic_batch_applies_all_or_nothing(self):
+        self.dispatch('auth.register', {'username': 'judy', 'password': 'supersecret'})
+        self.dispatch('auth.login', {'username': 'judy', 'password': 'supersecret'})
+        revision = self.server.grid.revision
+
+        with self.assertRaisesRegex(ValueError, r'Batch item 1 \(action.claim\) failed'):
+            self.dispatch('batch', {'requests': [self.claim_payload(1, 0), self.claim_payload(5, 5)]})
+        self.assertIsNone(self.server.grid.owner_at(1, 0))
+        self.assertGreater(self.server.grid.revision, revision)
+        self.assertEqual(self.dispatch('world.state')['resources']['power'], 100)
+
+        requests = [self.claim_payload(1, 0), self.claim_payload(2, 0), {'type': 'world.state'}]
+        batch = self.dispatch('batch', {'requests': requests})
+        self.assertEqual([result['type'] for result in batch['results']], ['ok', 'ok', 'ok'])
+        self.assertEqual(batch['results'][2]['data']['resources']['power'], 90)
+        self.assertEqual(self.server.grid.owned_tiles(self.handler.user_id), [(0, 0), (1, 0), (2, 0)])
+
+    def test_best_effort_batch_reports_failed_items(self):
+        self.dispatch('auth.register', {'username': 'kate', 'password': 'supersecret'})
+        self.dispatch('auth.login', {'username': 'kate', 'password': 'supersecret'})
+
+        requests = [self.claim_payload(1, 0), self.claim_payload(5, 5), self.claim_payload(2, 0)]
+        batch = self.dispatch('batch', {'mode': 'best_effort', 'requests': requests})
+
+        self.assertEqual([result['type'] for result in batch['results']], ['ok', 'error', 'ok'])
+        self.assertIn('adjacent', batch['results'][1]['error'])
+        self.assertEqual(self.server.grid.owned_tiles(self.handler.user_id), [(0, 0), (1, 0), (2, 0)])
+        self.assertEqual(self.dispatch('world.state')['resources']['power'], 90)
+
+    def test_batch_rejects_unbatchable_items(self):
+        for item in ({'type': 'auth.login'}, {'type': 'batch'}, {'type': 'world.subscribe'}, 'ping'):
+            with self.assertRaises(ValueError):
+                self.dispatch('batch', {'requests': [item]})
+        with self.assertRaises(ValueError):
+            self.dispatch('batch', {'requests': []})
+
+    def test_request_id_is_echoed(self):
+        ok = json.loads(self.server.handle_line(self.handler, b'{"type":"ping","id":7}\n'))
+        self.assertEqual((ok['type'], ok['id']), ('ok', 7))
+
+        error = json.loads(self.server.handle_line(self.handler, b'{"type":"world.state","id":"s-1"}\n'))
+        self.assertEqual((error['type'], error['id']), ('error', 's-1'))
+
+        bad = json.loads(self.server.handle_line(self.handler, b'{"type":"ping","id":[1]}\n'))
+        self.assertEqual(bad['type'], 'error')
+        self.assertNotIn('id', bad)
+
+    @unittest.skipUnless('orjson' in CODECS, 'orjson is not installed')
+    def test_hello_switches_codec_after_its_reply(self):
+        state = ConnectionState()
+        self.assertIn('orjson', json.loads(self.server.hello_frame())['codecs'])
+
+        reply = self.server.handle_line(state, b'{"type":"hello","payload":{"codec":"orjson"}}\n')
+        self.assertEqual(json.loads(reply)['data']['codec'], 'orjson')
+        self.assertEqual(state.wire.codec.name, 'orjson')
+
+        pong = CODECS['orjson'].loads(self.server.handle_line(state, b'{"type":"ping"}\n'))
+        self.assertEqual(pong['data'], {'pong': True})
+
+    def test_hello_must_be_first_and_binary_codecs_need_length_framing(self):
+        self.assertEqual(json.loads(self.server.hello_frame())['framings'], ['newline', 'length'])
+        state = ConnectionState()
+        rejected = json.loads(self.server.handle_line(state, b'{"type":"hello","payload":{"codec":"msgpack"}}\n'))
+        self.assertEqual(rejected['type'], 'error')
+
+        uncompressible = json.loads(self.server.handle_line(state, b'{"type":"hello","payload":{"compression":"zlib"}}\n'))
+        self.assertIn('length framing', uncompressible['error'])
+
+        late = json.loads(self.server.handle_line(state, b'{"type":"hello","payload":{"codec":"json"}}\n'))
+        self.assertIn('first request', late['error'])
+        self.assertEqual(state.wire.codec.name, 'json')
+
+    def test_length_framing_carries_request_id_in_header(self):
+        state = ConnectionState()
+        self.server.handle_line(state, b'{"type":"hello","payload":{"framing":"length"}}\n')
+        self.assertEqual(state.wire.framing, 'length')
+
+        body = b'{"type":"ping"}'
+        reply = self.server.handle_line(state, FRAME_HEADER.pack(len(body), FRAME_TYPES['request'], 9) + body)
+        length, frame_type, request_id = FRAME_HEADER.unpack_from(reply)
+        self.assertEqual((frame_type, request_id), (FRAME_TYPES['ok'], 9))
+        self.assertEqual(json.loads(reply[FRAME_HEADER.size :]), {'type': 'ok', 'request_type': 'ping', 'data': {'pong': True}})
+        self.assertEqual(len(reply), FRAME_HEADER.size + length)
+
+    def test_admin_metrics_reports_per_type_stats(self):
+        self.server.handle_line(self.handler, b'{"type":"ping"}\n')
+        self.server.handle_line(self.handler, b'{"type":"world.state"}\n')
+        self.server.handle_line(self.handler, b'{"type":"no.such.type"}\n')
+        self.dispatch('auth.register', {'username': 'mallory', 'password': 'supersecret'})
+
+        with self.assertRaisesRegex(ValueError, 'Invalid admin token'):
+            self.dispatch('admin.metrics', {'token': 'guess'})
+        reply = json.loads(self.server.handle_line(self.handler, b'{"type":"admin.metrics","payload":{"token":"letmein"}}\n'))
+        messages = reply['data']['messages']
+        self.assertEqual((messages['ping']['requests'], messages['ping']['errors']), (1, 0))
+        self.assertEqual(messages['world.state']['errors'], 1)
+        self.assertEqual(messages['unknown']['requests'], 1)
+        self.assertGreater(messages['ping']['bytes_out'], messages['ping']['bytes_in'])
+        self.assertGreaterEqual(reply['data']['db_lock']['hold']['count'], 1)
+
+    def test_admin_sql_profile_needs_the_flag(self):
+        with self.assertRaisesRegex(ValueError, 'SQL profiling is off'):
+            self.dispatch('admin.sql_profile', {'token': 'letmein'})
+
+    def test_admin_sql_profile_groups_statements_by_message_type(self):
+        self.server.server_close()
+        self.server = self.server_class(replace(self.server.config, sql_profile=True))
+        self.server.handle_line(self.handler, b'{"type":"auth.register","payload":{"username":"ivan","password":"supersecret"}}\n')
+
+        with self.assertRaisesRegex(ValueError, "'order_by' must be one of"):
+            self.dispatch('admin.sql_profile', {'token': 'letmein', 'order_by': 'bytes'})
+        profile = self.dispatch('admin.sql_profile', {'token': 'letmein', 'order_by': 'calls', 'limit': 50, 'reset': True})
+        types = {entry['message_type'] for entry in profile['statements']}
+        self.assertIn('auth.register', types)
+        self.assertEqual(self.dispatch('admin.sql_profile', {'token': 'letmein'})['statements'], [])
+
+    def test_admin_profile_writes_a_capture(self):
+        with self.assertRaisesRegex(ValueError, 'Profiling is off'):
+            self.dispatch('admin.profile', {'token': 'letmein', 'seconds': 0.1})
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.server.server_close()
+            self.server = self.server_class(replace(self.server.config, profile_dir=directory))
+            with self.assertRaisesRegex(ValueError, "'seconds' must be between"):
+                self.dispatch('admin.profile', {'token': 'letmein', 'seconds': 3600})
+            capture = self.dispatch('admin.profile', {'token': 'letmein', 'seconds': 0.1, 'interval_ms': 2, 'include_idle': True})
+
+            self.assertGreater(capture['ticks'], 1)
+            self.assertGreater(capture['samples'], 0)
+            self.assertTrue(os.path.exists(capture['files']['collapsed']))
+            self.assertTrue(os.path.exists(capture['files']['pstats']))
+
+    def test_rate_limited_requests_get_an_in_band_retry_after(self):
+        self.server.server_close()
+        self.server = self.server_class(replace(
+            self.server.config, rate_limit_connection_rate=0.5, rate_limit_connection_burst=4, rate_limit_region_tiles_per_token=32
+        ))
+        state = ConnectionState()
+
+        self.assertEqual(json.loads(self.server.handle_line(state, b'{"type":"world.meta"}\n'))['type'], 'ok')
+        reply = json.loads(self.server.handle_line(state, b'{"type":"world.region","id":4}\n'))
+        self.assertEqual(reply['type'], 'ok')
+        refused = json.loads(self.server.handle_line(state, b'{"type":"ping","id":5}\n'))
+        self.assertEqual((refused['type'], refused['error'], refused['id']), ('error', 'Rate limit exceeded', 5))
+        self.assertGreater(refused['retry_after'], 1.0)
+        self.assertEqual(json.loads(self.server.handle_line(ConnectionState(), b'{"type":"ping"}\n'))['type'], 'ok')
+
+    def test_password_hashing_runs_outside_write_lock(self):
+        self.server.hasher.close()
+        probe = self.server.hasher = LockProbeHasher(self.server.db_lock)
+
+        self.dispatch('auth.register', {'username': 'grace', 'password': 'supersecret'})
+        self.dispatch('auth.login', {'username': 'grace', 'password': 'supersecret'})
+
+        self.assertEqual(probe.lock_held, [False, False])
+
+    def test_read_connections_cannot_write(self):
+        with self.server.readers.connection() as conn:
+            with self.assertRaisesRegex(Exception, 'readonly'):
+                conn.execute('DELETE FROM sessions')
+
+
+class AsyncServerFlowTests(ServerFlowTests):
+    server_class = AsyncConquestServer
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from server_app.sessions import CachedSession, SessionCache
+
+
+class SessionCacheTests(unittest.TestCase):
+    def test_lookup_loads_once_then_serves_from_memory(self):
+        cache = SessionCache()
+        loads = []
+
+        def load(token):
+            loads.append(token)
+            return CachedSession(1, 'alice', 100.0)
+
+        self.assertEqual(cache.lookup('t1', load), CachedSession(1, 'alice', 100.0))
+        self.assertEqual(cache.lookup('t1', load).username, 'alice')
+        self.assertEqual(loads, ['t1'])
+
+    def test_missing_tokens_are_not_cached(self):
+        cache = SessionCache()
+        self.assertIsNone(cache.lookup('nope', lambda token: None))
+        self.assertEqual(len(cache), 0)
+
+    def test_load_racing_a_discard_is_not_cached(self):
+        cache = SessionCache()
+
+        def load(token):
+            # A logout commits and discards while this load is in flight.
+            cache.discard(token)
+            return CachedSession(1, 'alice', 100.0)
+
+        self.assertIsNotNone(cache.lookup('t1', load))
+        self.assertNotIn('t1', cache)
+
+    def test_evict_expired(self):
+        cache = SessionCache()
+        cache.lookup('old', lambda token: CachedSession(1, 'alice', 10.0))
+        cache.lookup('new', lambda token: CachedSession(2, 'bob', 30.0))
+
+        self.assertEqual(cache.evict_expired(20.0), 1)
+        self.assertNotIn('old', cache)
+        self.assertIn('new', cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
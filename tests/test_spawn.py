@@ -0,0 +1,85 @@
+import random
+import unittest
+
+from server_app.grid import TERRAIN_CODES, WorldGrid
+from server_app.spawn import SpawnAllocator
+
+
+class SpawnAllocatorTests(unittest.TestCase):
+    def test_first_strategy_fills_chunks_in_order(self):
+        grid = WorldGrid(32, 32)
+        grid.terrain[0] = TERRAIN_CODES["water"]
+        grid.rebuild_index()
+        allocator = SpawnAllocator(grid, "first")
+
+        self.assertEqual(allocator.allocate(), (1, 0))
+        for y in range(16):
+            for x in range(16):
+                if (x, y) != (0, 0):
+                    grid.set_owner(x, y, 1)
+        self.assertEqual(grid.chunk_free[0], 0)
+        self.assertEqual(allocator.allocate(), (16, 0))
+
+        grid.set_owner(5, 5, None)
+        self.assertEqual(allocator.allocate(), (5, 5))
+
+    def test_full_world_has_no_spawn(self):
+        grid = WorldGrid(2, 2)
+        for index in range(4):
+            grid.set_owner(index % 2, index // 2, 1)
+        self.assertIsNone(SpawnAllocator(grid, "spread").allocate())
+
+    def test_spread_strategy_moves_away_from_existing_players(self):
+        grid = WorldGrid(64, 64)
+        allocator = SpawnAllocator(grid, "spread", rng=random.Random(1))
+        grid.set_owner(0, 0, 1)
+
+        x, y = allocator.allocate()
+        self.assertEqual((x // 16, y // 16), (3, 3))
+        grid.set_owner(x, y, 2)
+
+        x, y = allocator.allocate()
+        self.assertIn((x // 16, y // 16), {(3, 0), (0, 3)})
+
+    def test_occupied_chunk_index_follows_owner_changes(self):
+        grid = WorldGrid(64, 64)
+        grid.set_owner(0, 0, 1)
+        grid.set_owner(1, 0, 1)
+        grid.set_owner(40, 40, 2)
+        grid.set_owner(20, 0, 3)
+        rng = random.Random(3)
+        self.assertEqual(sorted(grid.occupied_chunks(10, rng)), [0, 1, 10])
+
+        grid.set_owner(0, 0, None)
+        grid.set_owner(1, 0, None)
+        self.assertEqual(sorted(grid.occupied_chunks(10, rng)), [1, 10])
+        self.assertEqual(len(grid.occupied_chunks(1, rng)), 1)
+        grid.rebuild_index()
+        self.assertEqual(sorted(grid.occupied_chunks(10, rng)), [1, 10])
+
+    def test_spread_samples_occupied_chunks_on_crowded_maps(self):
+        grid = WorldGrid(256, 256)
+        for chunk in range(0, 256, 2):
+            cy, cx = divmod(chunk, 16)
+            grid.set_owner(cx * 16, cy * 16, chunk + 1)
+        allocator = SpawnAllocator(grid, "spread", occupied_samples=8, rng=random.Random(5))
+
+        x, y = allocator.allocate()
+        self.assertIsNone(grid.owner_at(x, y))
+
+    def test_random_strategy_returns_free_land(self):
+        grid = WorldGrid(64, 64)
+        grid.terrain[:] = bytes([TERRAIN_CODES["water"]]) * len(grid.terrain)
+        grid.terrain[40 * 64 + 50] = TERRAIN_CODES["land"]
+        grid.rebuild_index()
+        allocator = SpawnAllocator(grid, "random", rng=random.Random(7))
+
+        self.assertEqual(allocator.allocate(), (50, 40))
+
+    def test_unknown_strategy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            SpawnAllocator(WorldGrid(4, 4), "corner")
+
+
+if __name__ == "__main__":
+    unittest.main()
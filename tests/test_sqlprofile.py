@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+
+from server_app import db
+from server_app.sqlprofile import SqlProfiler, normalize_sql
+
+
+class NormalizeSqlTests(unittest.TestCase):
+    def test_literals_and_placeholder_lists_collapse(self):
+        self.assertEqual(
+            normalize_sql("SELECT *\n  FROM tiles WHERE x = 3 AND terrain = 'land' AND id IN (?, ?,?)"),
+            'SELECT * FROM tiles WHERE x = ? AND terrain = ? AND id IN (?, ...)',
+        )
+        self.assertEqual(normalize_sql('SELECT t1.x FROM t1'), 'SELECT t1.x FROM t1')
+
+
+class SqlProfilerTests(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.label = 'world.region'
+        self.profiler = SqlProfiler(lambda: self.label)
+
+    def tearDown(self):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def test_statements_are_grouped_per_message_type_with_rows(self):
+        with db.connect(self.path, profiler=self.profiler) as conn:
+            conn.execute('CREATE TABLE t (x INTEGER)')
+            conn.executemany('INSERT INTO t (x) VALUES (?)', [(i,) for i in range(5)])
+            conn.commit()
+            for limit in (2, 3):
+                conn.execute(f'SELECT x FROM t LIMIT {limit}').fetchall()
+            self.label = 'world.state'
+            list(conn.execute('SELECT x FROM t LIMIT 1'))
+
+        entries = {(entry['message_type'], entry['sql']): entry for entry in self.profiler.top(limit=50)}
+        select = entries[('world.region', 'SELECT x FROM t LIMIT ?')]
+        self.assertEqual((select['calls'], select['rows']), (2, 5))
+        self.assertEqual(entries[('world.state', 'SELECT x FROM t LIMIT ?')]['rows'], 1)
+        self.assertEqual(entries[('world.region', 'INSERT INTO t (x) VALUES (?)')]['calls'], 1)
+        self.assertIn(('world.region', 'COMMIT'), entries)
+
+        by_calls = self.profiler.top(limit=1, order_by='calls')
+        self.assertEqual(by_calls[0]['calls'], 2)
+        self.profiler.reset()
+        self.assertEqual(self.profiler.top(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+import unittest
+
+from server_app.protocol import WireFormat
+from server_app.subscriptions import SubscriptionHub, ThreadedOutbox, Viewport
+
+
+class RecordingOutbox:
+    def __init__(self):
+        self.frames = []
+        self.wire = WireFormat()
+
+    def push(self, frame):
+        self.frames.append(json.loads(frame))
+
+
+class BlockingWriter:
+    """File-like sink whose writes wait until ``release`` is set."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.frames = []
+
+    def write(self, frame):
+        self.release.wait(timeout=5)
+        self.frames.append(json.loads(frame))
+
+
+class SubscriptionHubTests(unittest.TestCase):
+    def test_publish_only_reaches_covering_viewports(self):
+        hub = SubscriptionHub()
+        near, far = RecordingOutbox(), RecordingOutbox()
+        hub.subscribe(near, Viewport(0, 0, 4, 4))
+        hub.subscribe(far, Viewport(10, 10, 20, 20))
+        tiles = [
+            {"x": 1, "y": 1, "terrain": "land", "owner_user_id": 2},
+            {"x": 9, "y": 9, "terrain": "land", "owner_user_id": 2},
+        ]
+
+        delivered = hub.publish(7, tiles)
+
+        self.assertEqual(delivered, 1)
+        self.assertEqual(near.frames, [{"type": "world.tiles_changed", "revision": 7, "tiles": tiles[:1]}])
+        self.assertEqual(far.frames, [])
+
+    def test_unsubscribed_outbox_gets_nothing(self):
+        hub = SubscriptionHub()
+        outbox = RecordingOutbox()
+        hub.subscribe(outbox, Viewport(0, 0, 4, 4))
+        self.assertTrue(hub.unsubscribe(outbox))
+        self.assertFalse(hub.unsubscribe(outbox))
+
+        hub.publish(1, [{"x": 0, "y": 0, "terrain": "land", "owner_user_id": 1}])
+
+        self.assertEqual(outbox.frames, [])
+
+
+class ThreadedOutboxTests(unittest.TestCase):
+    def test_slow_reader_overflow_drops_frames_then_resyncs(self):
+        writer = BlockingWriter()
+        outbox = ThreadedOutbox(writer, maxsize=2)
+        self.addCleanup(outbox.close)
+
+        for revision in range(10):
+            outbox.push(json.dumps({"type": "world.tiles_changed", "revision": revision}).encode())
+
+        self.assertGreater(outbox.dropped, 0)
+        writer.release.set()
+        deadline = time.monotonic() + 5
+        while not writer.frames or not writer.frames[-1].get("resync"):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+        self.assertLessEqual(len(writer.frames), 4)
+        self.assertEqual(writer.frames[0]["revision"], 0)
+        self.assertTrue(writer.frames[-1]["resync"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,6 +33,24 @@ class WorldServiceTests(unittest.TestCase):
             with self.assertRaises(ValueError):
                 world.claim_tile(2, 3, 3)
 
+    def test_power_regenerates_without_writes_until_spent(self):
+        with db.connect(self.tmp.name) as conn:
+            world = WorldService(conn, default_power=100, max_power=100, power_regen_per_tick=1, tick_seconds=2.0)
+            world.create_user_resources(3)
+            world.spawn_for_user_if_needed(3)
+            conn.execute("UPDATE resources SET power = 10, last_tick = last_tick - 7 WHERE user_id = 3")
+            conn.commit()
+            stored = tuple(conn.execute("SELECT power, last_tick FROM resources WHERE user_id = 3").fetchone())
+
+            self.assertEqual(world.get_user_state(3)["resources"], {"power": 13, "max_power": 100})
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(tuple(conn.execute("SELECT power, last_tick FROM resources WHERE user_id = 3").fetchone()), stored)
+
+            claim = world.claim_tile(3, 1, 0)
+            self.assertEqual(claim["resources"]["power"], 8)
+            row = conn.execute("SELECT power, last_tick FROM resources WHERE user_id = 3").fetchone()
+            self.assertEqual((row["power"], row["last_tick"]), (8, stored[1] + 6))
+
 
 if __name__ == "__main__":
     unittest.main()